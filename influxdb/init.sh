@@ -0,0 +1,36 @@
+#!/bin/bash
+# influxdb/init.sh
+# Run once by the influxdb:2.x image (/docker-entrypoint-initdb.d) after the
+# DOCKER_INFLUXDB_INIT_* setup has created the org, bucket and admin token.
+#
+# InfluxDB 2.x has no continuous queries: downsampling is done in-stream by
+# the processor, which writes 10s/1m/10m rollups to printing_metrics_rollup.
+set -e
+
+ORG="${DOCKER_INFLUXDB_INIT_ORG}"
+BUCKET="${DOCKER_INFLUXDB_INIT_BUCKET:-printing_metrics}"
+BUCKET_ID=$(influx bucket list --org "$ORG" --name "$BUCKET" --hide-headers | cut -f1)
+
+# Read/write token for telegraf, limited to the metrics bucket
+influx auth create --org "$ORG" --description telegraf \
+  --read-bucket "$BUCKET_ID" --write-bucket "$BUCKET_ID"
+
+# Roughness alerts (replaces the v1 CREATE THRESHOLD): mean roughness over the last
+# 5 minutes per printer, from the 10s rollups; level 1 = warn (> 60), 2 = critical (> 80)
+influx task create --org "$ORG" <<FLUX
+option task = {name: "high_roughness", every: 1m}
+
+from(bucket: "${BUCKET}")
+  |> range(start: -5m)
+  |> filter(fn: (r) => r._measurement == "printing_metrics_rollup" and r.window == "10s" and r._field == "roughness_mean")
+  |> mean()
+  |> map(fn: (r) => ({
+      _time: r._stop,
+      _measurement: "roughness_alerts",
+      _field: "level",
+      printer_id: r.printer_id,
+      _value: if r._value > 80.0 then 2 else if r._value > 60.0 then 1 else 0,
+  }))
+  |> filter(fn: (r) => r._value > 0)
+  |> to(bucket: "${BUCKET}", org: "${ORG}")
+FLUX
@@ -0,0 +1,247 @@
+"""
+Streaming evaluation of anomaly detection against the synthesizer's labels.
+
+The synthesizer labels every message it injected an anomaly into with the
+rule's name (`anomaly`, e.g. spike_nozzle_temperature). With EVAL_TOPIC set,
+the processor publishes one record per processed message carrying that
+label next to its anomaly score, and feedback commands carry the
+cycle_count of the sample that triggered them. Messages the processor
+rejects, such as dropouts of a required field, get a record with no score
+and `rejected` set, so they count as missed. DetectionEvaluator folds
+those records and the printer/control commands into scores per anomaly
+type, one event at a time:
+
+    episode       consecutive messages of one printer with the same label
+    alarm         a message whose anomaly score is >= `threshold`
+    detected      an episode with an alarm during it or within `grace`
+                  messages after it
+    latency       messages and ms from an episode's first message to its
+                  first alarm
+    feedback lag  ms from an episode's first message to the first
+                  printer/control command for that printer during the
+                  episode or its grace window
+
+Message-level precision and recall count alarms on labelled messages
+against alarms on normal ones. For one type, precision is that type's true
+alarms against all false alarms. Alarms in a grace window count towards
+detection but are neither true nor false positives.
+
+Memory stays bounded whatever the length of the log: a small state per
+printer, counters per type, and a fixed-size uniform sample of latencies
+per type for the percentiles.
+"""
+import random
+
+
+class Reservoir:
+    """Uniform sample of at most `size` values from a stream (Algorithm R), for percentiles"""
+    __slots__ = ('size', 'count', 'values', 'rng')
+
+    def __init__(self, size=10000, seed=0):
+        self.size = size
+        self.count = 0
+        self.values = []
+        self.rng = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            i = self.rng.randrange(self.count)
+            if i < self.size:
+                self.values[i] = value
+
+    def percentile(self, q):
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class TypeStats:
+    __slots__ = ('episodes', 'detected', 'fed', 'messages', 'rejected', 'true_alarms',
+                 'latency_messages', 'latency_ms', 'feedback_ms')
+
+    def __init__(self, reservoir):
+        self.episodes = 0
+        self.detected = 0
+        self.fed = 0
+        self.messages = 0
+        self.rejected = 0
+        self.true_alarms = 0
+        self.latency_messages = Reservoir(reservoir)
+        self.latency_ms = Reservoir(reservoir)
+        self.feedback_ms = Reservoir(reservoir)
+
+
+class Episode:
+    __slots__ = ('stats', 'start_t', 'start_index', 'detected', 'fed')
+
+    def __init__(self, stats, start_t, start_index):
+        self.stats = stats
+        self.start_t = start_t
+        self.start_index = start_index
+        self.detected = False
+        self.fed = False
+
+
+class PrinterEval:
+    __slots__ = ('index', 'label', 'episode', 'grace_left')
+
+    def __init__(self):
+        self.index = 0
+        self.label = None
+        self.episode = None
+        self.grace_left = 0
+
+
+class DetectionEvaluator:
+    def __init__(self, threshold=1.0, grace=5, reservoir=10000):
+        self.threshold = threshold
+        self.grace = grace
+        self.reservoir = reservoir
+        self.printers = {}
+        self.types = {}
+        self.messages = 0
+        self.rejected = 0
+        self.normal = 0
+        self.false_alarms = 0
+        self.late_alarms = 0
+        self.feedback = 0
+        self.unprompted_feedback = 0
+
+    def observe(self, printer_id, label, score, t_ns, rejected=False):
+        """One processed message: its injected label (None = normal) and anomaly score.
+
+        `rejected` marks a message the processor could not decode; it has no score.
+        """
+        self.messages += 1
+        self.rejected += rejected
+        p = self.printers.get(printer_id)
+        if p is None:
+            p = self.printers[printer_id] = PrinterEval()
+        alarm = score is not None and score >= self.threshold
+
+        if label is not None:
+            if label != p.label:
+                # A new episode, which also ends any grace window of the previous one
+                stats = self.types.get(label)
+                if stats is None:
+                    stats = self.types[label] = TypeStats(self.reservoir)
+                stats.episodes += 1
+                p.episode = Episode(stats, t_ns, p.index)
+            stats = p.episode.stats
+            stats.messages += 1
+            stats.rejected += rejected
+            if alarm:
+                stats.true_alarms += 1
+                self._detect(p.episode, p.index, t_ns)
+        else:
+            if p.label is not None:
+                p.grace_left = self.grace
+            if p.episode is not None and p.grace_left > 0:
+                p.grace_left -= 1
+                if alarm:
+                    self.late_alarms += 1
+                    self._detect(p.episode, p.index, t_ns)
+            else:
+                self.normal += 1
+                if alarm:
+                    self.false_alarms += 1
+            if p.grace_left == 0:
+                p.episode = None
+        p.label = label
+        p.index += 1
+
+    @staticmethod
+    def _detect(episode, index, t_ns):
+        if episode.detected:
+            return
+        episode.detected = True
+        stats = episode.stats
+        stats.detected += 1
+        stats.latency_messages.add(index - episode.start_index)
+        stats.latency_ms.add((t_ns - episode.start_t) / 1e6)
+
+    def feedback_sent(self, printer_id, t_ns):
+        """A printer/control command for `printer_id` went out at `t_ns`."""
+        self.feedback += 1
+        p = self.printers.get(printer_id)
+        episode = p.episode if p is not None else None
+        # Batch inference publishes after later rejected messages were recorded: an episode
+        # that started after the command cannot have prompted it
+        if episode is None or t_ns < episode.start_t:
+            self.unprompted_feedback += 1
+        elif not episode.fed:
+            episode.fed = True
+            episode.stats.fed += 1
+            episode.stats.feedback_ms.add((t_ns - episode.start_t) / 1e6)
+
+    def report(self):
+        true_alarms = sum(s.true_alarms for s in self.types.values())
+        labelled = sum(s.messages for s in self.types.values())
+        report = {
+            'messages': self.messages,
+            'labelled': labelled,
+            'rejected': self.rejected,
+            'printers': len(self.printers),
+            'threshold': self.threshold,
+            'precision': _ratio(true_alarms, true_alarms + self.false_alarms),
+            'recall': _ratio(true_alarms, labelled),
+            'false_alarm_rate': _ratio(self.false_alarms, self.normal),
+            'late_alarms': self.late_alarms,
+            'feedback': self.feedback,
+            'unprompted_feedback': self.unprompted_feedback,
+            'types': {},
+        }
+        for label, s in sorted(self.types.items()):
+            report['types'][label] = {
+                'episodes': s.episodes,
+                'detected': s.detected,
+                'episode_recall': _ratio(s.detected, s.episodes),
+                'messages': s.messages,
+                'rejected': s.rejected,
+                'precision': _ratio(s.true_alarms, s.true_alarms + self.false_alarms),
+                'recall': _ratio(s.true_alarms, s.messages),
+                'latency_messages_p50': s.latency_messages.percentile(50),
+                'latency_messages_p95': s.latency_messages.percentile(95),
+                'latency_ms_p50': s.latency_ms.percentile(50),
+                'latency_ms_p95': s.latency_ms.percentile(95),
+                'feedback_rate': _ratio(s.fed, s.episodes),
+                'feedback_lag_ms_p50': s.feedback_ms.percentile(50),
+                'feedback_lag_ms_p95': s.feedback_ms.percentile(95),
+            }
+        return report
+
+    def format_report(self):
+        r = self.report()
+        lines = [
+            f"{r['messages']:,} messages from {r['printers']:,} printers, {r['labelled']:,} labelled, "
+            f"{r['rejected']:,} rejected by the processor; alarm at score >= {r['threshold']:g}",
+            f"messages: precision {_pct(r['precision'])}, recall {_pct(r['recall'])}, "
+            f"false alarms {_pct(r['false_alarm_rate'])} of normal messages, {r['late_alarms']:,} late alarms",
+            f"feedback: {r['feedback']:,} commands, {r['unprompted_feedback']:,} outside any episode",
+            f"{'type':<28} {'episodes':>9} {'detected':>9} {'rejected':>9} {'precision':>9} {'recall':>7} "
+            f"{'latency msgs p50/p95':>21} {'latency ms p50/p95':>19} {'fed':>7} {'feedback lag ms p50/p95':>24}",
+        ]
+        for label, t in r['types'].items():
+            lines.append(
+                f"{label:<28} {t['episodes']:>9,} {_pct(t['episode_recall']):>9} "
+                f"{_pct(_ratio(t['rejected'], t['messages'])):>9} {_pct(t['precision']):>9} "
+                f"{_pct(t['recall']):>7} {_pair(t['latency_messages_p50'], t['latency_messages_p95'], '.0f'):>21} "
+                f"{_pair(t['latency_ms_p50'], t['latency_ms_p95'], '.1f'):>19} {_pct(t['feedback_rate']):>7} "
+                f"{_pair(t['feedback_lag_ms_p50'], t['feedback_lag_ms_p95'], '.1f'):>24}")
+        return '\n'.join(lines)
+
+
+def _ratio(part, whole):
+    return part / whole if whole else None
+
+
+def _pct(value):
+    return '-' if value is None else f'{value:.1%}'
+
+
+def _pair(p50, p95, spec):
+    return '-' if p50 is None else f'{p50:{spec}} / {p95:{spec}}'
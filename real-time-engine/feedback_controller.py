@@ -0,0 +1,151 @@
+"""
+Per-printer feedback debouncing and coalescing.
+
+Without it every sample above ROUGHNESS_THRESHOLD produces a QoS 1
+printer/control command, so a sustained rough print at 100 Hz sends 100
+identical commands a second. Each printer instead runs a small state
+machine that persists across messages:
+
+    normal     roughness <= threshold: nothing to do
+               roughness >  threshold: -> adjusting, command sent
+    adjusting  roughness >  threshold: another command, at most once per
+                                       `min_interval` seconds; samples in
+                                       between are coalesced into one
+                                       pending command carrying the latest
+                                       sample
+               release <= roughness <= threshold: hysteresis band, no
+                                       command, stay adjusting
+               roughness < release:   -> normal, pending command dropped
+
+A command whose target speed is within `min_speed_change` of the last one
+sent (the printer has not applied it yet, or it is pinned at the minimum
+speed) is suppressed as a duplicate. Pending commands are released from a
+deadline heap checked on every observed sample, so a coalesced command
+still goes out when its printer falls silent.
+
+State is kept only for printers that need it. A printer is forgotten once
+it is back to normal with nothing pending and `min_interval` has passed
+since its last command. Its next command then goes out without delay. At
+most `max_printers` are tracked; beyond that, the least recently seen
+printer is evicted, as in the streaming state store.
+"""
+import heapq
+import collections
+
+NORMAL, ADJUSTING = 'normal', 'adjusting'
+
+
+class PrinterFeedbackState:
+    __slots__ = ('state', 'last_sent', 'last_speed', 'pending')
+
+    def __init__(self):
+        self.state = NORMAL
+        self.last_sent = float('-inf')
+        self.last_speed = None
+        self.pending = None
+
+
+class FeedbackController:
+    def __init__(self, threshold, release_threshold, min_interval, target_speed,
+                 min_speed_change=1.0, max_printers=50000):
+        self.threshold = threshold
+        self.release_threshold = min(release_threshold, threshold)
+        self.min_interval = min_interval
+        self.target_speed = target_speed
+        self.min_speed_change = min_speed_change
+        self.max_printers = max_printers
+        self.printers = collections.OrderedDict()
+        self.deadlines = []
+        self.stats = {
+            'requested': 0,      # samples the old per-sample logic would have sent
+            'sent': 0,
+            'coalesced': 0,      # folded into a pending command by min_interval
+            'duplicates': 0,     # same target speed as the last command
+            'cancelled': 0,      # pending command dropped when roughness recovered
+            'transitions': 0,    # normal <-> adjusting state changes
+            'evicted': 0,        # printers dropped over max_printers
+        }
+
+    def observe(self, printer_id, roughness, data, prediction, now):
+        """Fold one sample into the printer's state. Returns [(data, prediction)] to publish."""
+        out = []
+        if self.deadlines and self.deadlines[0][0] <= now:
+            self.flush_due(now, out)
+
+        printers = self.printers
+        state = printers.get(printer_id)
+        if state is None:
+            if roughness <= self.threshold:
+                return out
+            state = printers[printer_id] = PrinterFeedbackState()
+            if len(printers) > self.max_printers:
+                printers.popitem(last=False)
+                self.stats['evicted'] += 1
+        else:
+            printers.move_to_end(printer_id)
+
+        if state.state == NORMAL:
+            if roughness <= self.threshold:
+                if now - state.last_sent >= self.min_interval:
+                    del printers[printer_id]
+                return out
+            state.state = ADJUSTING
+            self.stats['transitions'] += 1
+        elif roughness < self.release_threshold:
+            state.state = NORMAL
+            self.stats['transitions'] += 1
+            if state.pending is not None:
+                state.pending = None
+                self.stats['cancelled'] += 1
+            if now - state.last_sent >= self.min_interval:
+                del printers[printer_id]
+            return out
+        elif roughness <= self.threshold:
+            return out
+
+        self.stats['requested'] += 1
+        if now - state.last_sent < self.min_interval:
+            if state.pending is None:
+                heapq.heappush(self.deadlines, (state.last_sent + self.min_interval, printer_id))
+            else:
+                self.stats['coalesced'] += 1
+            state.pending = (data, prediction)
+            return out
+        if state.pending is not None:
+            # The pending command is superseded by this newer sample
+            self.stats['coalesced'] += 1
+            state.pending = None
+        self._send(state, data, prediction, now, out)
+        return out
+
+    def flush_due(self, now, out=None):
+        """Release pending commands whose min_interval has elapsed."""
+        out = [] if out is None else out
+        deadlines = self.deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, printer_id = heapq.heappop(deadlines)
+            state = self.printers.get(printer_id)
+            if state is None or state.pending is None or state.state != ADJUSTING:
+                continue
+            data, prediction = state.pending
+            state.pending = None
+            self._send(state, data, prediction, now, out)
+        return out
+
+    def _send(self, state, data, prediction, now, out):
+        speed = self.target_speed(data)
+        if state.last_speed is not None and abs(speed - state.last_speed) < self.min_speed_change:
+            self.stats['duplicates'] += 1
+            return
+        state.last_sent = now
+        state.last_speed = speed
+        self.stats['sent'] += 1
+        out.append((data, prediction))
+
+    def metrics(self):
+        stats = dict(self.stats)
+        stats['suppressed'] = stats['requested'] - stats['sent']
+        stats['printers'] = len(self.printers)
+        stats['printers_adjusting'] = sum(1 for s in self.printers.values() if s.state == ADJUSTING)
+        stats['pending'] = sum(1 for s in self.printers.values() if s.pending is not None)
+        return stats
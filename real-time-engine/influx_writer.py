@@ -0,0 +1,230 @@
+"""
+Batched, asynchronous InfluxDB 2.x writer.
+
+Points are encoded as line protocol on the caller's thread, buffered in a
+bounded in-memory queue and flushed by a background thread either when a
+batch fills up or when the flush interval elapses. The HTTP write goes
+straight to `/api/v2/write` with the standard library, so any local HTTP
+server can stand in for InfluxDB.
+
+With a DiskSpool attached, a batch that fails is spooled to disk instead of
+dropped, further batches go straight to the spool until the drainer has
+replayed it, and the `spool` overflow policy spills points that do not fit
+in the queue to the spool as well.
+"""
+import time
+import logging
+import threading
+import collections
+import urllib.request
+import urllib.error
+from urllib.parse import urlencode
+
+from spool import SpoolDrainer
+
+log = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block', 'spool')
+
+
+def _escape_key(value):
+    return str(value).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def _format_field(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f'{value}i'
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def line_protocol(measurement, tags, fields, timestamp_ns=None):
+    """Encode a single point as an InfluxDB line protocol string."""
+    line = str(measurement).replace(',', '\\,').replace(' ', '\\ ')
+    for key in sorted(tags):
+        line += f",{_escape_key(key)}={_escape_key(tags[key])}"
+    line += ' ' + ','.join(f"{_escape_key(k)}={_format_field(v)}" for k, v in fields.items())
+    if timestamp_ns is not None:
+        line += f' {int(timestamp_ns)}'
+    return line
+
+
+class BatchingInfluxWriter:
+    """Buffers line-protocol points and flushes them off the caller's thread"""
+    def __init__(self, url, token, org, bucket, batch_size=5000, flush_interval=1.0,
+                 max_queue=100000, overflow='drop_oldest', max_retries=5,
+                 retry_backoff=0.5, timeout=10.0, spool=None, drain_batch_bytes=4 << 20):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        if overflow == 'spool' and spool is None:
+            raise ValueError("The spool overflow policy needs a spool")
+        query = urlencode({'org': org or '', 'bucket': bucket, 'precision': 'ns'})
+        self.write_url = f"{url.rstrip('/')}/api/v2/write?{query}"
+        self.headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if token:
+            self.headers['Authorization'] = f'Token {token}'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {
+            'points_queued': 0,
+            'points_written': 0,
+            'points_dropped': 0,
+            'points_failed': 0,
+            'batches_written': 0,
+            'write_retries': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'last_flush_seconds': 0.0,
+            'points_spooled': 0,
+        }
+        self.spool = spool
+        self.drainer = None
+        if spool is not None:
+            self.drainer = SpoolDrainer(spool, self._post, batch_bytes=drain_batch_bytes,
+                                        probe_interval=retry_backoff)
+        self._thread = threading.Thread(target=self._run, name='influx-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """Queue one line-protocol point. Returns False if the point was dropped."""
+        spill = False
+        with self._cond:
+            if self._closed:
+                self.stats['points_dropped'] += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == 'block':
+                    while len(self._queue) >= self.max_queue and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        self.stats['points_dropped'] += 1
+                        return False
+                elif self.overflow == 'drop_newest':
+                    self.stats['points_dropped'] += 1
+                    return False
+                elif self.overflow == 'spool':
+                    spill = True
+                else:
+                    self._queue.popleft()
+                    self.stats['points_dropped'] += 1
+            if not spill:
+                self._queue.append(line)
+                self.stats['points_queued'] += 1
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+        if spill:
+            # File I/O outside the lock, so the flusher and other producers keep going
+            self._spool([line])
+        return True
+
+    def queue_depth(self):
+        return len(self._queue)
+
+    def metrics(self):
+        """Snapshot of the writer counters, including derived flush latency."""
+        with self._cond:
+            snapshot = dict(self.stats)
+            snapshot['queue_depth'] = len(self._queue)
+        batches = snapshot['batches_written']
+        snapshot['flush_seconds_avg'] = snapshot['flush_seconds_total'] / batches if batches else 0.0
+        return snapshot
+
+    def close(self, timeout=30.0):
+        """Stop accepting points, flush everything still queued and join the flush thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        # Whatever is still spooled stays on disk for the next start
+        if self.drainer is not None:
+            self.drainer.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._queue:
+                    return
+                count = min(self.batch_size, len(self._queue))
+                batch = [self._queue.popleft() for _ in range(count)]
+                self._cond.notify_all()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        if self.drainer is not None and not self.drainer.healthy:
+            # Sink down: keep order behind the spool and do not block on retries
+            self._spool(batch)
+            return
+        body = '\n'.join(batch).encode('utf-8')
+        start = time.perf_counter()
+        # With a spool nothing is lost on failure, so hand over at once instead of backing off
+        retries = 0 if self.drainer is not None else self.max_retries
+        for attempt in range(retries + 1):
+            try:
+                self._post(body)
+                break
+            except urllib.error.HTTPError as e:
+                # Client errors (bad line protocol, auth) will not succeed on retry
+                if e.code != 429 and e.code < 500:
+                    log.error("InfluxDB rejected batch", extra={'points': len(batch), 'status': e.code})
+                    self._record_failure(len(batch))
+                    return
+                error = e
+            except OSError as e:
+                error = e
+            if attempt == retries:
+                if self.drainer is not None:
+                    self._spool(batch)
+                    self.drainer.mark_unhealthy()
+                    return
+                log.error("InfluxDB write failed", extra={'points': len(batch), 'attempts': attempt + 1, 'error': str(error)})
+                self._record_failure(len(batch))
+                return
+            with self._cond:
+                self.stats['write_retries'] += 1
+            time.sleep(min(self.retry_backoff * (2 ** attempt), 30.0))
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            stats = self.stats
+            stats['points_written'] += len(batch)
+            stats['batches_written'] += 1
+            stats['last_batch_size'] = len(batch)
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(batch))
+            stats['last_flush_seconds'] = elapsed
+            stats['flush_seconds_total'] += elapsed
+            stats['flush_seconds_max'] = max(stats['flush_seconds_max'], elapsed)
+
+    def _spool(self, batch):
+        self.spool.append(batch)
+        with self._cond:
+            self.stats['points_spooled'] += len(batch)
+
+    def _record_failure(self, count):
+        with self._cond:
+            self.stats['points_failed'] += count
+
+    def _post(self, body):
+        request = urllib.request.Request(self.write_url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
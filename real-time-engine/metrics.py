@@ -0,0 +1,218 @@
+"""
+Low-overhead in-process metrics with a Prometheus text endpoint.
+
+Counters and histograms are plain Python containers updated on the hot
+path without locks (a lost increment under a thread race is acceptable for
+monitoring). Gauges are callbacks evaluated only when /metrics is scraped,
+so queue depths and component stats cost nothing between scrapes.
+
+The HTTP server also exposes a sampling profiler that can be toggled at
+runtime:
+
+    GET /metrics          Prometheus text exposition
+    GET /profile/start    start sampling all threads' stacks
+    GET /profile/stop     stop sampling
+    GET /profile          collapsed stacks ("a;b;c count"), flamegraph-ready
+"""
+import sys
+import time
+import bisect
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (n, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = collections.defaultdict(float)
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] += amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in list(self.values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value:g}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}'
+        yield f'{self.name}_bucket{{le="+Inf"}} {cumulative + self.counts[-1]}'
+        yield f'{self.name}_sum {self.sum:g}'
+        yield f'{self.name}_count {self.count}'
+
+
+class Gauge:
+    """Evaluated at scrape time. `fn` returns a number, or a {label_values: number} dict."""
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def collect(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is None:
+            return
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} gauge'
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                yield f'{self.name}{_labels(self.labelnames, labels)} {float(v):g}'
+        else:
+            yield f'{self.name} {float(value):g}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def gauge(self, name, help, fn, labelnames=()):
+        return self._add(Gauge(name, help, fn, labelnames))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval while running"""
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        if self.running:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while self._running.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def report(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class MetricsServer:
+    def __init__(self, registry, profiler=None, host='0.0.0.0', port=9100):
+        self.registry = registry
+        self.profiler = profiler or SamplingProfiler()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = server.registry.render()
+                    content_type = 'text/plain; version=0.0.4'
+                elif path == '/profile/start':
+                    server.profiler.start()
+                    body, content_type = 'profiler started\n', 'text/plain'
+                elif path == '/profile/stop':
+                    server.profiler.stop()
+                    body, content_type = 'profiler stopped\n', 'text/plain'
+                elif path == '/profile':
+                    body, content_type = server.profiler.report(), 'text/plain'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.profiler.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,146 @@
+"""
+Pickle-free serving artifact for the KNN roughness model.
+
+An artifact is a directory holding a small JSON manifest and memory-mappable
+`.npy` arrays:
+
+    manifest.json   format version, model parameters, shapes
+    features.npy    feature order expected by the model
+    train_X.npy     training matrix with the scaler folded in (x / scale)
+    train_sq.npy    precomputed squared row norms of train_X
+    train_y.npy     training targets
+    inv_scale.npy   1 / scaler.scale_, applied to incoming feature vectors
+
+Standardisation subtracts the same mean from both sides of a distance, so
+it cancels out: only the per-feature scale has to be applied at serving
+time. Neighbour search is a flat BLAS-backed scan using the expanded form
+|x|^2 - 2 x.q, which beats a tree index at the training-set sizes we use.
+Loading needs NumPy only; sklearn is used solely by `export_artifact`.
+
+Convert an existing pickle with:
+    python3 model_artifact.py models/model.pkl models/model_artifact
+"""
+import os
+import sys
+import json
+import pickle
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def export_artifact(model, scaler, feature_names, directory):
+    """Write a fitted KNeighborsRegressor + StandardScaler pair as an artifact directory."""
+    if type(model).__name__ != 'KNeighborsRegressor':
+        raise ValueError(f"Unsupported model for artifact export: {type(model).__name__}")
+    if model.effective_metric_ != 'euclidean':
+        raise ValueError(f"Unsupported KNN metric: {model.effective_metric_}")
+    if model.weights not in ('uniform', 'distance'):
+        raise ValueError(f"Unsupported KNN weights: {model.weights}")
+
+    scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_), dtype=np.float64)
+    mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_), dtype=np.float64)
+    # Undo the mean shift; the scale stays folded into the stored matrix
+    train_X = np.ascontiguousarray(np.asarray(model._fit_X, dtype=np.float64) + mean / scale)
+    train_y = np.asarray(model._y, dtype=np.float64)
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'features.npy'), np.array(feature_names))
+    np.save(os.path.join(directory, 'train_X.npy'), train_X)
+    np.save(os.path.join(directory, 'train_sq.npy'), np.einsum('ij,ij->i', train_X, train_X))
+    np.save(os.path.join(directory, 'train_y.npy'), train_y)
+    np.save(os.path.join(directory, 'inv_scale.npy'), 1.0 / scale)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_type': 'knn',
+        'index': 'flat',
+        'n_neighbors': int(model.n_neighbors),
+        'weights': model.weights,
+        'n_samples': int(train_X.shape[0]),
+        'n_features': int(train_X.shape[1]),
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def is_artifact(path):
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST))
+
+
+class CompiledKNNModel:
+    """KNN regressor served from an artifact directory, no sklearn required"""
+    def __init__(self, manifest, feature_names, train_X, train_sq, train_y, inv_scale):
+        self.manifest = manifest
+        self.feature_names = feature_names
+        self.train_X = train_X
+        self.train_sq = train_sq
+        self.train_y = train_y
+        self.inv_scale = inv_scale
+        self.n_neighbors = min(manifest['n_neighbors'], train_X.shape[0])
+        self.distance_weights = manifest['weights'] == 'distance'
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format: {manifest.get('format_version')}")
+        mode = 'r' if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode=mode)
+
+        feature_names = [str(f) for f in np.load(os.path.join(directory, 'features.npy'))]
+        return cls(manifest, feature_names, load('train_X.npy'), load('train_sq.npy'),
+                   load('train_y.npy'), np.asarray(load('inv_scale.npy')))
+
+    def _regress(self, Q):
+        # Squared distances up to the per-row |q|^2 term, which does not change the ranking
+        partial = self.train_sq - 2.0 * (Q @ self.train_X.T)
+        k = self.n_neighbors
+        if k < partial.shape[1]:
+            idx = np.argpartition(partial, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(partial.shape[1]), partial.shape)
+        neighbours = self.train_y[idx]
+        if not self.distance_weights:
+            return neighbours.mean(axis=1)
+        q_sq = np.einsum('ij,ij->i', Q, Q)[:, None]
+        dist = np.sqrt(np.maximum(np.take_along_axis(partial, idx, axis=1) + q_sq, 0.0))
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / dist
+        exact = np.isinf(weights)
+        rows = exact.any(axis=1)
+        # Like sklearn, exact matches take all the weight
+        weights[rows] = exact[rows]
+        return (neighbours * weights).sum(axis=1) / weights.sum(axis=1)
+
+    def predict(self, data):
+        q = np.array([data.get(f, 0.0) for f in self.feature_names], dtype=np.float64)
+        pred = self._regress((q * self.inv_scale)[None, :])[0]
+        return {
+            'predicted_roughness': float(pred),
+            'confidence': 0.95,
+            'anomaly_score': 0.0
+        }
+
+    def predict_batch(self, rows):
+        X = np.array([[row.get(f, 0.0) for f in self.feature_names] for row in rows], dtype=np.float64)
+        preds = self._regress(X * self.inv_scale)
+        return [{
+            'predicted_roughness': float(pred),
+            'confidence': 0.95,
+            'anomaly_score': 0.0
+        } for pred in preds]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python3 model_artifact.py <model.pkl> <artifact_dir>")
+        sys.exit(1)
+    with open(sys.argv[1], 'rb') as f:
+        model, scaler, feature_names = pickle.load(f)
+    manifest = export_artifact(model, scaler, feature_names, sys.argv[2])
+    print(f"Wrote {manifest['model_type']} artifact ({manifest['n_samples']} samples) to {sys.argv[2]}")
@@ -0,0 +1,106 @@
+"""
+Background hot reload of the serving model.
+
+A daemon thread polls MODEL_PATH (the pickle, or an artifact directory's
+manifest) and reloads once the file has stopped changing between two polls,
+so a model that is still being written is never picked up. A reload can
+also be requested explicitly, e.g. from an MQTT control topic.
+
+The new model is loaded and warmed with a few predictions on the reload
+thread, validated, and only then handed to `swap`. `on_message` keeps using
+the old model the whole time; if loading or validation fails the old model
+simply stays in place.
+"""
+import os
+import math
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+def model_mtime(path):
+    """Modification signature of a model pickle or artifact directory (None if missing)."""
+    target = os.path.join(path, 'manifest.json') if os.path.isdir(path) else path
+    try:
+        st = os.stat(target)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ModelReloader:
+    def __init__(self, path, load, swap, warmup_rows, poll_interval=5.0):
+        self.path = path
+        self.load = load
+        self.swap = swap
+        self.warmup_rows = warmup_rows
+        self.poll_interval = poll_interval
+        self.current = model_mtime(path)
+        self._pending = None
+        self._requested = threading.Event()
+        self._stopped = threading.Event()
+        self.stats = {
+            'reloads_ok': 0,
+            'reloads_failed': 0,
+            'last_reload_seconds': 0.0,
+            'last_swap_seconds': 0.0,
+            'last_reload_at': None,
+        }
+        self._thread = threading.Thread(target=self._run, name='model-reloader', daemon=True)
+        self._thread.start()
+
+    def request_reload(self):
+        self._requested.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._requested.set()
+        self._thread.join(5.0)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            forced = self._requested.wait(self.poll_interval)
+            self._requested.clear()
+            if self._stopped.is_set():
+                return
+            mtime = model_mtime(self.path)
+            if forced:
+                self.reload()
+                self.current = mtime
+            elif mtime is not None and mtime != self.current:
+                # Only reload once the file has been stable for a full poll
+                if mtime == self._pending:
+                    self.reload()
+                    self.current = mtime
+                    self._pending = None
+                else:
+                    self._pending = mtime
+
+    def reload(self):
+        """Load, warm and validate the model at `path`, then swap it in. Returns success."""
+        start = time.perf_counter()
+        try:
+            model = self.load(self.path)
+            rows = list(self.warmup_rows())
+            for prediction in model.predict_batch(rows) if rows else []:
+                value = prediction['predicted_roughness']
+                if not isinstance(value, (int, float)) or not math.isfinite(value):
+                    raise ValueError(f"invalid warm-up prediction: {value!r}")
+        except Exception as e:
+            self.stats['reloads_failed'] += 1
+            log.error("Model reload failed, keeping current model", extra={'path': self.path, 'error': str(e)})
+            return False
+        loaded = time.perf_counter()
+        self.swap(model)
+        swapped = time.perf_counter()
+
+        self.stats['reloads_ok'] += 1
+        self.stats['last_reload_seconds'] = loaded - start
+        self.stats['last_swap_seconds'] = swapped - loaded
+        self.stats['last_reload_at'] = time.time()
+        log.info("Reloaded model", extra={'path': self.path,
+                                          'load_ms': round((loaded - start) * 1000, 1),
+                                          'swap_us': round((swapped - loaded) * 1e6, 1)})
+        return True
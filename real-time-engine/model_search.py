@@ -0,0 +1,174 @@
+"""
+Parallel model-family and hyperparameter search for the roughness model.
+
+Every candidate (a model family plus one point of its parameter grid) is
+scored with k-fold cross-validation on the scaled training set. Candidates
+run in a spawn-based process pool; the training arrays are written once
+as .npy files and each worker opens them with np.load(mmap_mode='r'), so
+all workers share the same page-cache copy instead of receiving a pickled
+copy per task.
+
+After CV each candidate is refit on the full training set and its serving
+cost is measured: predict time per row at the processor's inference batch
+size (1 for INFERENCE_MODE=single). Workers are limited to one BLAS/OpenMP
+thread and latency is measured as process CPU time, so candidates running
+side by side do not inflate each other's numbers.
+
+Selection favours accuracy but charges for latency, because the winner runs
+inside the real-time loop:
+
+    score = cv_mae * (1 + latency_weight * predict_us / latency_budget_us)
+
+Candidates slower than the budget are only chosen if nothing fits in it.
+"""
+import os
+import time
+import shutil
+import tempfile
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.model_selection import KFold
+from sklearn.metrics import mean_absolute_error, r2_score
+
+# family -> (estimator, fixed parameters, grid)
+FAMILIES = {
+    'knn': (KNeighborsRegressor, {}, {
+        'n_neighbors': [3, 5, 10, 20],
+        'weights': ['uniform', 'distance'],
+    }),
+    'linear': (LinearRegression, {}, {}),
+    'ridge': (Ridge, {}, {
+        'alpha': [0.1, 1.0, 10.0],
+    }),
+    'random_forest': (RandomForestRegressor, {'n_jobs': 1, 'random_state': 42}, {
+        'n_estimators': [50, 200],
+        'max_depth': [6, None],
+    }),
+    'extra_trees': (ExtraTreesRegressor, {'n_jobs': 1, 'random_state': 42}, {
+        'n_estimators': [50, 200],
+        'max_depth': [6, None],
+    }),
+    'gradient_boosting': (HistGradientBoostingRegressor, {'random_state': 42}, {
+        'max_iter': [100, 300],
+        'learning_rate': [0.05, 0.1],
+    }),
+}
+
+# Training arrays of the current worker process, opened once by _init_worker
+_X = None
+_y = None
+
+
+def build_model(family, params=None):
+    estimator, fixed, _ = FAMILIES[family]
+    return estimator(**{**fixed, **(params or {})})
+
+
+def candidates(families=None):
+    """(family, params) for every grid point of the selected families."""
+    for family in families or FAMILIES:
+        if family not in FAMILIES:
+            raise ValueError(f"Unknown model family: {family}")
+        grid = FAMILIES[family][2]
+        names = sorted(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            yield family, dict(zip(names, values))
+
+
+def _init_worker(x_path, y_path):
+    global _X, _y
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    _X = np.load(x_path, mmap_mode='r')
+    _y = np.load(y_path, mmap_mode='r')
+
+
+def predict_cost(model, X, batch_size, min_seconds=0.2, min_calls=20):
+    """CPU microseconds per row for model.predict on `batch_size`-row batches."""
+    batch_size = max(1, min(batch_size, len(X)))
+    starts = range(0, len(X) - batch_size + 1, batch_size)[:64]
+    batches = [np.ascontiguousarray(X[i:i + batch_size]) for i in starts]
+    model.predict(batches[0])
+    calls = 0
+    start = time.process_time()
+    elapsed = 0.0
+    while calls < min_calls or elapsed < min_seconds:
+        model.predict(batches[calls % len(batches)])
+        calls += 1
+        elapsed = time.process_time() - start
+    return elapsed / (calls * batch_size) * 1e6
+
+
+def evaluate(family, params, folds, batch_size, seed):
+    """Cross-validate one candidate on the shared arrays, then time it refit on all rows."""
+    maes, r2s = [], []
+    fit_seconds = 0.0
+    for train, test in KFold(folds, shuffle=True, random_state=seed).split(_X):
+        model = build_model(family, params)
+        start = time.perf_counter()
+        model.fit(_X[train], _y[train])
+        fit_seconds += time.perf_counter() - start
+        pred = model.predict(_X[test])
+        maes.append(mean_absolute_error(_y[test], pred))
+        r2s.append(r2_score(_y[test], pred))
+
+    model = build_model(family, params).fit(_X, _y)
+    return {
+        'family': family,
+        'params': params,
+        'cv_mae': float(np.mean(maes)),
+        'cv_mae_std': float(np.std(maes)),
+        'cv_r2': float(np.mean(r2s)),
+        'fit_seconds': fit_seconds / folds,
+        'predict_us': predict_cost(model, _X, batch_size),
+    }
+
+
+def score(result, latency_budget_us, latency_weight):
+    return result['cv_mae'] * (1 + latency_weight * result['predict_us'] / latency_budget_us)
+
+
+def select(results, latency_budget_us, latency_weight):
+    """Best result by latency-weighted MAE, preferring candidates within the budget."""
+    for result in results:
+        result['score'] = score(result, latency_budget_us, latency_weight)
+        result['within_budget'] = result['predict_us'] <= latency_budget_us
+    pool = [r for r in results if r['within_budget']] or results
+    return min(pool, key=lambda r: (r['score'], -r['cv_r2']))
+
+
+def search(X, y, families=None, folds=5, batch_size=1, workers=None, seed=42, on_result=None):
+    """Evaluate every candidate in a process pool. Returns the list of result dicts.
+
+    `on_result(result)` is called in the parent as each candidate finishes,
+    e.g. to log it to MLflow.
+    """
+    # At least two rows per test fold, so R² is defined
+    folds = max(2, min(folds, len(X) // 2))
+    work_dir = tempfile.mkdtemp(prefix='model-search-')
+    x_path = os.path.join(work_dir, 'X.npy')
+    y_path = os.path.join(work_dir, 'y.npy')
+    np.save(x_path, np.ascontiguousarray(X, dtype=np.float64))
+    np.save(y_path, np.ascontiguousarray(y, dtype=np.float64))
+
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(x_path, y_path)) as pool:
+            futures = [pool.submit(evaluate, family, params, folds, batch_size, seed)
+                       for family, params in candidates(families)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
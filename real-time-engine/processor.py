@@ -1,134 +1,627 @@
 import os
-import json
 import time
 import random
 import pickle
+import logging
+import threading
+import collections
+import numpy as np
 import paho.mqtt.client as mqtt
 from datetime import datetime
-from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influx_writer import BatchingInfluxWriter, line_protocol
+from spool import DiskSpool, SpoolDrainer
+from model_artifact import CompiledKNNModel, is_artifact
+from sharding import ShardedDispatcher
+from replica_group import ReplicaGroup, SENSOR_TOPIC, member_id
+from streaming_state import PrinterStateStore
+from model_reloader import ModelReloader
+from feedback_controller import FeedbackController
+from rollups import RollupEngine, parse_window
+from metrics import Registry, MetricsServer, SamplingProfiler
+from structured_log import allowed, configure_logging, suppressed_total
+from sensor_message import REQUIRED_FIELDS, CAPABILITIES_TOPIC, MessageError, decode, dumps
 
-# Load environment
-load_dotenv('.env')  # Load the main .env
-load_dotenv('.env.real-time')  # Load the real-time specific env
+# Load environment (dotenv is only imported when there is a file to read)
+ENV_FILES = [f for f in ('.env', '.env.real-time') if os.path.exists(f)]
+if ENV_FILES:
+    from dotenv import load_dotenv
+    for env_file in ENV_FILES:
+        load_dotenv(env_file)
+
+log = logging.getLogger('processor')
 
 class RealTimeProcessor:
-    def __init__(self):
-        self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    def __init__(self, subscribe=True):
+        self.subscribe = subscribe
+        self.setup_replica_group()
+        self.client = self.mqtt_client()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         
+        self.setup_metrics()
         self.setup_mqtt()
         self.setup_influxdb()
-        self.model = self.load_model()
+        self.setup_rollups()
+        self.set_model(None)
+        self.model_ready = threading.Event()
+        self.recent_messages = collections.deque(maxlen=16)
+        self.setup_model_reload()
         self.threshold = float(os.getenv('ROUGHNESS_THRESHOLD', 75))
         self.adjustment_factor = float(os.getenv('ADJUSTMENT_FACTOR', 0.8))
+        self.setup_feedback_control()
+        self.setup_evaluation()
+        self.setup_streaming_state()
+        self.setup_inference()
+        self.start_model_load()
+
+    def setup_replica_group(self):
+        # Replicas split the sensor stream through an MQTT v5 shared subscription
+        self.group = None
+        self.pool_clients = []
+        self.message_lock = threading.Lock()
+        group = os.getenv('MQTT_SHARED_GROUP')
+        if group and self.subscribe:
+            self.group = ReplicaGroup(group, member_id())
+            log.info("Joining replica group", extra={'group': group, 'member': self.group.member})
+
+    def mqtt_client(self, suffix=''):
+        """paho client; MQTT v5 with a stable client id when a shared group is configured"""
+        if not os.getenv('MQTT_SHARED_GROUP'):
+            return mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        shard = os.getenv('PROCESSOR_SHARD_INDEX')
+        client_id = member_id() + (f'-shard-{shard}' if shard is not None else '') + suffix
+        return mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                           client_id=client_id, protocol=mqtt.MQTTv5)
 
     def setup_mqtt(self):
         max_retries = 5
         retry_delay = 5
 
+        # Extra connections in the same shared group, each with its own network thread
+        pool_size = int(os.getenv('MQTT_CLIENT_POOL', 1))
+        if pool_size > 1 and self.group is None and self.subscribe:
+            log.warning("MQTT_CLIENT_POOL needs MQTT_SHARED_GROUP, using one client")
+        elif self.group is not None:
+            self.group.configure(self.client)
+            for index in range(1, pool_size):
+                client = self.mqtt_client(f'-{index}')
+                client.on_connect = self.on_pool_connect
+                client.on_message = self.on_message
+                self.pool_clients.append(client)
+
         for attempt in range(max_retries):
             try:
-                self.client.username_pw_set(
-                    os.getenv('MQTT_USERNAME'),
-                    os.getenv('MQTT_PASSWORD'))
-                self.client.connect(os.getenv('MQTT_HOST', 'mqtt'), 1883)
-                print(" Successfully connected to MQTT broker")
+                for client in [self.client] + self.pool_clients:
+                    client.username_pw_set(
+                        os.getenv('MQTT_USERNAME'),
+                        os.getenv('MQTT_PASSWORD'))
+                    client.connect(os.getenv('MQTT_HOST', 'mqtt'), int(os.getenv('MQTT_PORT', 1883)),
+                                   keepalive=int(os.getenv('MQTT_KEEPALIVE', 60)))
+                log.info("Successfully connected to MQTT broker", extra={'clients': 1 + len(self.pool_clients)})
                 return
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
-                print(f"onnection attempt {attempt + 1} failed, retrying...")
+                log.warning("MQTT connection attempt failed, retrying", extra={'attempt': attempt + 1, 'error': str(e)})
                 time.sleep(retry_delay)
 
+    def setup_metrics(self):
+        """Hot-path histograms and counters, plus scrape-time gauges, served on METRICS_PORT"""
+        registry = Registry()
+        self.metrics = registry
+        self.decode_seconds = registry.histogram(
+            'processor_decode_seconds', 'JSON decode time per sensor message')
+        self.influx_seconds = registry.histogram(
+            'processor_influx_write_seconds', 'Time to hand one point to InfluxDB')
+        self.predict_seconds = registry.histogram(
+            'processor_predict_seconds', 'Model predict time (per call, or per micro-batch in batch mode)')
+        self.feedback_seconds = registry.histogram(
+            'processor_feedback_publish_seconds', 'Time to publish one feedback adjustment')
+        self.messages_total = registry.counter(
+            'processor_messages_total', 'Sensor messages processed')
+        self.printer_messages = None
+        if os.getenv('METRICS_PER_PRINTER', 'true').lower() == 'true':
+            self.printer_messages = registry.counter(
+                'processor_printer_messages_total', 'Sensor messages processed per printer', ['printer_id'])
+        self.errors_total = registry.counter(
+            'processor_errors_total', 'Messages that failed, by stage', ['stage'])
+        self.feedback_total = registry.counter(
+            'processor_feedback_total', 'Feedback adjustments published')
+        self.predictions_skipped = registry.counter(
+            'processor_predictions_skipped_total', 'Messages stored without a prediction while the model was loading')
+
+        # Gauges read component state only when scraped; missing components are skipped
+        registry.gauge('processor_influx_queue_depth', 'Points waiting in the InfluxDB writer',
+                       lambda: self.influx_writer.queue_depth())
+        registry.gauge('processor_influx_writer', 'InfluxDB batching writer statistics',
+                       lambda: self.influx_writer.metrics(), ['stat'])
+        registry.gauge('processor_influx_spool', 'Disk spool for InfluxDB outages: pending bytes, spooled/drained/evicted points',
+                       lambda: self.spool_drainer.metrics(), ['stat'])
+        registry.gauge('processor_inference_queue_depth', 'Messages waiting for micro-batched inference',
+                       lambda: self.inference.queue_depth())
+        registry.gauge('processor_prediction_cache', 'Prediction cache statistics',
+                       lambda: self.model.metrics(), ['stat'])
+        registry.gauge('processor_model_reload', 'Hot model reload statistics',
+                       lambda: {k: v for k, v in self.reloader.stats.items() if v is not None}, ['stat'])
+        registry.gauge('processor_feedback_control', 'Feedback debouncing: requested, sent and suppressed commands',
+                       lambda: self.feedback.metrics(), ['stat'])
+        registry.gauge('processor_state_printers', 'Printers tracked by the streaming state store',
+                       lambda: len(self.state_store.slots))
+        registry.gauge('processor_state_evictions', 'Printers evicted from the streaming state store',
+                       lambda: self.state_store.evictions)
+        registry.gauge('processor_rollups', 'In-stream rollups: points emitted per window, printers, buffered values',
+                       lambda: self.rollups.metrics(), ['stat'])
+        registry.gauge('processor_replica_group', 'Replica group: members, messages processed locally or forwarded',
+                       lambda: self.group.metrics(), ['stat'])
+        registry.gauge('processor_log_suppressed', 'Log records dropped by the rate limiter',
+                       suppressed_total)
+
+        self.metrics_server = None
+        port = int(os.getenv('METRICS_PORT', 9100))
+        if not port:
+            return
+        shard = os.getenv('PROCESSOR_SHARD_INDEX')
+        if shard is not None:
+            port += 1 + int(shard)
+        profiler = SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', 5)) / 1000.0)
+        try:
+            self.metrics_server = MetricsServer(registry, profiler, port=port)
+        except OSError as e:
+            log.error("Metrics endpoint disabled", extra={'port': port, 'error': str(e)})
+            return
+        if os.getenv('PROFILER', 'false').lower() == 'true':
+            profiler.start()
+        log.info("Metrics endpoint listening", extra={'port': port})
+
     def setup_influxdb(self):
-        self.influx_client = InfluxDBClient(
-            url=f"http://{os.getenv('INFLUXDB_HOST', 'influxdb')}:8086",
-            token=os.getenv('DOCKER_INFLUXDB_INIT_ADMIN_TOKEN'),
-            org=os.getenv('INFLUXDB_ORG'))
+        url = f"http://{os.getenv('INFLUXDB_HOST', 'influxdb')}:{os.getenv('INFLUXDB_PORT', 8086)}"
+        token = os.getenv('DOCKER_INFLUXDB_INIT_ADMIN_TOKEN')
+        self.influx_org = os.getenv('INFLUXDB_ORG')
+        self.influx_bucket = os.getenv('INFLUX_BUCKET', 'printing_metrics')
+        self.write_mode = os.getenv('INFLUX_WRITE_MODE', 'sync').lower()
+
+        # Disk spool for sink outages; replicas sharing the volume and shards each get their own directory
+        self.spool = None
+        self.spool_drainer = None
+        spool_dir = os.getenv('INFLUX_SPOOL_DIR')
+        if spool_dir:
+            if os.getenv('MQTT_SHARED_GROUP'):
+                spool_dir = os.path.join(spool_dir, member_id())
+            shard = os.getenv('PROCESSOR_SHARD_INDEX')
+            self.spool = DiskSpool(
+                os.path.join(spool_dir, f'shard-{shard}') if shard is not None else spool_dir,
+                max_bytes=int(float(os.getenv('INFLUX_SPOOL_MAX_MB', 1024)) * 1e6),
+                segment_bytes=int(float(os.getenv('INFLUX_SPOOL_SEGMENT_MB', 16)) * 1e6),
+                fsync_interval=float(os.getenv('INFLUX_SPOOL_FSYNC_INTERVAL', 1.0)))
+            log.info("InfluxDB spool enabled", extra={'directory': self.spool.directory,
+                                                      'pending_bytes': self.spool.pending_bytes()})
+        drain_batch_bytes = int(float(os.getenv('INFLUX_SPOOL_DRAIN_BATCH_MB', 4)) * 1e6)
+
+        if self.write_mode == 'batch':
+            self.influx_writer = BatchingInfluxWriter(
+                url, token, self.influx_org, self.influx_bucket,
+                batch_size=int(os.getenv('INFLUX_BATCH_SIZE', 5000)),
+                flush_interval=float(os.getenv('INFLUX_FLUSH_INTERVAL', 1.0)),
+                max_queue=int(os.getenv('INFLUX_MAX_QUEUE', 100000)),
+                overflow=os.getenv('INFLUX_OVERFLOW_POLICY', 'spool' if self.spool else 'drop_oldest'),
+                max_retries=int(os.getenv('INFLUX_MAX_RETRIES', 5)),
+                retry_backoff=float(os.getenv('INFLUX_RETRY_BACKOFF', 0.5)),
+                spool=self.spool,
+                drain_batch_bytes=drain_batch_bytes)
+            self.spool_drainer = self.influx_writer.drainer
+            log.info("InfluxDB batching writer initialized")
+            return
+
+        from influxdb_client import InfluxDBClient
+        from influxdb_client.client.write_api import SYNCHRONOUS
+        from influxdb_client.domain.write_precision import WritePrecision
+        self.influx_client = InfluxDBClient(url=url, token=token, org=self.influx_org)
         self.write_api = self.influx_client.write_api(write_options=SYNCHRONOUS)
-        print(" InfluxDB client initialized")
+        if self.spool is not None:
+            self.spool_drainer = SpoolDrainer(
+                self.spool,
+                lambda body: self.write_api.write(bucket=self.influx_bucket, org=self.influx_org,
+                                                  record=body.decode('utf-8'), write_precision=WritePrecision.NS),
+                batch_bytes=drain_batch_bytes)
+        log.info("InfluxDB client initialized")
+
+    def setup_rollups(self):
+        self.rollups = None
+        if os.getenv('ROLLUPS', 'true').lower() == 'true':
+            windows = os.getenv('ROLLUP_WINDOWS', '10s,1m,10m')
+            self.rollups = RollupEngine(
+                ['roughness', 'temperature'],
+                windows=[parse_window(w) for w in windows.split(',') if w.strip()],
+                quantile=float(os.getenv('ROLLUP_QUANTILE', 0.95)),
+                measurement=os.getenv('ROLLUP_MEASUREMENT', 'printing_metrics_rollup'))
+            log.info("In-stream rollups enabled", extra={'windows': windows})
+
+    def setup_streaming_state(self):
+        self.state_store = None
+        if os.getenv('STREAM_STATE', 'true').lower() == 'true':
+            fields = os.getenv('STREAM_FIELDS', 'nozzle_temperature,bed_temperature,roughness')
+            self.state_store = PrinterStateStore(
+                [f.strip() for f in fields.split(',') if f.strip()],
+                capacity=int(os.getenv('STREAM_MAX_PRINTERS', 50000)),
+                window=int(os.getenv('STREAM_WINDOW', 64)))
+            log.info("Streaming state store allocated", extra={
+                'printers': self.state_store.capacity,
+                'megabytes': round(self.state_store.nbytes() / 1e6, 1)})
+
+    def setup_feedback_control(self):
+        self.feedback = None
+        if os.getenv('FEEDBACK_CONTROL', 'true').lower() == 'true':
+            self.feedback = FeedbackController(
+                self.threshold,
+                float(os.getenv('FEEDBACK_RELEASE_THRESHOLD', self.threshold - 5)),
+                float(os.getenv('FEEDBACK_MIN_INTERVAL', 2.0)),
+                self.target_speed,
+                min_speed_change=float(os.getenv('FEEDBACK_MIN_SPEED_CHANGE', 1.0)),
+                max_printers=int(os.getenv('FEEDBACK_MAX_PRINTERS', 50000)))
+
+    def setup_evaluation(self):
+        # Per-message scores next to the synthesizer's anomaly label, for scripts/evaluate_detection.py
+        self.eval_topic = os.getenv('EVAL_TOPIC', '').rstrip('/')
+        if self.eval_topic:
+            log.info("Publishing evaluation records", extra={'topic': self.eval_topic + '/+'})
+
+    def setup_inference(self):
+        self.inference_mode = os.getenv('INFERENCE_MODE', 'single').lower()
+        if self.inference_mode == 'batch':
+            self.inference = BatchInferenceStage(
+                self.model,
+                self.handle_prediction,
+                max_batch_size=int(os.getenv('INFERENCE_BATCH_SIZE', 256)),
+                max_wait=float(os.getenv('INFERENCE_MAX_WAIT_MS', 5)) / 1000.0,
+                timer=self.predict_seconds,
+                ready=self.model_ready)
+            log.info("Micro-batched inference enabled")
+
+    def set_model(self, model):
+        # A fresh cache per model instance: replacing the model drops stale predictions
+        if os.getenv('PREDICTION_CACHE', 'false').lower() == 'true' and hasattr(model, 'feature_names'):
+            model = PredictionCache(
+                model,
+                quantum=float(os.getenv('PREDICTION_CACHE_QUANTUM', 0.5)),
+                capacity=int(os.getenv('PREDICTION_CACHE_SIZE', 100000)),
+                ttl=float(os.getenv('PREDICTION_CACHE_TTL', 300)))
+        self.model = model
+        # Reject messages that lack a model feature before they reach predict
+        self.required_fields = tuple(dict.fromkeys(REQUIRED_FIELDS + tuple(getattr(model, 'feature_names', ()))))
+        if hasattr(self, 'inference'):
+            self.inference.model = model
+
+    def start_model_load(self):
+        """Load the model on a background thread, so MQTT and InfluxDB are up while sklearn unpickles.
+
+        Messages that arrive first are decoded, scored and stored as usual. In batch mode their
+        predictions queue until `model_ready`; in single mode they are skipped and counted.
+        """
+        def load():
+            start = time.perf_counter()
+            model = self.load_model()
+            # The first predict of a fresh model is much slower than the rest; DummyModel needs no warm-up
+            if hasattr(model, 'feature_names'):
+                try:
+                    model.predict_batch([dict.fromkeys(model.feature_names, 0.0)])
+                except Exception as e:
+                    log.warning("Model warm-up failed", extra={'error': str(e)})
+            self.set_model(model)
+            self.model_ready.set()
+            log.info("Model ready", extra={'load_ms': round((time.perf_counter() - start) * 1000, 1)})
+        threading.Thread(target=load, name='model-load', daemon=True).start()
 
     def load_model(self):
         model_path = os.getenv('MODEL_PATH')
         if model_path and os.path.exists(model_path):
             try:
-                with open(model_path, 'rb') as f:
-                    model, scaler, feature_names = pickle.load(f)
-                    print(f" Loaded trained model from {model_path}")
-                    return TrainedSklearnModel(model, scaler, feature_names)
+                model = self.read_model(model_path)
+                log.info("Loaded trained model", extra={'path': model_path})
+                return model
             except Exception as e:
-                print(f" Failed to load trained model: {e}. Using dummy model.")
+                log.error("Failed to load trained model, using dummy model", extra={'path': model_path, 'error': str(e)})
         # Fallback to dummy model
         model_type = os.getenv('MODEL_TYPE', 'kNN')
-        print(f" Loaded {model_type} model (dummy implementation)")
+        log.info("Loaded dummy model", extra={'model_type': model_type})
         return DummyModel()
 
+    @staticmethod
+    def read_model(model_path):
+        """Load a compiled artifact directory or a pickled (model, scaler, features) tuple."""
+        if is_artifact(model_path):
+            return CompiledKNNModel.load(model_path)
+        with open(model_path, 'rb') as f:
+            model, scaler, feature_names = pickle.load(f)
+        return TrainedSklearnModel(model, scaler, feature_names)
+
+    def setup_model_reload(self):
+        self.reload_topic = os.getenv('MODEL_RELOAD_TOPIC', 'processor/control/reload')
+        model_path = os.getenv('MODEL_PATH')
+        if os.getenv('MODEL_RELOAD', 'true').lower() != 'true' or not model_path:
+            return
+        self.reloader = ModelReloader(
+            model_path, self.read_model, self.set_model,
+            warmup_rows=lambda: list(self.recent_messages) or [{}],
+            poll_interval=float(os.getenv('MODEL_RELOAD_INTERVAL', 5)))
+        self.client.message_callback_add(self.reload_topic, self.on_reload_request)
+
+    def on_reload_request(self, client, userdata, message):
+        log.info("Model reload requested", extra={'topic': message.topic})
+        self.reloader.request_reload()
+
     def on_connect(self, client, userdata, flags, reason_code, properties):
-        print(f"MQTT Connected with result code {reason_code}")
-        client.subscribe('printing/+/sensor')
+        log.info("MQTT connected", extra={'reason_code': str(reason_code)})
+        if self.subscribe:
+            if self.group is not None:
+                client.subscribe(self.group.sensor_subscriptions())
+                self.group.join(client)
+            else:
+                client.subscribe(SENSOR_TOPIC)
+            # Retained, so publishers learn which payload formats we decode whenever they connect
+            formats = [f.strip() for f in os.getenv('PAYLOAD_FORMATS', 'json,binary').split(',') if f.strip()]
+            client.publish(CAPABILITIES_TOPIC, dumps({'payload_formats': formats}), qos=1, retain=True)
+        if hasattr(self, 'reloader'):
+            client.subscribe(self.reload_topic)
+
+    def on_pool_connect(self, client, userdata, flags, reason_code, properties):
+        log.info("MQTT pool client connected", extra={'reason_code': str(reason_code)})
+        client.subscribe(self.group.sensor_subscriptions())
 
     def on_message(self, client, userdata, message):
+        if self.group is not None and self.group.route(client, message.topic, message.payload) is None:
+            return
+        # Pool clients deliver on their own network threads
+        with self.message_lock:
+            self.handle_payload(message.payload)
+
+    def handle_payload(self, payload):
+        start = time.perf_counter()
         try:
-            data = json.loads(message.payload.decode())
-            self.process_message(data)
-        except Exception as e:
-            print(f" Processing error: {e}")
+            msg = decode(payload, self.required_fields)
+        except MessageError as e:
+            self.errors_total.inc(labels=('decode',))
+            if allowed(log, "Rejected sensor message"):
+                log.warning("Rejected sensor message", extra={'error': str(e)})
+            self.publish_rejected_evaluation(payload)
+            return
+        self.decode_seconds.observe(time.perf_counter() - start)
+        self.process_message(msg)
+
+    def publish_rejected_evaluation(self, payload):
+        # A rejected message still counts for evaluation: a labelled one is an anomaly we missed
+        if not self.eval_topic:
+            return
+        try:
+            msg = decode(payload, ('printer_id',))
+        except MessageError:
+            return
+        self.client.publish(f"{self.eval_topic}/{msg.printer_id}", dumps({
+            'printer_id': msg.printer_id,
+            'cycle_count': msg.cycle_count,
+            'anomaly': msg.anomaly,
+            'anomaly_score': None,
+            'rejected': True,
+        }))
 
     def process_message(self, data):
         try:
-            # 1. Store in InfluxDB
+            self.recent_messages.append(data)
+            self.messages_total.inc()
+            if self.printer_messages is not None:
+                self.printer_messages.inc(labels=(data.printer_id,))
+
+            # 1. Update the printer's streaming state and score the sample
+            if self.state_store is not None:
+                data.anomaly_score = self.state_store.update(data.printer_id, data)
+
+            # 2. Store in InfluxDB
+            start = time.perf_counter()
             self.store_in_influx(data)
+            self.influx_seconds.observe(time.perf_counter() - start)
             
-            # 2. Run ML prediction
+            # 3. Run ML prediction (batched mode hands off to the inference thread)
+            if self.inference_mode == 'batch':
+                self.inference.submit(data)
+                return
+            if not self.model_ready.is_set():
+                # Only right after startup, until the background model load is done
+                self.predictions_skipped.inc()
+                return
+            start = time.perf_counter()
             prediction = self.model.predict(data)
+            self.predict_seconds.observe(time.perf_counter() - start)
             
-            # 3. Check thresholds and send feedback
-            if data.get('roughness', 0) > self.threshold:
-                self.send_feedback(data, prediction)
+            # 4. Check thresholds and send feedback
+            self.handle_prediction(data, prediction)
         except Exception as e:
-            print(f"Message processing failed: {e}")
+            self.errors_total.inc(labels=('process',))
+            if allowed(log, "Message processing failed"):
+                log.error("Message processing failed", extra={'printer_id': data.printer_id, 'error': str(e)})
+
+    def handle_prediction(self, data, prediction):
+        if data.anomaly_score is not None:
+            prediction['anomaly_score'] = data.anomaly_score
+        if self.eval_topic:
+            self.client.publish(f"{self.eval_topic}/{data.printer_id}", dumps({
+                'printer_id': data.printer_id,
+                'cycle_count': data.cycle_count,
+                'anomaly': data.anomaly,
+                'anomaly_score': prediction.get('anomaly_score'),
+                'predicted_roughness': prediction.get('predicted_roughness'),
+            }))
+        if self.feedback is None:
+            if data.roughness > self.threshold:
+                self.send_feedback(data, prediction)
+            return
+        # The controller may also release coalesced commands for other printers
+        for pending, pending_prediction in self.feedback.observe(
+                data.printer_id, data.roughness, data, prediction, time.monotonic()):
+            self.send_feedback(pending, pending_prediction)
+
+    def target_speed(self, data):
+        return max(10, data.print_speed * self.adjustment_factor)  # Ensure minimum speed
 
     def store_in_influx(self, data):
-        point = Point("printing_metrics") \
-            .tag("printer_id", data['printer_id']) \
-            .field("roughness", float(data['roughness'])) \
-            .field("temperature", float(data['nozzle_temperature'])) \
-            .time(datetime.utcnow())
+        fields = {'roughness': data.roughness,
+                  'temperature': data.nozzle_temperature}
+        if data.anomaly_score is not None:
+            fields['anomaly_score'] = float(data.anomaly_score)
+        timestamp = time.time_ns()
+        self.write_point("printing_metrics", {'printer_id': data.printer_id}, fields, timestamp)
+
+        # Same timestamp as the raw point, so the rollups can be recomputed from the raw data
+        if self.rollups is not None:
+            for point in self.rollups.observe(
+                    data.printer_id, (data.roughness, data.nozzle_temperature), timestamp):
+                self.write_point(*point)
+
+    def write_point(self, measurement, tags, fields, timestamp):
+        if self.write_mode == 'batch':
+            self.influx_writer.write(line_protocol(measurement, tags, fields, timestamp))
+            return
+        if self.spool_drainer is not None and not self.spool_drainer.healthy:
+            # Sink down: spool instead of blocking the prediction that follows
+            self.spool.append([line_protocol(measurement, tags, fields, timestamp)])
+            return
 
-        self.write_api.write(
-            bucket=os.getenv('INFLUX_BUCKET', 'printing_metrics'),
-            org=os.getenv('INFLUXDB_ORG'),
-            record=point)
+        from influxdb_client import Point, WritePrecision
+        point = Point(measurement).time(timestamp, WritePrecision.NS)
+        for name, value in tags.items():
+            point = point.tag(name, value)
+        for name, value in fields.items():
+            point = point.field(name, value)
+
+        try:
+            self.write_api.write(
+                bucket=self.influx_bucket,
+                org=self.influx_org,
+                record=point)
+        except Exception:
+            if self.spool_drainer is None:
+                raise
+            self.spool.append([line_protocol(measurement, tags, fields, timestamp)])
+            self.spool_drainer.mark_unhealthy()
 
     def send_feedback(self, data, prediction):
         adjustment = {
-            'printer_id': data['printer_id'],
+            'printer_id': data.printer_id,
+            'cycle_count': data.cycle_count,
             'timestamp': datetime.utcnow().isoformat(),
-            'original_speed': data['print_speed'],
-            'new_speed': max(10, data['print_speed'] * self.adjustment_factor),  # Ensure minimum speed
+            'original_speed': data.print_speed,
+            'new_speed': self.target_speed(data),
             'reason': f"roughness_threshold_exceeded_{self.threshold}",
             'prediction': prediction
         }
 
+        start = time.perf_counter()
         self.client.publish(
-            f"printer/control/{data['printer_id']}",
-            json.dumps(adjustment),
+            f"printer/control/{data.printer_id}",
+            dumps(adjustment),
             qos=1)
+        self.feedback_seconds.observe(time.perf_counter() - start)
+        self.feedback_total.inc()
 
-        print(f"Sent adjustment for {data['printer_id']}: {adjustment}")
+        # Per command, so DEBUG only; processor_feedback_total counts them
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Sent adjustment", extra={
+                'printer_id': data.printer_id,
+                'original_speed': adjustment['original_speed'],
+                'new_speed': adjustment['new_speed']})
 
     def run(self):
+        for client in self.pool_clients:
+            client.loop_start()
         try:
             self.client.loop_forever()
         except KeyboardInterrupt:
-            print("\nGracefully shutting down...")
+            log.info("Gracefully shutting down")
         finally:
-            self.client.disconnect()
-            if hasattr(self, 'influx_client'):
-                self.influx_client.close()
+            self.shutdown()
+
+    def leave_group(self):
+        """Stop taking sensor messages so the other replicas pick up this one's printers."""
+        if self.group is not None:
+            self.group.leave(self.client)
+            log.info("Left replica group", extra={'stats': self.group.metrics()})
+        for client in self.pool_clients:
+            client.disconnect()
+            client.loop_stop()
+
+    def shutdown(self):
+        self.leave_group()
+        if hasattr(self, 'reloader'):
+            self.reloader.stop()
+            log.info("Model reloader stopped", extra={'stats': self.reloader.stats})
+        # Drain pending predictions first so their feedback can still be published
+        if hasattr(self, 'inference'):
+            self.inference.close()
+        self.client.disconnect()
+        self.client.loop_stop()
+        stats = {}
+        if self.feedback is not None:
+            log.info("Feedback control", extra={'stats': self.feedback.metrics()})
+        if isinstance(self.model, PredictionCache):
+            log.info("Prediction cache", extra={'stats': self.model.metrics()})
+        if self.rollups is not None:
+            # Partial windows are written too; a restart within the window overwrites them
+            for point in self.rollups.flush():
+                self.write_point(*point)
+        if hasattr(self, 'influx_writer'):
+            self.influx_writer.close()
+            stats = self.influx_writer.metrics()
+            log.info("InfluxDB writer flushed", extra={'stats': stats})
+        if self.spool_drainer is not None:
+            log.info("InfluxDB spool", extra={'stats': self.spool_drainer.metrics()})
+        if hasattr(self, 'influx_client'):
+            if self.spool_drainer is not None:
+                self.spool_drainer.close()
+            self.influx_client.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        return stats
+
+class ShardedProcessor(RealTimeProcessor):
+    """Front end that fans sensor messages out to per-printer worker processes"""
+    def __init__(self, workers):
+        self.subscribe = True
+        self.dispatcher = ShardedDispatcher(
+            workers, make_shard_worker,
+            max_queue=int(os.getenv('PROCESSOR_SHARD_QUEUE', 10000)))
+        self.dispatcher.start()
+        self.setup_replica_group()
+        self.client = self.mqtt_client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.setup_metrics()
+        self.metrics.gauge('processor_shard_queue_depth', 'Payloads waiting per worker shard',
+                           lambda: dict(enumerate(self.dispatcher.queue_depths())), ['shard'])
+        self.metrics.gauge('processor_shard_dispatched', 'Payloads dispatched per worker shard',
+                           lambda: dict(enumerate(self.dispatcher.dispatched)), ['shard'])
+        self.setup_mqtt()
+
+    def on_message(self, client, userdata, message):
+        if self.group is None:
+            self.dispatcher.dispatch(message.topic, message.payload)
+            return
+        printer_id = self.group.route(client, message.topic, message.payload)
+        if printer_id is not None:
+            with self.message_lock:
+                self.dispatcher.dispatch_printer(printer_id, message.payload)
+
+    def shutdown(self):
+        self.leave_group()
+        self.client.disconnect()
+        for stats in self.dispatcher.stop():
+            log.info("Shard stopped", extra={'shard': stats['worker'], 'messages': stats['messages']})
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+
+def make_shard_worker():
+    # Runs inside each worker process: own model, Influx writer and feedback publisher
+    configure_logging()
+    processor = RealTimeProcessor(subscribe=False)
+    processor.client.loop_start()
+    return processor
 
 class TrainedSklearnModel:
     """Wrapper for a scikit-learn model trained offline"""
@@ -146,11 +639,21 @@ class TrainedSklearnModel:
         X_scaled = self.scaler.transform([X])[0]
         pred = self.model.predict([X_scaled])[0]
         return {
-            'predicted_roughness': pred,
+            'predicted_roughness': float(pred),
             'confidence': 0.95,   # could be derived from model uncertainty if available
             'anomaly_score': 0.0  # placeholder
         }
 
+    def predict_batch(self, rows):
+        # One feature matrix, one scaler pass and one model call for the whole batch
+        X = np.array([[row.get(f, 0.0) for f in self.feature_names] for row in rows], dtype=float)
+        preds = self.model.predict(self.scaler.transform(X))
+        return [{
+            'predicted_roughness': float(pred),
+            'confidence': 0.95,
+            'anomaly_score': 0.0
+        } for pred in preds]
+
 class DummyModel:
     """Placeholder for actual ML model"""
     def predict(self, data):
@@ -160,11 +663,172 @@ class DummyModel:
             'anomaly_score': random.uniform(0, 0.2)  # Added anomaly detection placeholder
         }
 
+    def predict_batch(self, rows):
+        return [self.predict(row) for row in rows]
+
+class PredictionCache:
+    """LRU/TTL cache in front of a model, keyed on the quantized feature vector.
+
+    Features are bucketed to multiples of `quantum` before lookup, so printers
+    in steady state hit the cache instead of running scaler + predict. Entries
+    older than `ttl` seconds are recomputed; beyond `capacity` entries the
+    least recently used one is evicted.
+    """
+    def __init__(self, model, quantum=0.5, capacity=100000, ttl=300.0):
+        self.model = model
+        self.feature_names = model.feature_names
+        self.quantum = quantum
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, data):
+        q = self.quantum
+        return tuple(round(data.get(f, 0.0) / q) for f in self.feature_names)
+
+    def _get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, prediction = entry
+        if expires < now:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return prediction
+
+    def _put(self, key, prediction, now):
+        self.entries[key] = (now + self.ttl, prediction)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def predict(self, data):
+        now = time.monotonic()
+        key = self.key(data)
+        prediction = self._get(key, now)
+        if prediction is not None:
+            self.hits += 1
+            return dict(prediction)
+        self.misses += 1
+        prediction = self.model.predict(data)
+        self._put(key, dict(prediction), now)
+        return prediction
+
+    def predict_batch(self, rows):
+        now = time.monotonic()
+        keys = [self.key(row) for row in rows]
+        results = [self._get(key, now) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        self.hits += len(rows) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = self.model.predict_batch([rows[i] for i in missing])
+            for i, prediction in zip(missing, computed):
+                self._put(keys[i], dict(prediction), now)
+                results[i] = prediction
+        return [dict(r) for r in results]
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'entries': len(self.entries),
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+class BatchInferenceStage:
+    """Gathers messages across printers and runs the model once per micro-batch.
+
+    A batch is dispatched when it reaches `max_batch_size` or when the oldest
+    queued message has waited `max_wait` seconds, whichever comes first. Each
+    result is handed back to `callback(data, prediction)` in arrival order.
+    Batches wait for `ready` (the model load at startup) on the inference thread.
+    """
+    def __init__(self, model, callback, max_batch_size=256, max_wait=0.005, timer=None, ready=None):
+        self.model = model
+        self.timer = timer
+        self.ready = ready
+        self.callback = callback
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.messages = 0
+        self._thread = threading.Thread(target=self._run, name='batch-inference', daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        with self._cond:
+            self._queue.append((time.monotonic(), data))
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch_size:
+                self._cond.notify()
+
+    def queue_depth(self):
+        return len(self._queue)
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = self._queue[0][0] + self.max_wait
+                while len(self._queue) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                count = min(self.max_batch_size, len(self._queue))
+                batch = [self._queue.popleft()[1] for _ in range(count)]
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        if self.ready is not None:
+            self.ready.wait()
+        start = time.perf_counter()
+        try:
+            predictions = self.model.predict_batch(batch)
+        except Exception as e:
+            log.error("Batch inference failed", extra={'messages': len(batch), 'error': str(e)})
+            return
+        if self.timer is not None:
+            self.timer.observe(time.perf_counter() - start)
+        self.batches += 1
+        self.messages += len(batch)
+        for data, prediction in zip(batch, predictions):
+            try:
+                self.callback(data, prediction)
+            except Exception as e:
+                log.error("Message processing failed", extra={'printer_id': data.printer_id, 'error': str(e)})
+
 if __name__ == "__main__":
-    print("Starting Real-Time Processor")
+    configure_logging()
+    log.info("Starting Real-Time Processor")
     try:
-        processor = RealTimeProcessor()
+        workers = int(os.getenv('PROCESSOR_WORKERS', 1))
+        if workers > 1:
+            processor = ShardedProcessor(workers)
+        else:
+            processor = RealTimeProcessor()
         processor.run()
     except Exception as e:
-        print(f"Critical error: {str(e)}")
+        log.critical("Critical error", extra={'error': str(e)})
         exit(1)
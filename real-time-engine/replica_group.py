@@ -0,0 +1,160 @@
+"""
+Horizontal scaling of the processor: several replicas behind one broker.
+
+Every replica subscribes to the sensor topic through an MQTT v5 shared
+subscription, `$share/<group>/printing/+/sensor`, so the broker hands each
+message to one member of the group instead of to every replica. Mosquitto
+picks that member round-robin per message, which on its own would split a
+printer's stream, and with it the printer's streaming state, feedback
+debouncing and rollup windows, across replicas. Ownership is therefore
+settled between the replicas:
+
+- Each replica announces itself with a retained message on
+  `processor/<group>/members/<member>`. Its will, or a clean shutdown,
+  clears that message. Every replica subscribes to
+  `processor/<group>/members/+`, so all of them see the same member set.
+- A printer belongs to the member with the highest rendezvous hash of
+  (member, printer_id). A replica joining or leaving moves only the
+  printers it gains or loses, about 1/N of them, and the rest keep their
+  state.
+- A replica processes messages for printers it owns and republishes the
+  raw payload of the others to `processor/<group>/forward/<owner>/<printer_id>`.
+  Whoever receives a forwarded message processes it. It is never forwarded
+  again, so replicas that briefly disagree during a rebalance cannot bounce
+  messages between them. Forwards are published and subscribed at QoS 1, so
+  the hop does not lose messages while the broker and both replicas stay up.
+
+Ownership keeps a printer's state on one replica, but not its message order.
+A forwarded message takes one more broker hop than a message the owner got
+directly, so a printer's samples can reach the owner out of cycle_count
+order, by about one broker round trip. Streaming state and the feedback
+controller see them in arrival order. A rollup puts a sample that arrives
+after its window closed into the printer's current window.
+
+The forwarding hop costs the broker (N-1)/N extra publishes per sensor
+message, but decoding, inference and InfluxDB writes scale with the number
+of replicas. Per-printer state is not handed over on a rebalance. The new
+owner starts the moved printers cold, and the streaming window refills
+within STREAM_WINDOW samples. Both owners write their partial rollup window
+with the same tags and timestamp, so the later write replaces the earlier
+one.
+"""
+import os
+import socket
+import hashlib
+import logging
+
+from sharding import printer_id_from_topic
+from sensor_message import dumps
+
+log = logging.getLogger(__name__)
+
+SENSOR_TOPIC = 'printing/+/sensor'
+
+
+def member_id():
+    """MQTT_CLIENT_ID, or processor-<hostname>: unique per container under `docker compose --scale`."""
+    return os.getenv('MQTT_CLIENT_ID') or f'processor-{socket.gethostname()}'
+
+
+def rendezvous_owner(printer_id, members):
+    """Member that owns `printer_id`: the highest hash of (member, printer_id), same in every process."""
+    key = printer_id.encode('utf-8')
+    return max(members, key=lambda member: hashlib.blake2b(
+        key, digest_size=8, key=member.encode('utf-8')[:64]).digest())
+
+
+class ReplicaGroup:
+    """Shared-subscription membership and per-printer ownership for one replica"""
+    def __init__(self, group, member, qos=1):
+        self.group = group
+        self.member = member
+        self.qos = qos
+        self.members_prefix = f'processor/{group}/members/'
+        self.forward_prefix = f'processor/{group}/forward/'
+        self.members = frozenset([member])
+        self._owners = {}
+        self._leaving = False
+        # Set when our own announcement comes back: subscriptions made before it are active
+        self.joined = False
+        self.stats = {
+            'local': 0,
+            'forwarded': 0,
+            'forwarded_in': 0,
+            'rebalances': 0,
+        }
+
+    @property
+    def presence_topic(self):
+        return self.members_prefix + self.member
+
+    def sensor_subscriptions(self):
+        """(topic filter, qos) for every client in the replica's pool"""
+        return [
+            (f'$share/{self.group}/{SENSOR_TOPIC}', 0),
+            # Forwarded messages are spread over the pool as well
+            (f'$share/{self.group}-{self.member}/{self.forward_prefix}{self.member}/+', self.qos),
+        ]
+
+    def configure(self, client):
+        """Set the will that removes this member if the connection drops; call before connect."""
+        client.will_set(self.presence_topic, payload=None, qos=1, retain=True)
+
+    def join(self, client):
+        """Subscribe to membership changes and announce this member (on every connect, after
+        subscribing to the sensor topics)."""
+        client.message_callback_add(self.members_prefix + '+', self.on_member)
+        client.subscribe(self.members_prefix + '+', qos=1)
+        self._announce(client)
+
+    def leave(self, client):
+        self._leaving = True
+        client.publish(self.presence_topic, payload=None, qos=1, retain=True)
+
+    def _announce(self, client):
+        client.publish(self.presence_topic, dumps({'member': self.member, 'pid': os.getpid()}),
+                       qos=1, retain=True)
+
+    def on_member(self, client, userdata, message):
+        member = message.topic[len(self.members_prefix):]
+        if member == self.member:
+            if message.payload:
+                self.joined = True
+            elif not self._leaving:
+                # A previous connection's will cleared our presence after we announced it
+                self._announce(client)
+            return
+        members = set(self.members)
+        if message.payload:
+            members.add(member)
+        else:
+            members.discard(member)
+        if members != self.members:
+            # Swap both at once; route() runs on other threads
+            self.members, self._owners = frozenset(members), {}
+            self.stats['rebalances'] += 1
+            log.info("Replica group changed", extra={'group': self.group, 'members': sorted(members)})
+
+    def route(self, client, topic, payload):
+        """Printer id if this replica should process the message, else None after forwarding it."""
+        if topic.startswith(self.forward_prefix):
+            self.stats['forwarded_in'] += 1
+            return topic.rsplit('/', 1)[1]
+        printer_id = printer_id_from_topic(topic)
+        owners = self._owners
+        owner = owners.get(printer_id)
+        if owner is None:
+            owner = owners[printer_id] = rendezvous_owner(printer_id, self.members)
+        if owner == self.member:
+            self.stats['local'] += 1
+            return printer_id
+        client.publish(f'{self.forward_prefix}{owner}/{printer_id}', payload, qos=self.qos)
+        self.stats['forwarded'] += 1
+        return None
+
+    def metrics(self):
+        stats = dict(self.stats)
+        stats['members'] = len(self.members)
+        stats['joined'] = int(self.joined)
+        stats['printers_owned'] = sum(1 for owner in self._owners.values() if owner == self.member)
+        return stats
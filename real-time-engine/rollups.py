@@ -0,0 +1,253 @@
+"""
+In-stream per-printer rollups (downsampling) of the raw sensor points.
+
+Every raw point the processor writes to `printing_metrics` is also folded
+into per-printer windows, by default 10 s, 1 min and 10 min, aligned to the
+epoch. When a window closes its mean/min/max/p95 per field and the sample
+count are written as one point to a separate measurement:
+
+    printing_metrics_rollup,printer_id=<id>,window=10s
+        roughness_mean=..,roughness_min=..,roughness_max=..,roughness_p95=..,
+        temperature_mean=..,...,count=<n>i  <window start, ns>
+
+Only the smallest window buffers raw values (one array('d') per field), so
+memory follows message rate x base window, not printer count x history.
+On close its stats are computed exactly with NumPy and folded into every
+larger window: count/sum/min/max merge exactly, and the values are added to
+a log-bucketed quantile sketch (relative error `accuracy`, 1% by default)
+from which the larger windows' p95 is read. p95 is the nearest-rank
+percentile (numpy method='inverted_cdf') in both cases.
+
+Windows close when the printer's next sample falls past their end, and a
+sweep at most once per base window closes those of printers that went
+silent. `flush` closes everything that is still open (at shutdown).
+"""
+import math
+from array import array
+
+import numpy as np
+
+# Sketch keys: 0 is the zero bucket, +-(_OFFSET + i) the bucket gamma^(i-1) < |v| <= gamma^i
+_OFFSET = 1 << 20
+_TINY = 1e-9
+
+
+def parse_window(text):
+    """'10s', '1m', '10m', '1h' or plain seconds -> seconds."""
+    text = text.strip()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+def window_label(seconds):
+    for unit, size in (('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f'{seconds // size}{unit}'
+    return f'{seconds}s'
+
+
+class QuantileSketch:
+    """Bucket counts on a log scale; quantiles within `accuracy` relative error."""
+    __slots__ = ('counts', 'n')
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+
+    @staticmethod
+    def keys(values, log_gamma):
+        magnitude = np.abs(values)
+        index = np.ceil(np.log(np.maximum(magnitude, _TINY)) / log_gamma).astype(np.int64) + _OFFSET
+        return np.where(magnitude <= _TINY, 0, np.where(values < 0, -index, index))
+
+    def add(self, values, log_gamma):
+        uniques, counts = np.unique(self.keys(values, log_gamma), return_counts=True)
+        table = self.counts
+        for key, count in zip(uniques.tolist(), counts.tolist()):
+            table[key] = table.get(key, 0) + count
+        self.n += len(values)
+
+    def quantile(self, q, gamma):
+        rank = max(1, math.ceil(q * self.n))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                break
+        if key == 0:
+            return 0.0
+        # Midpoint of the bucket in relative terms
+        value = 2.0 * gamma ** (abs(key) - _OFFSET) / (gamma + 1.0)
+        return value if key > 0 else -value
+
+
+class WindowAggregate:
+    """Merged statistics of one larger window: exact count/sum/min/max plus sketches."""
+    __slots__ = ('start', 'count', 'sums', 'mins', 'maxs', 'sketches')
+
+    def __init__(self, start, n_fields):
+        self.start = start
+        self.count = 0
+        self.sums = [0.0] * n_fields
+        self.mins = [math.inf] * n_fields
+        self.maxs = [-math.inf] * n_fields
+        self.sketches = [QuantileSketch() for _ in range(n_fields)]
+
+
+class PrinterRollup:
+    __slots__ = ('start', 'buffers', 'parents')
+
+    def __init__(self, n_fields):
+        self.start = None
+        self.buffers = [array('d') for _ in range(n_fields)]
+        self.parents = {}
+
+
+class RollupEngine:
+    def __init__(self, fields, windows=(10, 60, 600), quantile=0.95, accuracy=0.01,
+                 measurement='printing_metrics_rollup'):
+        self.fields = list(fields)
+        self.windows = sorted(int(w) for w in windows)
+        self.base = self.windows[0]
+        if any(w % self.base for w in self.windows):
+            raise ValueError(f"Rollup windows must be multiples of the smallest one: {self.windows}")
+        self.labels = {w: window_label(w) for w in self.windows}
+        self.quantile = quantile
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.measurement = measurement
+        self.suffix = f'p{quantile * 100:g}'
+        self.printers = {}
+        self.next_sweep = None
+        self.emitted = dict.fromkeys(self.labels.values(), 0)
+
+    def observe(self, printer_id, values, timestamp_ns):
+        """Add one sample ([value per field]); returns rollup points for windows it closed."""
+        now = timestamp_ns // 1_000_000_000
+        out = []
+        if self.next_sweep is None or now >= self.next_sweep:
+            self.sweep(now, out)
+        printer = self.printers.get(printer_id)
+        if printer is None:
+            printer = self.printers[printer_id] = PrinterRollup(len(self.fields))
+        start = now - now % self.base
+        if printer.start is not None and start < printer.start:
+            # Clock stepped back: keep filling the current window
+            start = printer.start
+        if printer.start != start:
+            if printer.start is not None and len(printer.buffers[0]):
+                self._close_base(printer_id, printer, out)
+            printer.start = start
+            self._close_parents(printer_id, printer, start, out)
+        for buffer, value in zip(printer.buffers, values):
+            buffer.append(value)
+        return out
+
+    def sweep(self, now, out=None):
+        """Close windows that ended before `now` for printers that have gone quiet."""
+        out = [] if out is None else out
+        start = now - now % self.base
+        for printer_id in list(self.printers):
+            printer = self.printers[printer_id]
+            if printer.start is not None and printer.start < start and len(printer.buffers[0]):
+                self._close_base(printer_id, printer, out)
+            self._close_parents(printer_id, printer, start, out)
+            if not printer.parents and not len(printer.buffers[0]):
+                del self.printers[printer_id]
+        self.next_sweep = start + self.base
+        return out
+
+    def flush(self):
+        """Close every open window, e.g. on shutdown. Returns the rollup points."""
+        out = []
+        for printer_id, printer in self.printers.items():
+            if len(printer.buffers[0]):
+                self._close_base(printer_id, printer, out)
+            self._close_parents(printer_id, printer, None, out)
+        self.printers.clear()
+        return out
+
+    def _close_base(self, printer_id, printer, out):
+        columns = [np.frombuffer(buffer, dtype=np.float64) for buffer in printer.buffers]
+        count = len(columns[0])
+        fields = {}
+        for name, column in zip(self.fields, columns):
+            fields[f'{name}_mean'] = float(column.mean())
+            fields[f'{name}_min'] = float(column.min())
+            fields[f'{name}_max'] = float(column.max())
+            fields[f'{name}_{self.suffix}'] = float(np.percentile(column, self.quantile * 100,
+                                                                   method='inverted_cdf'))
+        fields['count'] = count
+        self._emit(printer_id, self.base, printer.start, fields, out)
+
+        self._close_parents(printer_id, printer, printer.start, out)
+        for window in self.windows[1:]:
+            start = printer.start - printer.start % window
+            parent = printer.parents.get(window)
+            if parent is None:
+                parent = printer.parents[window] = WindowAggregate(start, len(self.fields))
+            parent.count += count
+            for i, (name, column) in enumerate(zip(self.fields, columns)):
+                parent.sums[i] += float(column.sum())
+                parent.mins[i] = min(parent.mins[i], fields[f'{name}_min'])
+                parent.maxs[i] = max(parent.maxs[i], fields[f'{name}_max'])
+                parent.sketches[i].add(column, self.log_gamma)
+        # Fresh arrays: the views above may still be referenced by NumPy
+        printer.buffers = [array('d') for _ in self.fields]
+
+    def _close_parents(self, printer_id, printer, base_start, out):
+        """Emit larger windows that `base_start` has moved past (all of them if None)."""
+        for window in self.windows[1:]:
+            parent = printer.parents.get(window)
+            if parent is None or (base_start is not None and base_start < parent.start + window):
+                continue
+            fields = {}
+            for i, name in enumerate(self.fields):
+                fields[f'{name}_mean'] = parent.sums[i] / parent.count
+                fields[f'{name}_min'] = parent.mins[i]
+                fields[f'{name}_max'] = parent.maxs[i]
+                fields[f'{name}_{self.suffix}'] = parent.sketches[i].quantile(self.quantile, self.gamma)
+            fields['count'] = parent.count
+            self._emit(printer_id, window, parent.start, fields, out)
+            del printer.parents[window]
+
+    def _emit(self, printer_id, window, start, fields, out):
+        label = self.labels[window]
+        self.emitted[label] += 1
+        out.append((self.measurement, {'printer_id': printer_id, 'window': label},
+                    fields, start * 1_000_000_000))
+
+    def metrics(self):
+        stats = {f'emitted_{label}': count for label, count in self.emitted.items()}
+        stats['printers'] = len(self.printers)
+        stats['buffered_values'] = sum(len(p.buffers[0]) for p in self.printers.values())
+        return stats
+
+
+def recompute(points, fields, windows, quantile=0.95):
+    """Rollups recomputed from raw points [(printer_id, timestamp_ns, [values])], for checking.
+
+    Returns {(printer_id, window_label, start_ns): {field: value}} with the
+    same field names the engine emits.
+    """
+    groups = {}
+    for printer_id, timestamp_ns, values in points:
+        second = timestamp_ns // 1_000_000_000
+        for window in windows:
+            key = (printer_id, window_label(window), (second - second % window) * 1_000_000_000)
+            groups.setdefault(key, []).append(values)
+    suffix = f'p{quantile * 100:g}'
+    result = {}
+    for key, rows in groups.items():
+        matrix = np.asarray(rows, dtype=np.float64)
+        expected = {'count': len(rows)}
+        for i, name in enumerate(fields):
+            column = matrix[:, i]
+            expected[f'{name}_mean'] = float(column.mean())
+            expected[f'{name}_min'] = float(column.min())
+            expected[f'{name}_max'] = float(column.max())
+            expected[f'{name}_{suffix}'] = float(np.percentile(column, quantile * 100, method='inverted_cdf'))
+        result[key] = expected
+    return result
@@ -0,0 +1,198 @@
+"""
+Typed sensor messages and the wire formats they travel in.
+
+A payload is decoded once into a `SensorMessage`, a `__slots__` object with
+one attribute per schema field, so the processor reads `msg.roughness`
+instead of repeating dict lookups. The object also answers `get()`,
+`[]` and `in` for code (models, state store, cache) that was written
+against plain dicts.
+
+Two payload formats are accepted on the same topic and told apart by the
+first byte:
+
+    JSON    a UTF-8 object (never starts with 0xB1). Decoded with orjson
+            when it is installed, otherwise the standard library.
+    binary  struct-packed, starting with BINARY_MAGIC (0xB1):
+
+                <B I d 10f>   magic, cycle_count, timestamp (epoch seconds),
+                              NUMERIC_FIELDS as float32 (NaN = missing)
+                then          printer_id, infill_pattern, material, anomaly
+                              as uint8 length + UTF-8 bytes (length 0 = absent)
+
+The layout is mirrored by the synthesizer's wire_format.py; change both
+together. The processor advertises the formats it accepts as a retained
+message on CAPABILITIES_TOPIC, and the synthesizer switches to binary only
+once it sees that advertisement.
+"""
+import json
+import math
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NUMERIC_FIELDS = ('layer_height', 'wall_thickness', 'infill_density', 'nozzle_temperature',
+                  'bed_temperature', 'print_speed', 'fan_speed', 'roughness',
+                  'tension_strenght', 'elongation')
+TEXT_FIELDS = ('printer_id', 'infill_pattern', 'material', 'anomaly')
+# Fields the processor itself reads, on top of the model's features
+REQUIRED_FIELDS = ('printer_id', 'roughness', 'nozzle_temperature', 'print_speed')
+
+BINARY_MAGIC = 0xB1
+BINARY_BODY = struct.Struct('<BId%df' % len(NUMERIC_FIELDS))
+_MAGIC_BYTE = bytes((BINARY_MAGIC,))
+CAPABILITIES_TOPIC = 'processor/capabilities'
+
+_KNOWN = frozenset(NUMERIC_FIELDS + TEXT_FIELDS + ('timestamp', 'cycle_count'))
+
+
+class MessageError(ValueError):
+    """Payload that cannot be decoded or lacks a field the processor needs"""
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+else:
+    loads = json.loads
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+class SensorMessage:
+    __slots__ = NUMERIC_FIELDS + TEXT_FIELDS + ('timestamp', 'cycle_count', 'anomaly_score', 'extra')
+
+    def __init__(self, printer_id=None, timestamp=None, cycle_count=0, **fields):
+        self.printer_id = printer_id
+        self.timestamp = timestamp
+        self.cycle_count = cycle_count
+        self.anomaly_score = None
+        self.extra = None
+        for name in NUMERIC_FIELDS:
+            value = fields.pop(name, None)
+            setattr(self, name, None if value is None else float(value))
+        for name in TEXT_FIELDS[1:]:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            self.extra = fields
+
+    @classmethod
+    def from_dict(cls, data):
+        msg = cls.__new__(cls)
+        get = data.get
+        try:
+            msg._set_numeric([None if v is None else float(v) for v in map(get, NUMERIC_FIELDS)])
+        except (TypeError, ValueError) as e:
+            raise MessageError(f"non-numeric sensor value: {e}") from e
+        msg.printer_id = get('printer_id')
+        msg.infill_pattern = get('infill_pattern')
+        msg.material = get('material')
+        msg.anomaly = get('anomaly')
+        msg.timestamp = get('timestamp')
+        msg.cycle_count = get('cycle_count', 0)
+        msg.anomaly_score = None
+        msg.extra = None
+        if not _KNOWN.issuperset(data):
+            msg.extra = {k: v for k, v in data.items() if k not in _KNOWN}
+        return msg
+
+    @classmethod
+    def from_binary(cls, payload):
+        try:
+            magic, cycle_count, timestamp, *values = BINARY_BODY.unpack_from(payload)
+            texts = []
+            pos = BINARY_BODY.size
+            for _ in TEXT_FIELDS:
+                end = pos + 1 + payload[pos]
+                texts.append(payload[pos + 1:end].decode('utf-8') or None)
+                pos = end
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise MessageError(f"malformed binary payload: {e}") from e
+        if math.isnan(sum(values)):
+            values = [None if math.isnan(v) else v for v in values]
+        msg = cls.__new__(cls)
+        msg._set_numeric(values)
+        msg.printer_id, msg.infill_pattern, msg.material, msg.anomaly = texts
+        msg.timestamp = timestamp
+        msg.cycle_count = cycle_count
+        msg.anomaly_score = None
+        msg.extra = None
+        return msg
+
+    def _set_numeric(self, values):
+        # One unpacking assignment instead of a setattr() per field (order = NUMERIC_FIELDS)
+        (self.layer_height, self.wall_thickness, self.infill_density, self.nozzle_temperature,
+         self.bed_temperature, self.print_speed, self.fan_speed, self.roughness,
+         self.tension_strenght, self.elongation) = values
+
+    # Dict-style access for code written against the decoded JSON dict
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in _KNOWN else None
+        if value is None and self.extra is not None:
+            value = self.extra.get(name)
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        if name in _KNOWN:
+            setattr(self, name, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[name] = value
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def validate(self, required):
+        """Raise MessageError unless every field in `required` is present."""
+        for name in required:
+            if getattr(self, name, None) is None and self.get(name) is None:
+                raise MessageError(f"missing field: {name}")
+        return self
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__[:-2]
+                if getattr(self, name) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+def decode(payload, required=REQUIRED_FIELDS):
+    """Decode a JSON or binary sensor payload into a validated SensorMessage."""
+    if payload[:1] == _MAGIC_BYTE:
+        return SensorMessage.from_binary(payload).validate(required)
+    try:
+        data = loads(payload)
+    except ValueError as e:
+        raise MessageError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise MessageError("payload is not a JSON object")
+    return SensorMessage.from_dict(data).validate(required)
+
+
+def _text(value):
+    data = b'' if value is None else str(value).encode('utf-8')[:255]
+    return bytes((len(data),)) + data
+
+
+def encode_binary(msg):
+    """Pack a SensorMessage (or dict) in the binary format."""
+    get = msg.get
+    timestamp = get('timestamp', 0.0)
+    if not isinstance(timestamp, (int, float)):
+        timestamp = 0.0
+    values = [get(name, math.nan) for name in NUMERIC_FIELDS]
+    return (BINARY_BODY.pack(BINARY_MAGIC, int(get('cycle_count', 0)), timestamp, *values)
+            + b''.join(_text(get(name)) for name in TEXT_FIELDS))
@@ -0,0 +1,111 @@
+"""
+Process-pool sharding for the real-time processor.
+
+The dispatcher runs on the MQTT network thread and does no decoding: it
+takes the printer id from the `printing/<id>/sensor` topic, hashes it to one
+of N worker processes and forwards the raw payload. Every printer always
+lands on the same worker and each worker drains a single FIFO queue, so
+per-printer message order is preserved.
+
+Each worker builds its own processor through `worker_factory` (its own
+model copy, InfluxDB writer and MQTT publisher). The factory must be
+picklable and return an object with `handle_payload(payload)` and
+`shutdown()`; `shutdown()` may return a stats dict that is reported back
+to the dispatcher.
+"""
+import os
+import zlib
+import signal
+import logging
+import multiprocessing
+
+log = logging.getLogger(__name__)
+
+
+def shard_for(printer_id, workers):
+    """Stable shard index for a printer id (identical across processes and restarts)."""
+    return zlib.crc32(printer_id.encode('utf-8')) % workers
+
+
+def printer_id_from_topic(topic):
+    parts = topic.split('/')
+    return parts[1] if len(parts) > 2 else topic
+
+
+def _worker_main(index, queue, results, ready, worker_factory):
+    # Ctrl+C goes to the whole process group; let the dispatcher drive shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Lets the worker pick its own metrics port and log context
+    os.environ['PROCESSOR_SHARD_INDEX'] = str(index)
+    processor = worker_factory()
+    ready.release()
+    handled = 0
+    try:
+        while True:
+            payload = queue.get()
+            if payload is None:
+                break
+            processor.handle_payload(payload)
+            handled += 1
+    finally:
+        stats = processor.shutdown() or {}
+        stats.update({'worker': index, 'messages': handled})
+        results.put(stats)
+
+
+class ShardedDispatcher:
+    """Routes raw sensor payloads to worker processes by printer id"""
+    def __init__(self, workers, worker_factory, max_queue=10000):
+        self.workers = workers
+        self.worker_factory = worker_factory
+        self.max_queue = max_queue
+        self.ctx = multiprocessing.get_context('spawn')
+        self.queues = []
+        self.processes = []
+        self.results = self.ctx.Queue()
+        self.ready = self.ctx.Semaphore(0)
+        self.dispatched = [0] * workers
+
+    def start(self):
+        for index in range(self.workers):
+            queue = self.ctx.Queue(self.max_queue)
+            process = self.ctx.Process(
+                target=_worker_main,
+                args=(index, queue, self.results, self.ready, self.worker_factory),
+                name=f'processor-shard-{index}',
+                daemon=True)
+            process.start()
+            self.queues.append(queue)
+            self.processes.append(process)
+        log.info("Started processor shards", extra={'workers': self.workers})
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has built its processor. Returns False on timeout."""
+        return all(self.ready.acquire(timeout=timeout) for _ in self.processes)
+
+    def dispatch(self, topic, payload):
+        self.dispatch_printer(printer_id_from_topic(topic), payload)
+
+    def dispatch_printer(self, printer_id, payload):
+        index = shard_for(printer_id, self.workers)
+        self.queues[index].put(payload)
+        self.dispatched[index] += 1
+
+    def queue_depths(self):
+        return [q.qsize() for q in self.queues]
+
+    def stop(self, timeout=30.0):
+        """Drain every shard, wait for the workers to exit and collect their stats."""
+        for queue in self.queues:
+            queue.put(None)
+        stats = []
+        for _ in self.processes:
+            try:
+                stats.append(self.results.get(timeout=timeout))
+            except Exception:
+                break
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        return sorted(stats, key=lambda s: s['worker'])
@@ -0,0 +1,336 @@
+"""
+Disk-backed write-ahead spool for InfluxDB points.
+
+When the sink is down or cannot keep up, line-protocol points are appended
+to segment files in a local directory instead of being dropped:
+
+    <dir>/0000000000000001.spool   newline-separated line protocol, append-only
+    <dir>/0000000000000002.spool   ...
+    <dir>/cursor.json              {"segment": seq, "offset": bytes already drained}
+
+Appends go through a buffered file and are fsynced in batches, at most
+once per `fsync_interval`, by the drainer thread rather than the caller,
+so spilling a point costs about as much as a buffered write. A crash loses
+at most the last interval. The active segment is sealed at
+`segment_bytes`. When the spool exceeds `max_bytes`, the oldest segments
+are deleted first.
+
+SpoolDrainer replays the spool oldest-first in large batches (up to
+`batch_bytes` per request) once the sink accepts writes again, and moves
+the cursor only after a batch was written. Delivery is at-least-once: a
+batch replayed twice after a crash rewrites identical points, which
+InfluxDB deduplicates by series and timestamp.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import collections
+
+log = logging.getLogger(__name__)
+
+SUFFIX = '.spool'
+CURSOR = 'cursor.json'
+
+
+class DiskSpool:
+    def __init__(self, directory, max_bytes=1 << 30, segment_bytes=16 << 20, fsync_interval=1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Eviction never touches the active segment, so it must leave room for at least two
+        self.segment_bytes = max(1, min(segment_bytes, max_bytes // 2))
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # seq -> [size in bytes, points or None when not counted yet]
+        self.segments = collections.OrderedDict()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SUFFIX):
+                self.segments[int(name[:-len(SUFFIX)])] = [
+                    os.path.getsize(os.path.join(directory, name)), None]
+        self.total_bytes = sum(size for size, _ in self.segments.values())
+        self.cursor = self._load_cursor()
+        self._active = None
+        self._active_seq = None
+        self._unsynced = []
+        self._last_sync = time.monotonic()
+        self.stats = {
+            'points_appended': 0,
+            'points_drained': 0,
+            'points_evicted': 0,
+            'segments_evicted': 0,
+            'fsyncs': 0,
+        }
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f'{seq:016d}{SUFFIX}')
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR)) as f:
+                cursor = json.load(f)
+            if cursor['segment'] in self.segments:
+                return [cursor['segment'], cursor['offset']]
+        except (OSError, ValueError, KeyError):
+            pass
+        return [next(iter(self.segments), 0), 0]
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segment': self.cursor[0], 'offset': self.cursor[1]}, f)
+        os.replace(path + '.tmp', path)
+
+    def append(self, lines):
+        """Append line-protocol points. Durable after the next sync()."""
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with self._lock:
+            if self._active is None or self.segments[self._active_seq][0] + len(data) > self.segment_bytes:
+                self._rotate()
+            self._active.write(data)
+            segment = self.segments[self._active_seq]
+            segment[0] += len(data)
+            segment[1] += len(lines)
+            self.total_bytes += len(data)
+            self.stats['points_appended'] += len(lines)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _rotate(self):
+        """Seal the active segment (fsynced by the next sync) and start a new one."""
+        if self._active is not None:
+            self._active.close()
+            self._unsynced.append(self._active_seq)
+        seq = (next(reversed(self.segments)) + 1) if self.segments else max(self.cursor[0], 1)
+        self._active = open(self._path(seq), 'ab')
+        self._active_seq = seq
+        self.segments[seq] = [0, 0]
+
+    def _evict(self):
+        evicted = self.stats['points_evicted']
+        while self.total_bytes > self.max_bytes and len(self.segments) > 1:
+            seq = next(iter(self.segments))
+            if seq == self._active_seq:
+                break
+            size, points = self.segments.pop(seq)
+            path = self._path(seq)
+            if points is None:
+                points = self._count(path)
+            if seq == self.cursor[0]:
+                # Points before the cursor were already drained
+                points -= self._count(path, self.cursor[1]) if self.cursor[1] else 0
+                self.cursor = [next(iter(self.segments)), 0]
+            os.remove(path)
+            self.total_bytes -= size
+            self.stats['points_evicted'] += points
+            self.stats['segments_evicted'] += 1
+            if seq in self._unsynced:
+                self._unsynced.remove(seq)
+        if self.stats['points_evicted'] > evicted:
+            log.warning("Spool over size cap, evicted oldest segments",
+                        extra={'max_bytes': self.max_bytes, 'points_evicted': self.stats['points_evicted']})
+
+    @staticmethod
+    def _count(path, limit=None):
+        with open(path, 'rb') as f:
+            return f.read(limit).count(b'\n') if limit else f.read().count(b'\n')
+
+    def sync(self, force=False):
+        """fsync appended data if `fsync_interval` has passed since the last sync."""
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.fsync_interval:
+            return
+        with self._lock:
+            self._last_sync = now
+            sealed, self._unsynced = self._unsynced, []
+            if self._active is not None:
+                self._active.flush()
+                fds = [os.dup(self._active.fileno())]
+            else:
+                fds = []
+        # fsync outside the lock so appends are not held up by the disk
+        for seq in sealed:
+            try:
+                fds.append(os.open(self._path(seq), os.O_RDONLY))
+            except FileNotFoundError:
+                pass
+        for fd in fds:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        if fds:
+            self.stats['fsyncs'] += len(fds)
+
+    def read(self, max_bytes):
+        """Next batch of whole lines from the oldest data: (body, points, position) or None."""
+        with self._lock:
+            while True:
+                seq, offset = self.cursor
+                if seq not in self.segments:
+                    if not self.segments:
+                        return None
+                    seq, offset = self.cursor = [next(iter(self.segments)), 0]
+                size = self.segments[seq][0]
+                if offset < size:
+                    break
+                if seq == self._active_seq:
+                    return None
+                # Fully drained sealed segment
+                self._drop(seq)
+            if seq == self._active_seq:
+                # Seal the active segment so the drainer can read it in full
+                self._rotate()
+            f = open(self._path(seq), 'rb')
+        with f:
+            f.seek(offset)
+            block = f.read(max_bytes)
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            if offset + len(block) >= size:
+                # A torn final line from a crash: skip it
+                return b'', 0, (seq, size)
+            # A single line longer than max_bytes
+            with open(self._path(seq), 'rb') as f:
+                f.seek(offset)
+                block = f.readline()
+            cut = len(block)
+        body = block[:cut]
+        return body, body.count(b'\n'), (seq, offset + cut)
+
+    def commit(self, position, points):
+        """Mark everything before `position` as drained."""
+        seq, offset = position
+        with self._lock:
+            if seq not in self.segments:
+                return
+            self.stats['points_drained'] += points
+            if offset >= self.segments[seq][0] and seq != self._active_seq:
+                self._drop(seq)
+            else:
+                self.cursor = [seq, offset]
+            self._save_cursor()
+
+    def _drop(self, seq):
+        size, _ = self.segments.pop(seq)
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+        self.total_bytes -= size
+        self.cursor = [next(iter(self.segments), seq + 1), 0]
+        self._save_cursor()
+
+    def pending_bytes(self):
+        with self._lock:
+            return self.total_bytes - (self.cursor[1] if self.cursor[0] in self.segments else 0)
+
+    def metrics(self):
+        stats = dict(self.stats)
+        stats['pending_bytes'] = self.pending_bytes()
+        stats['segments'] = len(self.segments)
+        return stats
+
+    def close(self):
+        self.sync(force=True)
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+
+class SpoolDrainer:
+    """Background replay of a DiskSpool into the sink once it is reachable again"""
+    def __init__(self, spool, post, batch_bytes=4 << 20, probe_interval=1.0, max_backoff=5.0):
+        self.spool = spool
+        self.post = post
+        self.batch_bytes = batch_bytes
+        self.probe_interval = probe_interval
+        self.max_backoff = max_backoff
+        self.healthy = True
+        self._outage_started = None
+        self._recovered_at = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.stats = {
+            'outages': 0,
+            'batches_drained': 0,
+            'drain_failures': 0,
+            'points_rejected': 0,
+            'drain_seconds_total': 0.0,
+            'last_outage_seconds': 0.0,
+            'last_recovery_seconds': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='spool-drainer', daemon=True)
+        self._thread.start()
+
+    def mark_unhealthy(self):
+        """Called by the live write path after a failed write: spool until a replay succeeds."""
+        if self.healthy:
+            self.healthy = False
+            self._outage_started = time.monotonic()
+            self.stats['outages'] += 1
+            log.warning("InfluxDB unavailable, spooling points to disk", extra={'spool': self.spool.directory})
+        self._wake.set()
+
+    def close(self, timeout=5.0):
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self.spool.close()
+
+    def _run(self):
+        backoff = self.probe_interval
+        while not self._stopped.is_set():
+            self.spool.sync()
+            batch = self.spool.read(self.batch_bytes)
+            if batch is None:
+                if not self.healthy:
+                    # Nothing to replay: let the live path probe the sink itself
+                    self._recovered()
+                self._wake.wait(self.spool.fsync_interval)
+                self._wake.clear()
+                continue
+            body, points, position = batch
+            if points:
+                start = time.perf_counter()
+                try:
+                    self.post(body)
+                except Exception as e:
+                    status = getattr(e, 'code', None) or getattr(e, 'status', None)
+                    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+                        # Bad line protocol or auth: replaying again will not help
+                        log.error("InfluxDB rejected spooled batch", extra={'points': points, 'status': status})
+                        self.stats['points_rejected'] += points
+                    else:
+                        self.stats['drain_failures'] += 1
+                        self.mark_unhealthy()
+                        self._wake.clear()
+                        self._stopped.wait(backoff)
+                        backoff = min(backoff * 2, self.max_backoff)
+                        continue
+                self.stats['drain_seconds_total'] += time.perf_counter() - start
+                self.stats['batches_drained'] += 1
+                if not self.healthy and self._recovered_at is None:
+                    self._recovered_at = time.monotonic()
+            backoff = self.probe_interval
+            self.spool.commit(position, points)
+        self.spool.sync(force=True)
+
+    def _recovered(self):
+        now = time.monotonic()
+        self.stats['last_outage_seconds'] = now - self._outage_started
+        self.stats['last_recovery_seconds'] = now - (self._recovered_at or now)
+        self._recovered_at = None
+        self.healthy = True
+        log.info("InfluxDB spool drained", extra={
+            'outage_seconds': round(self.stats['last_outage_seconds'], 3),
+            'recovery_seconds': round(self.stats['last_recovery_seconds'], 3)})
+
+    def metrics(self):
+        stats = dict(self.stats)
+        stats['sink_healthy'] = int(self.healthy)
+        stats.update(self.spool.metrics())
+        return stats
@@ -0,0 +1,119 @@
+"""
+Compact on-disk log of MQTT sensor messages for record-and-replay.
+
+Layout: a magic header followed by framed records
+
+    int64   receive time in ns, relative to the first record
+    uint16  topic length
+    uint32  payload length
+    bytes   topic (utf-8), payload (raw)
+
+Payloads are stored exactly as received. Paths ending in `.gz` are gzip
+compressed transparently. Reading is streaming, one record at a time.
+
+Record live traffic with:
+    python3 stream_log.py record --out sensors.pslog [--duration 60]
+    # several topics in one log, e.g. for scripts/evaluate_detection.py
+    python3 stream_log.py record --out eval.pslog --topic processor/eval/+ --topic printer/control/+
+"""
+import os
+import gzip
+import time
+import struct
+import argparse
+
+MAGIC = b'PSLOG1\n'
+RECORD = struct.Struct('<qHI')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=3)
+    return open(path, mode, buffering=1 << 20)
+
+
+class StreamLogWriter:
+    def __init__(self, path):
+        self.file = _open(path, 'wb')
+        self.file.write(MAGIC)
+        self.origin = None
+        self.count = 0
+
+    def append(self, topic, payload, t_ns=None):
+        """Append one message. `t_ns` defaults to the current monotonic clock."""
+        if t_ns is None:
+            t_ns = time.monotonic_ns()
+        if self.origin is None:
+            self.origin = t_ns
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        topic = topic.encode('utf-8')
+        self.file.write(RECORD.pack(t_ns - self.origin, len(topic), len(payload)))
+        self.file.write(topic)
+        self.file.write(payload)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_stream_log(path):
+    """Yield (t_ns, topic, payload) tuples from a stream log."""
+    with _open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a stream log: {path}")
+        read = f.read
+        size = RECORD.size
+        while True:
+            header = read(size)
+            if len(header) < size:
+                return
+            t_ns, topic_len, payload_len = RECORD.unpack(header)
+            topic = read(topic_len).decode('utf-8')
+            yield t_ns, topic, read(payload_len)
+
+
+def record(path, topic='printing/+/sensor', duration=None):
+    """Subscribe to the broker and append every message matching `topic` (a filter or a list) to `path`."""
+    import paho.mqtt.client as mqtt
+    from dotenv import load_dotenv
+    load_dotenv('.env')
+    load_dotenv('.env.real-time')
+
+    topics = [topic] if isinstance(topic, str) else list(topic)
+    writer = StreamLogWriter(path)
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = lambda c, u, f, rc, p: c.subscribe([(t, 0) for t in topics])
+    client.on_message = lambda c, u, m: writer.append(m.topic, m.payload)
+    client.username_pw_set(os.getenv('MQTT_USERNAME'), os.getenv('MQTT_PASSWORD'))
+    client.connect(os.getenv('MQTT_HOST', 'mqtt'), 1883)
+    client.loop_start()
+    print(f"Recording {', '.join(topics)} to {path}")
+    try:
+        deadline = None if duration is None else time.monotonic() + duration
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        writer.close()
+        print(f"Recorded {writer.count} messages")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record MQTT sensor traffic to a stream log')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('--out', required=True)
+    rec.add_argument('--topic', action='append', help='topic filter, repeatable (default printing/+/sensor)')
+    rec.add_argument('--duration', type=float, default=None)
+    args = parser.parse_args()
+    record(args.out, args.topic or 'printing/+/sensor', args.duration)
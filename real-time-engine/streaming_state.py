@@ -0,0 +1,166 @@
+"""
+Per-printer streaming feature state and online anomaly scoring.
+
+State for every printer lives in preallocated NumPy arrays (one row per
+printer slot), so memory is fixed up front at roughly
+
+    capacity * n_fields * (4 * window + 48) bytes
+
+and each message costs O(n_fields) regardless of history length:
+
+    ring buffer   last `window` values per field; rolling sum / sum of
+                  squares are updated by subtracting the value that falls
+                  out and adding the new one (re-summed from the ring once
+                  per wrap to cancel floating-point drift)
+    EWMA          exponentially weighted mean and variance per field
+    CUSUM         two-sided cumulative sum of the EWMA-standardised
+                  deviation, which accumulates under slow drifts that never
+                  trip a single-sample z-score
+
+The anomaly score is max(|z| / z_limit, cusum / cusum_h) clipped to [0, 1],
+where z is the deviation of the new value from the rolling window. Spikes
+show up in z, drifts in the CUSUM. Values are winsorised to z_limit
+before they enter the statistics, so outliers do not mask each other.
+When the store is full the least recently seen printer's slot is reused.
+
+A field missing from a message (absent, null or NaN) is not scored and
+leaves its EWMA and CUSUM unchanged; the window carries the field's last
+value forward. A printer's first message is only stored once it has
+every field.
+"""
+import math
+import collections
+import numpy as np
+
+
+class PrinterStateStore:
+    def __init__(self, fields, capacity=50000, window=64, ewma_alpha=0.1,
+                 cusum_k=0.5, cusum_h=5.0, z_limit=4.0, min_samples=8):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.window = window
+        self.alpha = ewma_alpha
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.z_limit = z_limit
+        self.min_samples = min_samples
+
+        n = len(self.fields)
+        self.ring = np.zeros((capacity, window, n), dtype=np.float32)
+        self.head = np.zeros(capacity, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        # Per slot, one row per statistic: sum, sum of squares, EWMA, EW variance, CUSUM+, CUSUM-
+        self.stats = np.zeros((capacity, 6, n))
+        self.slots = collections.OrderedDict()
+        self.evictions = 0
+
+    def nbytes(self):
+        return self.ring.nbytes + self.head.nbytes + self.count.nbytes + self.stats.nbytes
+
+    def _slot(self, printer_id):
+        slot = self.slots.get(printer_id)
+        if slot is not None:
+            self.slots.move_to_end(printer_id)
+            return slot
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+            self.head[slot] = 0
+            self.count[slot] = 0
+            self.stats[slot] = 0.0
+        self.slots[printer_id] = slot
+        return slot
+
+    def update(self, printer_id, data):
+        """Fold one message into the printer's state and return its anomaly score."""
+        # The per-field maths runs on Python floats: for a handful of fields
+        # that is several times cheaper than NumPy calls on tiny arrays
+        x = [data.get(f) for f in self.fields]
+        missing = [i for i, v in enumerate(x) if v is None or v != v]
+        if missing and self.slots.get(printer_id) is None:
+            # Nothing to carry forward yet
+            return 0.0
+        slot = self._slot(printer_id)
+        n = int(self.count[slot])
+        head = int(self.head[slot])
+        if missing:
+            last = self.ring[slot, head - 1].tolist()
+            for i in missing:
+                x[i] = last[i]
+        x = [float(v) for v in x]
+        total, total_sq, ewma, ewvar, pos, neg = self.stats[slot].tolist()
+        old = self.ring[slot, head].tolist() if n >= self.window else None
+        alpha, k, h, z_limit = self.alpha, self.cusum_k, self.cusum_h, self.z_limit
+
+        score = 0.0
+        if n >= self.min_samples:
+            filled = min(n, self.window)
+            z_max = drift = 0.0
+            for i, v in enumerate(x):
+                if missing and i in missing:
+                    continue
+                mean = total[i] / filled
+                std = math.sqrt(max(total_sq[i] / filled - mean * mean, 1e-12))
+                z_max = max(z_max, abs(v - mean) / std)
+                ez = (v - ewma[i]) / math.sqrt(max(ewvar[i], 1e-12))
+                pos[i] = max(pos[i] + ez - k, 0.0)
+                neg[i] = max(neg[i] - ez - k, 0.0)
+                drift = max(drift, pos[i], neg[i])
+                # Winsorise before updating the statistics so a spike does not
+                # inflate the variance and mask the spikes that follow it
+                x[i] = min(max(v, mean - z_limit * std), mean + z_limit * std)
+            score = min(1.0, max(z_max / z_limit, drift / h))
+            if drift >= h:
+                # Alarm raised: restart the CUSUM so the next drift is detected afresh
+                pos = [0.0] * len(x)
+                neg = [0.0] * len(x)
+
+        for i, v in enumerate(x):
+            # EWMA mean/variance (West's incremental form)
+            if n == 0:
+                ewma[i] = v
+            elif missing and i in missing:
+                pass
+            else:
+                diff = v - ewma[i]
+                incr = alpha * diff
+                ewma[i] += incr
+                ewvar[i] = (1.0 - alpha) * (ewvar[i] + diff * incr)
+            # Rolling sums: drop the value leaving the window, add the new one
+            if old is not None:
+                total[i] -= old[i]
+                total_sq[i] -= old[i] * old[i]
+            total[i] += v
+            total_sq[i] += v * v
+
+        self.ring[slot, head] = x
+        head += 1
+        if head == self.window:
+            head = 0
+            ring = self.ring[slot].astype(np.float64)
+            total = ring.sum(axis=0)
+            total_sq = (ring * ring).sum(axis=0)
+        self.stats[slot] = (total, total_sq, ewma, ewvar, pos, neg)
+        self.head[slot] = head
+        self.count[slot] = n + 1
+        return score
+
+    def snapshot(self, printer_id):
+        """Rolling mean/std, EWMA and CUSUM per field for one printer (or None)."""
+        slot = self.slots.get(printer_id)
+        if slot is None:
+            return None
+        filled = max(1, min(int(self.count[slot]), self.window))
+        total, total_sq, ewma, ewvar, pos, neg = self.stats[slot]
+        mean = total / filled
+        std = np.sqrt(np.maximum(total_sq / filled - mean * mean, 0.0))
+        return {f: {
+            'mean': float(mean[i]),
+            'std': float(std[i]),
+            'ewma': float(ewma[i]),
+            'ewstd': float(np.sqrt(ewvar[i])),
+            'cusum_pos': float(pos[i]),
+            'cusum_neg': float(neg[i]),
+        } for i, f in enumerate(self.fields)}
@@ -0,0 +1,112 @@
+"""
+Structured, rate-limited logging for the real-time engine.
+
+Log calls pass context as `extra` fields, which the JSON formatter emits as
+top-level keys:
+
+    log.info("feedback sent", extra={'printer_id': pid, 'new_speed': 40.0})
+    -> {"ts": "...", "level": "INFO", "logger": "processor", "msg": "feedback sent",
+        "printer_id": "printer_1", "new_speed": 40.0}
+
+The rate limiter allows `burst` records per message template and `interval`
+seconds; anything beyond that is dropped and counted, and the next record
+that gets through carries `"suppressed": <n>`. The limiter is a handler
+filter, so it only sees records that have already been built; hot paths
+check `allowed(log, msg)` first, which costs one dict lookup once the limit
+is hit, and log per-message detail at DEBUG behind `isEnabledFor`.
+"""
+import os
+import json
+import time
+import logging
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        extras = ' '.join(f'{k}={v}' for k, v in record.__dict__.items()
+                          if k not in _RESERVED and not k.startswith('_'))
+        line = f'{record.levelname[0]} {record.name}: {record.getMessage()}'
+        return f'{line} {extras}' if extras else line
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst=10, interval=10.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}
+        self.suppressed_total = 0
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self.windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed_total += 1
+        return False
+
+    def over_limit(self, name, msg):
+        """True (and counted as suppressed) if a record for (name, msg) would be dropped now."""
+        window = self.windows.get((name, msg))
+        if window is None or window[1] < self.burst or time.monotonic() - window[0] >= self.interval:
+            return False
+        window[2] += 1
+        self.suppressed_total += 1
+        return True
+
+
+_limiter = None
+
+
+def allowed(logger, msg):
+    """Whether to build a record for `msg` on `logger`: skips the LogRecord and its `extra` when rate-limited."""
+    return _limiter is None or not _limiter.over_limit(logger.name, msg)
+
+
+def configure_logging():
+    """Configure the root logger from LOG_LEVEL, LOG_FORMAT and LOG_RATE_* settings."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if os.getenv('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+    rate_limit = RateLimitFilter(
+        burst=int(os.getenv('LOG_RATE_BURST', 10)),
+        interval=float(os.getenv('LOG_RATE_INTERVAL', 10)))
+    handler.addFilter(rate_limit)
+    global _limiter
+    _limiter = rate_limit
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    return rate_limit
+
+
+def suppressed_total():
+    """Records dropped by the rate limiter on the root logger's handlers."""
+    return sum(f.suppressed_total for h in logging.getLogger().handlers
+               for f in h.filters if isinstance(f, RateLimitFilter))
@@ -1,47 +1,107 @@
 """
 Train ML model for surface roughness prediction.
-Log experiment to DagsHub via MLflow.
+Log experiment to DagsHub via MLflow when DAGSHUB_REPO or MLFLOW_TRACKING_URI is set;
+otherwise MLflow is not imported at all.
 """
 import os
+import time
 import pickle
 import sys
+import contextlib
 import pandas as pd
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, r2_score
-import mlflow
-import dagshub
 
 # Allow import from sibling directory
 sys.path.append('..')
 from utils.load_data import load_historical_data
-
-
-def main():
-    # Configure MLflow tracking (local or DagsHub)
-    dagshub_repo = os.getenv('DAGSHUB_REPO')
-    if dagshub_repo and dagshub_repo.strip():
+from model_artifact import export_artifact
+from model_search import FAMILIES, build_model, search, select
+
+
+def search_model(X, y, training_run_id, track=True):
+    """Run the model-family search, log each candidate locally when `track` and return the winner."""
+    families = [f.strip() for f in os.getenv('SEARCH_FAMILIES', '').split(',') if f.strip()] or None
+    batch_size = int(os.getenv('INFERENCE_BATCH_SIZE', 256)) \
+        if os.getenv('INFERENCE_MODE', 'single').lower() == 'batch' else 1
+    budget = float(os.getenv('SEARCH_LATENCY_BUDGET_US', 500))
+    weight = float(os.getenv('SEARCH_LATENCY_WEIGHT', 0.1))
+
+    if track:
+        from mlflow.entities import Metric, Param
+        from mlflow.tracking import MlflowClient
+        # Candidates go to a local file store, whatever tracks the training run
+        client = MlflowClient(os.getenv('SEARCH_TRACKING_URI', 'file:///tmp/mlruns'))
+        experiment = client.get_experiment_by_name('model-search')
+        experiment_id = experiment.experiment_id if experiment else client.create_experiment('model-search')
+
+    def log_candidate(result):
+        name = result['family'] + ''.join(f",{k}={v}" for k, v in result['params'].items())
+        print(f"  {name:<50} MAE {result['cv_mae']:.3f}  R² {result['cv_r2']:.3f}  "
+              f"{result['predict_us']:.1f} us/row")
+        if not track:
+            return
+        run = client.create_run(experiment_id, run_name=name, tags={'training_run_id': training_run_id})
+        now = int(time.time() * 1000)
+        params = [Param('family', result['family']), Param('inference_batch_size', str(batch_size))]
+        params += [Param(k, str(v)) for k, v in result['params'].items()]
+        metrics = [Metric(k, result[k], now, 0)
+                   for k in ('cv_mae', 'cv_mae_std', 'cv_r2', 'fit_seconds', 'predict_us')]
+        client.log_batch(run.info.run_id, metrics=metrics, params=params)
+        client.set_terminated(run.info.run_id)
+
+    print(f"Searching model families with {batch_size}-row predict latency "
+          f"(budget {budget:g} us/row, weight {weight:g})...")
+    results = search(X, y, families=families, folds=int(os.getenv('SEARCH_CV_FOLDS', 5)),
+                     workers=int(os.getenv('SEARCH_WORKERS', 0)) or None,
+                     batch_size=batch_size, on_result=log_candidate)
+    best = select(results, budget, weight)
+    if not best['within_budget']:
+        print(f"No candidate within {budget:g} us/row; using the best one regardless")
+    return best, results
+
+
+def setup_tracking():
+    """The configured mlflow module, or None when no tracking is set up (MLflow takes ~1.5s to import)."""
+    dagshub_repo = (os.getenv('DAGSHUB_REPO') or '').strip()
+    tracking_uri = os.getenv('MLFLOW_TRACKING_URI')
+    if not dagshub_repo and not tracking_uri:
+        print("DAGSHUB_REPO and MLFLOW_TRACKING_URI not set. MLflow tracking off.")
+        return None
+    import mlflow
+
+    if dagshub_repo:
         # Extract owner and repo name from URL (supports https://dagshub.com/<owner>/<repo>.git)
         import re
         match = re.search(r'https?://dagshub\.com/([^/]+)/([^/.]+)', dagshub_repo)
         if match:
+            import dagshub
             repo_owner = match.group(1)
             repo_name = match.group(2)
             dagshub.init(repo_owner=repo_owner, repo_name=repo_name, mlflow=True)
-            mlflow_tracking_uri = f'https://dagshub.com/{repo_owner}/{repo_name}.mlflow'
-            mlflow.set_tracking_uri(mlflow_tracking_uri)
-            print(f"Configured DagsHub MLflow tracking: {mlflow_tracking_uri}")
+            tracking_uri = f'https://dagshub.com/{repo_owner}/{repo_name}.mlflow'
+            print(f"Configured DagsHub MLflow tracking: {tracking_uri}")
         else:
-            print(f"Could not parse DAGSHUB_REPO: {dagshub_repo}. Using local MLflow.")
-            mlflow.set_tracking_uri('file:///tmp/mlruns')
+            tracking_uri = tracking_uri or 'file:///tmp/mlruns'
+            print(f"Could not parse DAGSHUB_REPO: {dagshub_repo}. Using MLflow at {tracking_uri}.")
     else:
-        print("DAGSHUB_REPO not set. Using local MLflow.")
-        mlflow.set_tracking_uri('file:///tmp/mlruns')
+        print(f"Using MLflow at {tracking_uri}.")
+    mlflow.set_tracking_uri(tracking_uri)
+    return mlflow
+
+
+def main():
+    mlflow = setup_tracking()
 
-    # Load historical data
+    # Load historical data: CSV / one-shot query, or the chunked InfluxDB cache
     print("Loading historical data...")
-    df = load_historical_data()
+    if os.getenv('TRAINING_SOURCE', 'csv').lower() == 'influx':
+        from utils.influx_chunks import load_influx_history
+        df = pd.DataFrame(load_influx_history()).rename(columns={'roughness': 'surface_roughness'})
+    else:
+        df = load_historical_data()
     if df.empty:
         raise ValueError("Historical data is empty.")
 
@@ -72,18 +132,34 @@ def main():
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
 
-    # Model selection based on environment variable
+    # Model selection based on environment variable: one family, or `search` across all of them
     model_type = os.getenv('MODEL_TYPE', 'kNN').lower()
     if model_type == 'knn':
         model = KNeighborsRegressor(n_neighbors=5)
-    else:
+    elif model_type in FAMILIES:
+        model = build_model(model_type)
+    elif model_type != 'search':
         raise ValueError(f"Unsupported MODEL_TYPE: {model_type}")
 
     # Start MLflow run
-    with mlflow.start_run():
-        mlflow.log_param('model_type', model_type)
-        mlflow.log_param('n_features', len(available_features))
-        mlflow.log_param('features', ','.join(available_features))
+    with mlflow.start_run() if mlflow else contextlib.nullcontext() as run:
+        if model_type == 'search':
+            best, results = search_model(X_train_scaled, y_train, run.info.run_id if run else None,
+                                         track=mlflow is not None)
+            model_type = best['family']
+            model = build_model(model_type, best['params'])
+            print(f"Selected {model_type} {best['params']}: CV MAE {best['cv_mae']:.3f}, "
+                  f"{best['predict_us']:.1f} us/row")
+            if mlflow:
+                mlflow.log_params({f'search_{k}': v for k, v in best['params'].items()})
+                mlflow.log_metric('search_cv_mae', best['cv_mae'])
+                mlflow.log_metric('search_predict_us', best['predict_us'])
+                mlflow.log_dict({'selected': best, 'candidates': results}, 'search_results.json')
+
+        if mlflow:
+            mlflow.log_param('model_type', model_type)
+            mlflow.log_param('n_features', len(available_features))
+            mlflow.log_param('features', ','.join(available_features))
 
         # Train
         model.fit(X_train_scaled, y_train)
@@ -93,11 +169,11 @@ def main():
         mae = mean_absolute_error(y_test, y_pred)
         r2 = r2_score(y_test, y_pred)
 
-        mlflow.log_metric('mae', mae)
-        mlflow.log_metric('r2', r2)
-
-        # Log the sklearn model
-        mlflow.sklearn.log_model(model, 'model')
+        if mlflow:
+            mlflow.log_metric('mae', mae)
+            mlflow.log_metric('r2', r2)
+            # Log the sklearn model
+            mlflow.sklearn.log_model(model, 'model')
 
         # Save model, scaler and feature list locally for runtime use
         os.makedirs('models', exist_ok=True)
@@ -106,8 +182,17 @@ def main():
             pickle.dump((model, scaler, available_features), f)
         print(f"Model saved to {model_path}")
 
+        # Export the pickle-free serving artifact used by the processor (KNN only)
+        artifact_path = os.getenv('MODEL_ARTIFACT_PATH', 'models/model_artifact')
+        if model_type == 'knn':
+            export_artifact(model, scaler, available_features, artifact_path)
+            print(f"Serving artifact saved to {artifact_path}")
+        else:
+            print(f"No serving artifact for {model_type}; serve {model_path} instead")
+
         # Upload as artifact
-        mlflow.log_artifact(model_path)
+        if mlflow:
+            mlflow.log_artifact(model_path)
 
         print(f"Training completed. MAE: {mae:.3f}, R²: {r2:.3f}")
 
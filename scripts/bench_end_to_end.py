@@ -0,0 +1,300 @@
+"""
+End-to-end processor benchmark: replay a recorded sensor stream through
+RealTimeProcessor using an in-process MQTT stand-in and a fake InfluxDB
+sink, so it runs on a laptop without Docker.
+
+Reports ingest throughput, per-message processing latency, broker queueing
+delay and the time from a sensor message being published to the matching
+printer/control/<id> feedback being published.
+
+Usage:
+    # replay a log recorded with real-time-engine/stream_log.py
+    python3 scripts/bench_end_to_end.py --log sensors.pslog --speed 1
+    # or synthesize one first (printers x rate x seconds messages)
+    python3 scripts/bench_end_to_end.py --synthesize 20 --printers 100 --rate 10 --speed 0
+
+--speed 1 replays in real time, N replays N times faster, 0 as fast as possible.
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENGINE_DIR = os.path.join(ROOT, 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from stream_log import StreamLogWriter, read_stream_log
+
+log = logging.getLogger(__name__)
+
+
+class FakeMessage:
+    __slots__ = ('topic', 'payload', 'sent_at')
+
+    def __init__(self, topic, payload, sent_at):
+        self.topic = topic
+        self.payload = payload
+        self.sent_at = sent_at
+
+
+class InProcessBroker:
+    """Routes publishes to subscribed fake clients by MQTT topic filter"""
+    def __init__(self):
+        self.clients = []
+
+    def client(self):
+        client = FakeMqttClient(self)
+        self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        message = FakeMessage(topic, payload, time.perf_counter())
+        for client in self.clients:
+            if any(mqtt.topic_matches_sub(f, topic) for f in client.subscriptions):
+                client.inbox.put(message)
+
+
+class FakeMqttClient:
+    """Enough of paho's Client API for the processor; one delivery thread per client"""
+    def __init__(self, broker):
+        self.broker = broker
+        self.subscriptions = []
+        self.inbox = queue.SimpleQueue()
+        self.on_connect = None
+        self.on_message = None
+        self.callbacks = {}
+        self.thread = None
+
+    def connect(self, *args, **kwargs):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0, None)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.broker.publish(topic, payload)
+
+    def message_callback_add(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def username_pw_set(self, *args):
+        pass
+
+    def loop_start(self):
+        self.thread = threading.Thread(target=self._deliver, daemon=True)
+        self.thread.start()
+
+    def loop_forever(self):
+        self._deliver()
+
+    def loop_stop(self):
+        if self.thread is not None:
+            self.inbox.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def disconnect(self):
+        pass
+
+    def _deliver(self):
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                return
+            callback = self.callbacks.get(message.topic, self.on_message)
+            if callback:
+                callback(self, None, message)
+
+
+class FakeInfluxSink:
+    """Stands in for BatchingInfluxWriter; counts points and bytes"""
+    def __init__(self):
+        self.points = 0
+        self.bytes = 0
+
+    def write(self, line):
+        self.points += 1
+        self.bytes += len(line)
+        return True
+
+    def queue_depth(self):
+        return 0
+
+    def close(self, timeout=None):
+        pass
+
+    def metrics(self):
+        return {'points_written': self.points, 'bytes_written': self.bytes}
+
+
+def make_harness_processor(broker):
+    from processor import RealTimeProcessor
+    from sensor_message import decode
+
+    class HarnessProcessor(RealTimeProcessor):
+        def __init__(self):
+            self.broker = broker
+            self.handled = 0
+            self.failed = 0
+            self.processing = []
+            self.queueing = []
+            self.feedback_latency = []
+            super().__init__()
+
+        def setup_mqtt(self):
+            self.client = self.broker.client()
+            self.client.on_connect = self.on_connect
+            self.client.on_message = self.on_message
+            self.client.connect()
+
+        def setup_influxdb(self):
+            self.write_mode = 'batch'
+            self.influx_writer = FakeInfluxSink()
+            self.spool = self.spool_drainer = None
+
+        def on_message(self, client, userdata, message):
+            start = time.perf_counter()
+            try:
+                data = decode(message.payload, self.required_fields)
+                data['_sent_at'] = message.sent_at
+                self.process_message(data)
+            except Exception as e:
+                self.errors_total.inc(labels=('process',))
+                self.failed += 1
+                log.warning("Harness dropped a message", extra={'error': str(e)})
+            end = time.perf_counter()
+            self.processing.append(end - start)
+            self.queueing.append(start - message.sent_at)
+            self.handled += 1
+
+        def send_feedback(self, data, prediction):
+            super().send_feedback(data, prediction)
+            self.feedback_latency.append(time.perf_counter() - data['_sent_at'])
+
+    return HarnessProcessor()
+
+
+def synthesize_log(path, seconds, printers, rate, seed=42, payload_format='json'):
+    """Write a stream log using the synthesizer's bulk generator."""
+    import pandas as pd
+    sys.path.append(os.path.join(ROOT, 'synthesizer'))
+    from bulk_generator import BulkGenerator
+
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'data.csv')).to_dict('records')
+    generator = BulkGenerator(base, printers, seed=seed)
+    period_ns = int(1e9 / rate)
+    with StreamLogWriter(path) as writer:
+        for tick in range(int(seconds * rate)):
+            values, labels = generator.tick()
+            t0 = tick * period_ns
+            if payload_format == 'binary':
+                payloads = generator.encode_binary(values, labels, 1704067200.0 + tick / rate)
+            else:
+                payloads = generator.encode(values, labels, f'2024-01-01T00:00:{tick / rate:09.6f}')
+            for i, (topic, payload) in enumerate(zip(generator.topics, payloads)):
+                writer.append(topic, payload, t0 + i * period_ns // printers)
+    return writer.count
+
+
+def replay(broker, path, speed):
+    start = time.perf_counter()
+    sent = 0
+    for t_ns, topic, payload in read_stream_log(path):
+        if speed:
+            delay = start + t_ns / 1e9 / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        broker.publish(topic, payload)
+        sent += 1
+    return sent, time.perf_counter() - start
+
+
+def percentiles(values):
+    if not values:
+        return 'n/a'
+    p50, p90, p99 = np.percentile(np.array(values) * 1000, [50, 90, 99])
+    return f"p50={p50:.3f}ms p90={p90:.3f}ms p99={p99:.3f}ms max={max(values) * 1000:.3f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log', help='stream log to replay')
+    parser.add_argument('--synthesize', type=float, metavar='SECONDS',
+                        help='synthesize a log of this many seconds instead')
+    parser.add_argument('--printers', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10, help='Hz per printer when synthesizing')
+    parser.add_argument('--speed', type=float, default=0, help='replay speed factor (0 = max)')
+    parser.add_argument('--format', choices=['json', 'binary'], default='json',
+                        help='payload format when synthesizing')
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--inference', choices=['single', 'batch'], default='single')
+    parser.add_argument('--cache', type=float, metavar='QUANTUM',
+                        help='enable the prediction cache with this feature quantum')
+    args = parser.parse_args()
+
+    path = args.log
+    if path is None:
+        if not args.synthesize:
+            parser.error('pass --log or --synthesize')
+        path = os.path.join(tempfile.mkdtemp(), 'synthetic.pslog')
+        count = synthesize_log(path, args.synthesize, args.printers, args.rate,
+                               payload_format=args.format)
+        print(f"Synthesized {count} messages to {path}")
+
+    os.environ['MODEL_PATH'] = args.model
+    os.environ.setdefault('METRICS_PORT', '0')
+    os.environ['INFERENCE_MODE'] = args.inference
+    # A single in-process replica: the fake broker has no shared subscriptions
+    os.environ['MQTT_SHARED_GROUP'] = ''
+    if args.cache:
+        os.environ['PREDICTION_CACHE'] = 'true'
+        os.environ['PREDICTION_CACHE_QUANTUM'] = str(args.cache)
+    broker = InProcessBroker()
+    feedback_client = broker.client()
+    feedback = []
+    feedback_client.on_message = lambda c, u, m: feedback.append(m.topic)
+    feedback_client.subscribe('printer/control/+')
+    feedback_client.loop_start()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        processor = make_harness_processor(broker)
+        # Measure the steady state, not the background model load at startup
+        processor.model_ready.wait()
+        processor.client.loop_start()
+        start = time.perf_counter()
+        sent, replay_time = replay(broker, path, args.speed)
+        while processor.handled < sent:
+            time.sleep(0.001)
+        ingest_time = time.perf_counter() - start
+        processor.shutdown()
+        feedback_client.loop_stop()
+
+    print(f"replayed {sent} messages at speed {args.speed or 'max'} in {replay_time:.2f}s "
+          f"(inference={args.inference})")
+    print(f"ingest throughput : {sent / max(ingest_time, 1e-9):,.0f} msg/s")
+    print(f"processing        : {percentiles(processor.processing)}")
+    print(f"broker queueing   : {percentiles(processor.queueing)}")
+    print(f"sensor -> feedback: {percentiles(processor.feedback_latency)} "
+          f"({len(feedback)} feedback messages)")
+    print(f"influx points     : {processor.influx_writer.points}")
+    if processor.failed:
+        print(f"dropped messages  : {processor.failed} (decode or processing errors)")
+    if hasattr(processor.model, 'metrics'):
+        cache = processor.model.metrics()
+        print(f"prediction cache  : hit ratio {cache['hit_ratio']:.1%}, "
+              f"{cache['entries']} entries, {cache['evictions']} evictions")
+
+
+if __name__ == '__main__':
+    main()
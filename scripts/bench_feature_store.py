@@ -0,0 +1,117 @@
+"""
+Feature store benchmark: cold and warm loads of historical prints from the
+columnar feature store versus pd.read_csv.
+
+data/data.csv is expanded to --rows rows (jittered copies) in a temporary
+directory, written once as CSV and once to a FeatureStore. "Cold" loads
+drop the files from the page cache first (posix_fadvise DONTNEED), "warm"
+loads repeat the read with the cache populated.
+
+Usage:
+    python3 scripts/bench_feature_store.py --rows 2000000
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'synthesizer'))
+from utils.feature_store import FeatureStore, import_csv
+from feature_table import read_feature_table
+
+
+def evict(path):
+    """Drop a file, or every file under a directory, from the page cache."""
+    paths = [path] if os.path.isfile(path) else [
+        os.path.join(d, f) for d, _, files in os.walk(path) for f in files]
+    for p in paths:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def touch(columns):
+    # Force every page in: the store's mmap reads are lazy
+    return sum(float(np.asarray(v, dtype=np.float64).sum()) for v in columns.values())
+
+
+def make_dataset(rows, seed=0):
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'data.csv'))
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(len(base), size=rows)].reset_index(drop=True)
+    for column in df.select_dtypes('number').columns:
+        df[column] = (df[column] * rng.uniform(0.95, 1.05, rows)).round(2)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--records-rows', type=int, default=100000,
+                        help='rows for the synthesizer-style list-of-dicts comparison')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp, 'prints.csv')
+    make_dataset(args.rows).to_csv(csv_path, index=False)
+    store = FeatureStore(os.path.join(tmp, 'store'))
+    import_time, _ = timed(lambda: import_csv(csv_path, store))
+    store_bytes = sum(os.path.getsize(os.path.join(d, f))
+                      for d, _, files in os.walk(store.root) for f in files)
+    print(f"{args.rows:,} rows: CSV {os.path.getsize(csv_path) / 1e6:.1f} MB, "
+          f"store {store_bytes / 1e6:.1f} MB (import {import_time:.2f}s)")
+
+    numeric = [c for c, spec in store.table('historical_prints')['columns'].items()
+               if 'categories' not in spec]
+
+    def csv_load():
+        df = pd.read_csv(csv_path)
+        return {c: df[c].to_numpy() for c in numeric}
+
+    def store_load():
+        return FeatureStore(store.root).read('historical_prints', numeric)
+
+    results = {}
+    for label, load, path in (('pd.read_csv', csv_load, csv_path),
+                              ('feature store', store_load, store.root)):
+        evict(path)
+        cold, columns = timed(lambda: touch(load()))
+        warm, _ = timed(lambda: touch(load()))
+        open_only, _ = timed(load)
+        results[label] = (cold, warm, open_only)
+    for label, (cold, warm, open_only) in results.items():
+        print(f"{label:<14}: cold {cold * 1000:8.1f} ms, warm {warm * 1000:8.1f} ms "
+              f"(open without touching data {open_only * 1000:.1f} ms)")
+
+    frame_time, _ = timed(lambda: FeatureStore(store.root).to_frame('historical_prints'))
+    csv_frame_time, _ = timed(lambda: pd.read_csv(csv_path))
+    print(f"full DataFrame : read_csv {csv_frame_time * 1000:.1f} ms, store.to_frame {frame_time * 1000:.1f} ms")
+
+    # Synthesizer load_dataset path: list of row dicts
+    small_csv = os.path.join(tmp, 'small.csv')
+    make_dataset(args.records_rows, seed=1).to_csv(small_csv, index=False)
+    small = FeatureStore(os.path.join(tmp, 'small_store'))
+    import_csv(small_csv, small)
+    csv_records, _ = timed(lambda: pd.read_csv(small_csv).to_dict('records'))
+    store_records, _ = timed(lambda: read_feature_table(small.root))
+    print(f"records ({args.records_rows:,} rows): read_csv+to_dict {csv_records * 1000:.1f} ms, "
+          f"read_feature_table {store_records * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
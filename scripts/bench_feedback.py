@@ -0,0 +1,88 @@
+"""
+Feedback control benchmark: how many printer/control commands reach the
+broker with per-sample feedback versus the debouncing FeedbackController.
+
+Drives the synthesizer's BulkGenerator (same spike/drift anomaly injection
+and print_speed feedback path as DataSynthesizer) on a simulated clock and
+closes the loop: every command sent is applied to the generator, exactly as
+the synthesizer's on_feedback would.
+
+Usage:
+    python3 scripts/bench_feedback.py --printers 500 --rate 100 --seconds 30
+"""
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'real-time-engine'))
+sys.path.append(os.path.join(ROOT, 'synthesizer'))
+from bulk_generator import BulkGenerator
+from feedback_controller import FeedbackController
+
+
+def simulate(base, args, controller=None):
+    generator = BulkGenerator(base, args.printers, seed=args.seed,
+                              anomaly_probability=args.anomaly_probability)
+    rough_col = generator.numeric_fields.index('roughness')
+    speed_col = generator.speed_col
+    ids = generator.printer_ids
+    sent = 0
+    cpu = 0.0
+    for tick in range(int(args.seconds * args.rate)):
+        now = tick / args.rate
+        values, _ = generator.tick()
+        roughness = values[:, rough_col].tolist()
+        speeds = values[:, speed_col].tolist()
+        start = time.process_time()
+        if controller is None:
+            commands = [((i, speeds[i]), None) for i, r in enumerate(roughness) if r > args.threshold]
+        else:
+            commands = []
+            for i, r in enumerate(roughness):
+                commands.extend(controller.observe(ids[i], r, (i, speeds[i]), None, now))
+        cpu += time.process_time() - start
+        for (i, speed), _ in commands:
+            generator.apply_feedback({'printer_id': ids[i], 'new_speed': max(10, speed * args.factor)})
+        sent += len(commands)
+    return sent, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--printers', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=100, help='Hz per printer')
+    parser.add_argument('--seconds', type=float, default=30, help='simulated duration')
+    parser.add_argument('--threshold', type=float, default=75)
+    parser.add_argument('--release', type=float, default=70, help='hysteresis release threshold')
+    parser.add_argument('--min-interval', type=float, default=2.0)
+    parser.add_argument('--factor', type=float, default=0.8)
+    parser.add_argument('--anomaly-probability', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'data.csv')).to_dict('records')
+    samples = int(args.seconds * args.rate) * args.printers
+
+    baseline, _ = simulate(base, args)
+    controller = FeedbackController(args.threshold, args.release, args.min_interval,
+                                    lambda data: max(10, data[1] * args.factor))
+    debounced, cpu = simulate(base, args, controller)
+    stats = controller.metrics()
+
+    print(f"{args.printers} printers x {args.rate:g} Hz x {args.seconds:g}s = {samples:,} samples")
+    print(f"per-sample feedback : {baseline:,} commands ({baseline / args.seconds:,.0f}/s)")
+    print(f"feedback controller : {debounced:,} commands ({debounced / args.seconds:,.1f}/s), "
+          f"{1 - debounced / max(baseline, 1):.2%} fewer")
+    print(f"suppressed          : {stats['suppressed']:,} (coalesced {stats['coalesced']:,}, "
+          f"duplicates {stats['duplicates']:,}, cancelled {stats['cancelled']:,})")
+    print(f"state transitions   : {stats['transitions']:,}, "
+          f"{stats['printers_adjusting']} printers adjusting at the end")
+    print(f"controller CPU      : {cpu / samples * 1e6:.2f} us/sample")
+
+
+if __name__ == '__main__':
+    main()
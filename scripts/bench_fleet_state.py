@@ -0,0 +1,110 @@
+"""
+Fleet state benchmark: memory per printer and per-printer generation
+throughput of DataSynthesizer for a large simulated fleet.
+
+Memory is measured with tracemalloc once every printer has generated a
+message, for the array-backed FleetState and for the previous layout (a
+dict per printer plus an f-string keyed drift dict, rebuilt here for
+comparison). Throughput is generate_message (and with encoding) round-robin
+over the whole fleet, plus the feedback apply rate through on_feedback.
+
+Usage:
+    python3 scripts/bench_fleet_state.py --printers 100000 --messages 500000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'synthesizer'))
+os.environ['FEATURE_STORE_PATH'] = os.path.join(ROOT, 'data', 'missing')
+os.environ['DATASET_PATH'] = os.path.join(ROOT, 'data', 'data.csv')
+from synthesizer import DataSynthesizer
+from wire_format import dumps
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+def dict_state(synth, ids):
+    """The previous per-printer layout, populated like one message per printer did"""
+    state = {'printers': {}, 'drifts': {}}
+    for n, printer_id in enumerate(ids):
+        state['printers'][printer_id] = {'base_params': random.choice(synth.base_data),
+                                         'last_adjustment': None, 'cycle_count': 1}
+        if n % 33 == 0:
+            # About 3% of printers have a drift running
+            state['drifts'][f'{printer_id}_bed_temperature'] = {'direction': 1, 'duration': 20}
+    return state
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--printers', type=int, default=100000)
+    parser.add_argument('--messages', type=int, default=500000, help='messages generated for throughput')
+    parser.add_argument('--feedback', type=int, default=200000, help='feedback messages applied')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        synth = DataSynthesizer(connect=False)
+        sys.stdout = stdout
+    ids = [f'printer_{n}' for n in range(1, args.printers + 1)]
+
+    def fleet_state():
+        synth.fleet.ensure(args.printers)
+        for printer_id in ids:
+            synth.generate_message(printer_id)
+        return synth.fleet
+
+    fleet_bytes, _ = measure_memory(fleet_state)
+    dict_bytes, _ = measure_memory(lambda: dict_state(synth, ids))
+    print(f"{args.printers:,} printers, {len(synth.base_data)} base records")
+    print(f"memory   FleetState {fleet_bytes / args.printers:7.1f} B/printer "
+          f"({synth.fleet.nbytes() / args.printers:.1f} B/printer in the arrays)")
+    print(f"         dict state {dict_bytes / args.printers:7.1f} B/printer")
+
+    generate = synth.generate_message
+    start = time.perf_counter()
+    for n in range(args.messages):
+        generate(ids[n % args.printers])
+    elapsed = time.perf_counter() - start
+    print(f"generate          {args.messages / elapsed:10,.0f} msg/s")
+
+    encode = synth.encode_message
+    start = time.perf_counter()
+    for n in range(args.messages):
+        encode(generate(ids[n % args.printers]))
+    elapsed = time.perf_counter() - start
+    print(f"generate + encode {args.messages / elapsed:10,.0f} msg/s")
+
+    feedback = [FakeMessage(dumps({'printer_id': ids[n % args.printers], 'new_speed': 40.0 + n % 20}))
+                for n in range(args.feedback)]
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        start = time.perf_counter()
+        for message in feedback:
+            synth.on_feedback(None, None, message)
+        elapsed = time.perf_counter() - start
+        sys.stdout = stdout
+    print(f"feedback apply    {args.feedback / elapsed:10,.0f} msg/s (on_feedback, JSON decode included)")
+
+
+if __name__ == '__main__':
+    main()
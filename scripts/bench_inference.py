@@ -0,0 +1,116 @@
+"""
+Compare per-message and micro-batched model inference in the processor.
+
+Messages arrive on a fixed schedule (printers x rate_hz, or as fast as
+possible with --rate 0). Latency is measured from a message's scheduled
+arrival to the moment its threshold/feedback step runs, so queueing delay
+is included when a path cannot keep up with the offered load.
+
+Usage: python3 scripts/bench_inference.py [--messages N] [--printers P] [--rate HZ]
+"""
+import os
+import sys
+import time
+import pickle
+import random
+import argparse
+import threading
+
+import numpy as np
+
+ENGINE_DIR = os.path.join(os.path.dirname(__file__), '..', 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from processor import TrainedSklearnModel, BatchInferenceStage
+
+
+def load_model(path):
+    with open(path, 'rb') as f:
+        model, scaler, feature_names = pickle.load(f)
+    return TrainedSklearnModel(model, scaler, feature_names)
+
+
+def make_messages(n, printers):
+    rng = random.Random(42)
+    return [{
+        'printer_id': f'printer_{i % printers + 1}',
+        'print_speed': rng.uniform(30, 100),
+        'nozzle_temperature': rng.uniform(180, 250),
+        'bed_temperature': rng.uniform(50, 100),
+        'roughness': rng.uniform(10, 100),
+    } for i in range(n)]
+
+
+def wait_until(deadline):
+    delay = deadline - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run_single(model, messages, printers, rate_hz):
+    latencies = np.empty(len(messages))
+    start = time.perf_counter()
+    for i, data in enumerate(messages):
+        arrival = start + (i // printers) / rate_hz if rate_hz else time.perf_counter()
+        wait_until(arrival)
+        model.predict(data)
+        latencies[i] = time.perf_counter() - arrival
+    return time.perf_counter() - start, latencies
+
+
+def run_batch(model, messages, printers, rate_hz, batch_size, max_wait):
+    latencies = np.empty(len(messages))
+    done = threading.Event()
+    remaining = [len(messages)]
+
+    def on_prediction(data, prediction):
+        latencies[data['_seq']] = time.perf_counter() - data['_arrival']
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            done.set()
+
+    stage = BatchInferenceStage(model, on_prediction, max_batch_size=batch_size, max_wait=max_wait)
+    start = time.perf_counter()
+    for i, data in enumerate(messages):
+        arrival = start + (i // printers) / rate_hz if rate_hz else time.perf_counter()
+        wait_until(arrival)
+        data['_seq'] = i
+        data['_arrival'] = arrival
+        stage.submit(data)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    stage.close()
+    return elapsed, latencies, stage.messages / max(stage.batches, 1)
+
+
+def report(name, n, elapsed, latencies, extra=''):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name:<7} {n / elapsed:>12,.0f} msg/s   p50={p50:8.3f}ms   p99={p99:8.3f}ms {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--printers', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='per-printer message rate in Hz (0 = as fast as possible)')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    print(f"{args.messages} messages, {args.printers} printers, "
+          f"rate={'max' if not args.rate else f'{args.rate:g} Hz/printer'}")
+
+    elapsed, latencies = run_single(model, make_messages(args.messages, args.printers),
+                                    args.printers, args.rate)
+    report('single', args.messages, elapsed, latencies)
+
+    elapsed, latencies, mean_batch = run_batch(
+        model, make_messages(args.messages, args.printers), args.printers, args.rate,
+        args.batch_size, args.max_wait_ms / 1000.0)
+    report('batch', args.messages, elapsed, latencies, f"  mean batch={mean_batch:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark the InfluxDB write path against a local HTTP stand-in.
+
+Compares one blocking HTTP write per point (what the processor does in
+`sync` mode) with the BatchingInfluxWriter used in `batch` mode.
+
+Usage: python3 scripts/bench_influx_writer.py [--points N] [--latency-ms MS]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'real-time-engine'))
+from influx_writer import BatchingInfluxWriter, line_protocol
+
+
+class FakeInflux(ThreadingHTTPServer):
+    """Accepts /api/v2/write requests and counts the points it receives"""
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeInfluxHandler)
+        self.latency = latency
+        self.points = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class FakeInfluxHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.points += body.count(b'\n') + 1 if body else 0
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def make_lines(n):
+    now = time.time_ns()
+    return [line_protocol('printing_metrics', {'printer_id': f'printer_{i % 50}'},
+                          {'roughness': 40.0 + i % 7, 'temperature': 215.5}, now + i)
+            for i in range(n)]
+
+
+def bench_sync(url, lines):
+    writer = BatchingInfluxWriter(url, 'token', 'org', 'bucket')
+    start = time.perf_counter()
+    for line in lines:
+        writer._post(line.encode('utf-8'))
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed
+
+
+def bench_batch(url, lines, batch_size):
+    writer = BatchingInfluxWriter(url, 'token', 'org', 'bucket',
+                                  batch_size=batch_size, flush_interval=0.1)
+    start = time.perf_counter()
+    for line in lines:
+        writer.write(line)
+    enqueue = time.perf_counter() - start
+    writer.close()
+    return enqueue, time.perf_counter() - start, writer.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--sync-points', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--latency-ms', type=float, default=1.0,
+                        help='simulated server-side latency per request')
+    args = parser.parse_args()
+
+    server = FakeInflux(latency=args.latency_ms / 1000.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    elapsed = bench_sync(url, make_lines(args.sync_points))
+    print(f"sync : {args.sync_points} points in {elapsed:.3f}s "
+          f"-> {args.sync_points / elapsed:,.0f} points/s, "
+          f"{elapsed / args.sync_points * 1e6:.1f} us blocked per message")
+
+    enqueue, total, metrics = bench_batch(url, make_lines(args.points), args.batch_size)
+    print(f"batch: {args.points} points in {total:.3f}s "
+          f"-> {args.points / total:,.0f} points/s, "
+          f"{enqueue / args.points * 1e6:.2f} us blocked per message")
+    print(f"       batches={metrics['batches_written']} "
+          f"max_batch={metrics['max_batch_size']} "
+          f"flush_avg={metrics['flush_seconds_avg'] * 1000:.2f}ms "
+          f"flush_max={metrics['flush_seconds_max'] * 1000:.2f}ms "
+          f"dropped={metrics['points_dropped']} failed={metrics['points_failed']}")
+    print(f"server received {server.points} points in {server.requests} requests")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
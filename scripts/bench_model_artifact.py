@@ -0,0 +1,111 @@
+"""
+Compare the pickled sklearn model with the compiled serving artifact.
+
+Reports cold load time (fresh interpreter, including imports), single-row
+and batched prediction latency, and the largest prediction difference
+between the two formats.
+
+Usage: python3 scripts/bench_model_artifact.py [--pickle PATH] [--artifact DIR]
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+import subprocess
+
+import numpy as np
+
+ENGINE_DIR = os.path.join(os.path.dirname(__file__), '..', 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from processor import TrainedSklearnModel
+from model_artifact import CompiledKNNModel
+
+LOAD_PICKLE = """
+import time, pickle
+start = time.perf_counter()
+with open({path!r}, 'rb') as f:
+    pickle.load(f)
+print(time.perf_counter() - start)
+"""
+
+LOAD_ARTIFACT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {engine!r})
+from model_artifact import CompiledKNNModel
+CompiledKNNModel.load({path!r})
+print(time.perf_counter() - start)
+"""
+
+
+def cold_load(code, repeat):
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code],
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip()))
+    return min(times)
+
+
+def make_rows(feature_names, n, seed=7):
+    rng = np.random.default_rng(seed)
+    ranges = {'print_speed': (30, 100), 'nozzle_temperature': (180, 250), 'bed_temperature': (50, 100)}
+    cols = {f: rng.uniform(*ranges.get(f, (0, 1)), n) for f in feature_names}
+    return [{f: float(cols[f][i]) for f in feature_names} for i in range(n)]
+
+
+def per_call(fn, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pickle', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--artifact', default=os.path.join(ENGINE_DIR, 'models', 'model_artifact'))
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    pickle_load = cold_load(LOAD_PICKLE.format(path=args.pickle), 3)
+    artifact_load = cold_load(LOAD_ARTIFACT.format(engine=ENGINE_DIR, path=args.artifact), 3)
+    print(f"cold load     pickle={pickle_load * 1000:8.1f}ms   artifact={artifact_load * 1000:8.1f}ms")
+
+    with open(args.pickle, 'rb') as f:
+        sklearn_model = TrainedSklearnModel(*pickle.load(f))
+    compiled = CompiledKNNModel.load(args.artifact)
+    rows = make_rows(compiled.feature_names, args.rows)
+
+    single_sk = per_call(lambda r: [sklearn_model.predict(x) for x in r], rows[:200], 3) / 200
+    single_cm = per_call(lambda r: [compiled.predict(x) for x in r], rows[:200], 3) / 200
+    print(f"single row    pickle={single_sk * 1e6:8.1f}us   artifact={single_cm * 1e6:8.1f}us")
+
+    batch = rows[:args.batch]
+    batch_sk = per_call(sklearn_model.predict_batch, batch, 20) / len(batch)
+    batch_cm = per_call(compiled.predict_batch, batch, 20) / len(batch)
+    print(f"batch of {len(batch):<4} pickle={batch_sk * 1e6:8.2f}us   artifact={batch_cm * 1e6:8.2f}us  (per row)")
+
+    expected = np.array([p['predicted_roughness'] for p in sklearn_model.predict_batch(rows)])
+    actual = np.array([p['predicted_roughness'] for p in compiled.predict_batch(rows)])
+    diff = np.abs(expected - actual)
+
+    # With duplicate training points the k-th and (k+1)-th neighbours can be at the
+    # same distance; either choice is a correct KNN answer, so those rows are excluded
+    X = sklearn_model.scaler.transform([[r[f] for f in compiled.feature_names] for r in rows])
+    k = compiled.n_neighbors
+    tied = np.zeros(len(rows), dtype=bool)
+    if k < compiled.train_X.shape[0]:
+        dist, _ = sklearn_model.model.kneighbors(X, n_neighbors=k + 1)
+        tied = np.isclose(dist[:, k - 1], dist[:, k])
+    mismatched = int((diff[~tied] > args.tolerance).sum())
+    print(f"max |diff| on untied rows={diff[~tied].max(initial=0.0):.3g}, "
+          f"{mismatched} of {int((~tied).sum())} untied rows above tolerance {args.tolerance:g} "
+          f"({int(tied.sum())} rows with tied k-th neighbours skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Replica scaling benchmark: processor.py replicas sharing the sensor stream
+through an MQTT v5 shared subscription on a real broker (the Mosquitto from
+docker compose, or any v5 broker with shared subscriptions).
+
+For each replica count, starts that many processor.py processes in one
+MQTT_SHARED_GROUP, writing to a local fake InfluxDB. It then publishes a
+synthesized sensor stream (printers x messages) from --publishers
+processes, each owning a slice of the printers, and reports:
+
+    throughput   raw printing_metrics points written per second
+    lost / dup   points written minus messages published, summed per printer
+    split        printers processed by more than one replica (from every
+                 replica's processor_printer_messages_total)
+    forwarded    messages a replica received but forwarded to the owner
+
+Throughput only scales while the broker and the publishers keep up and
+each replica has a CPU of its own; --rate caps the offered load.
+
+Usage:
+    docker compose up -d mqtt
+    python3 scripts/bench_replicas.py --host localhost --replicas 1,2,4 --printers 200 --messages 200000
+"""
+import os
+import re
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import collections
+import multiprocessing
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paho.mqtt.client as mqtt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENGINE_DIR = os.path.join(ROOT, 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from stream_log import read_stream_log
+from sensor_message import REQUIRED_FIELDS, decode
+from bench_end_to_end import synthesize_log
+
+METRIC = re.compile(r'^(\w+)(?:\{(\w+)="([^"]*)"\})? (\S+)$')
+
+
+class FakeInflux(ThreadingHTTPServer):
+    """/api/v2/write stand-in counting raw points per printer"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeInfluxHandler)
+        self.points = collections.Counter()
+        self.last_write = None
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.points.clear()
+            self.last_write = None
+
+
+class FakeInfluxHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        printers = collections.Counter(
+            line.split(b' ', 1)[0].split(b'printer_id=', 1)[1].decode()
+            for line in body.split(b'\n') if line.startswith(b'printing_metrics,'))
+        with self.server.lock:
+            self.server.points.update(printers)
+            self.server.last_write = time.perf_counter()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def scrape(port):
+    """{metric: {label value: number}} from a replica's /metrics"""
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+        text = response.read().decode()
+    metrics = collections.defaultdict(dict)
+    for line in text.splitlines():
+        match = METRIC.match(line)
+        if match:
+            name, _, label, value = match.groups()
+            metrics[name][label] = float(value)
+    return metrics
+
+
+def replica_env(args, index, group, sink_port):
+    env = dict(os.environ)
+    env.update({
+        'MQTT_HOST': args.host, 'MQTT_PORT': str(args.port),
+        'MQTT_SHARED_GROUP': group, 'MQTT_CLIENT_ID': f'{group}-{index}',
+        'MQTT_CLIENT_POOL': str(args.pool),
+        'INFLUXDB_HOST': '127.0.0.1', 'INFLUXDB_PORT': str(sink_port),
+        'DOCKER_INFLUXDB_INIT_ADMIN_TOKEN': 'bench', 'INFLUXDB_ORG': 'bench',
+        'INFLUX_WRITE_MODE': 'batch', 'INFLUX_SPOOL_DIR': '',
+        'MODEL_PATH': args.model, 'MODEL_RELOAD': 'false', 'PROCESSOR_WORKERS': '1',
+        'METRICS_PORT': str(args.metrics_port + index), 'METRICS_PER_PRINTER': 'true',
+        'LOG_LEVEL': 'WARNING',
+    })
+    return env
+
+
+def start_replicas(args, count, group, sink_port):
+    replicas = [subprocess.Popen([sys.executable, 'processor.py'], cwd=ENGINE_DIR,
+                                 env=replica_env(args, i, group, sink_port),
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for i in range(count)]
+    # Ready once every replica is subscribed and sees the whole group
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            groups = [scrape(args.metrics_port + i)['processor_replica_group'] for i in range(count)]
+            if all(g.get('joined') == 1 and g.get('members') == count for g in groups):
+                return replicas
+        except OSError:
+            pass
+        if any(r.poll() is not None for r in replicas):
+            break
+        time.sleep(0.5)
+    stop_replicas(replicas)
+    raise RuntimeError(f"{count} replicas did not form a group on {args.host}:{args.port}")
+
+
+def stop_replicas(replicas):
+    for replica in replicas:
+        replica.send_signal(signal.SIGINT)
+    for replica in replicas:
+        try:
+            replica.wait(30)
+        except subprocess.TimeoutExpired:
+            replica.kill()
+
+
+def publish(args, messages, rate):
+    """Publisher process: send (topic, payload) pairs, optionally paced to `rate` per second."""
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, protocol=mqtt.MQTTv5)
+    client.username_pw_set(os.getenv('MQTT_USERNAME'), os.getenv('MQTT_PASSWORD'))
+    client.connect(args.host, args.port)
+    client.loop_start()
+    start = time.perf_counter()
+    info = None
+    for i, (topic, payload) in enumerate(messages):
+        if rate and i % 100 == 0:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        info = client.publish(topic, payload)
+    # QoS 0 messages count as published once written to the socket
+    if info is not None:
+        info.wait_for_publish()
+    client.disconnect()
+    client.loop_stop()
+
+
+def run(args, count, messages, sink):
+    group = f'bench{os.getpid()}x{count}'
+    replicas = start_replicas(args, count, group, sink.server_address[1])
+    try:
+        sink.reset()
+        # Each publisher owns whole printers, so per-printer order is kept
+        slices = [[] for _ in range(args.publishers)]
+        for topic, payload in messages:
+            slices[hash(topic) % args.publishers].append((topic, payload))
+        ctx = multiprocessing.get_context('fork')
+        publishers = [ctx.Process(target=publish, args=(args, s, args.rate / args.publishers))
+                      for s in slices]
+        start = time.perf_counter()
+        for p in publishers:
+            p.start()
+        for p in publishers:
+            p.join()
+        # Done when the sink has gone quiet for longer than the writer's flush interval
+        while True:
+            time.sleep(0.5)
+            with sink.lock:
+                written, last = sum(sink.points.values()), sink.last_write
+            if written >= len(messages) or (last and time.perf_counter() - last > 3.0):
+                break
+        elapsed = (last or time.perf_counter()) - start
+        scraped = [scrape(args.metrics_port + i) for i in range(count)]
+    finally:
+        stop_replicas(replicas)
+
+    owners = collections.Counter()
+    for metrics in scraped:
+        owners.update(metrics.get('processor_printer_messages_total', {}).keys())
+    sent = collections.Counter(decode(payload, REQUIRED_FIELDS).printer_id for _, payload in messages)
+    with sink.lock:
+        points = dict(sink.points)
+    return {
+        'replicas': count,
+        'sent': len(messages),
+        'written': sum(points.values()),
+        'lost': sum(max(0, n - points.get(p, 0)) for p, n in sent.items()),
+        'duplicated': sum(max(0, points.get(p, 0) - n) for p, n in sent.items()),
+        'split': sum(1 for n in owners.values() if n > 1),
+        'forwarded': sum(m['processor_replica_group'].get('forwarded', 0) for m in scraped),
+        'throughput': sum(points.values()) / elapsed,
+        'per_replica': [int(m['processor_messages_total'].get(None, 0)) for m in scraped],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=os.getenv('MQTT_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('MQTT_PORT', 1883)))
+    parser.add_argument('--replicas', default='1,2,4', help='comma-separated replica counts')
+    parser.add_argument('--pool', type=int, default=1, help='MQTT_CLIENT_POOL per replica')
+    parser.add_argument('--printers', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--publishers', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=0, help='total messages/s offered (0 = max)')
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--metrics-port', type=int, default=9300)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'replicas.pslog')
+    synthesize_log(path, args.messages / args.printers, args.printers, 1)
+    messages = [(topic, payload) for _, topic, payload in read_stream_log(path)]
+
+    sink = FakeInflux()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    print(f"{len(messages):,} messages from {args.printers} printers via {args.host}:{args.port}, "
+          f"pool {args.pool}, rate {args.rate or 'max'}")
+    baseline = None
+    for count in [int(n) for n in args.replicas.split(',')]:
+        r = run(args, count, messages, sink)
+        baseline = baseline or r['throughput'] / count
+        print(f"{count} replica(s): {r['throughput']:9,.0f} points/s ({r['throughput'] / baseline / count:.0%} of linear)  "
+              f"written {r['written']:,}/{r['sent']:,}  lost {r['lost']:,}  dup {r['duplicated']:,}  "
+              f"split printers {r['split']}  forwarded {r['forwarded']:,.0f}  per replica {r['per_replica']}")
+    sink.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Serving benchmark for the models the processor runs: TrainedSklearnModel
+(pickle), CompiledKNNModel (artifact), DummyModel, and the StandardScaler
+step on its own.
+
+For each dataset size a model is trained on generate_synthetic_data(n)
+exactly as train_model.py does (same features, split and scaler) and saved
+in every serving format it supports. Each format is then measured for:
+
+    load         cold load in a fresh interpreter (imports included), min of --load-repeat
+    memory       peak RSS of that process after loading and one prediction,
+                 minus a bare interpreter; plus the size on disk
+    single row   predict(row) latency p50/p99 and rows/s
+    batched      predict_batch(rows) latency p50/p99 per batch and rows/s
+
+--model benchmarks an already trained pickle or artifact directory instead,
+which is the check to run on a retrained model before deploying it. With
+--budget-us the script exits non-zero if any single-row p99 is over budget.
+Runs are seeded; the JSON report records the arguments and library versions.
+
+Usage:
+    python3 scripts/bench_serving.py --sizes 1000,10000,100000 --json serving.json
+    python3 scripts/bench_serving.py --model real-time-engine/models/model.pkl --budget-us 500
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+import sklearn
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENGINE_DIR = os.path.join(ROOT, 'real-time-engine')
+sys.path.append(ROOT)
+sys.path.append(ENGINE_DIR)
+from utils.load_data import generate_synthetic_data
+from processor import TrainedSklearnModel, DummyModel
+from model_artifact import CompiledKNNModel, export_artifact, is_artifact
+from model_search import FAMILIES, build_model
+
+FEATURES = ['print_speed', 'nozzle_temperature', 'bed_temperature', 'vibration', 'humidity']
+TARGET = 'surface_roughness'
+
+# Peak RSS from /proc: ru_maxrss would include the (much larger) parent, as it survives fork + exec
+PEAK_RSS = "int(next(l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')))"
+
+LOAD = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {engine!r})
+if {artifact!r}:
+    from model_artifact import CompiledKNNModel
+    model = CompiledKNNModel.load({path!r})
+    load = time.perf_counter() - start
+    model.predict({row!r})
+else:
+    import pickle
+    with open({path!r}, 'rb') as f:
+        model, scaler, features = pickle.load(f)
+    load = time.perf_counter() - start
+    model.predict(scaler.transform([[{row!r}.get(f, 0.0) for f in features]]))
+print(json.dumps({{'load': load, 'rss_kb': {peak_rss}}}))
+"""
+
+
+def python(code):
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code],
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+def disk_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def cold_load(path, row, repeat, bare_kb):
+    code = LOAD.format(engine=ENGINE_DIR, artifact=is_artifact(path), path=path, row=row, peak_rss=PEAK_RSS)
+    runs = [json.loads(python(code)) for _ in range(repeat)]
+    return {
+        'load_ms': min(r['load'] for r in runs) * 1000,
+        'rss_mb': (min(r['rss_kb'] for r in runs) - bare_kb) / 1024,
+        'disk_mb': disk_bytes(path) / 1e6,
+    }
+
+
+def timings(fn, inputs, min_seconds):
+    """Per-call wall times of fn over `inputs`, cycling until min_seconds have passed."""
+    fn(inputs[0])
+    times = []
+    start = time.perf_counter()
+    while len(times) < len(inputs) or time.perf_counter() - start < min_seconds:
+        x = inputs[len(times) % len(inputs)]
+        t0 = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def latency(times, rows_per_call):
+    p50, p99 = np.percentile(times, [50, 99]) * 1e6
+    return {'p50_us': p50, 'p99_us': p99, 'rows_per_s': rows_per_call * len(times) / times.sum(),
+            'calls': len(times)}
+
+
+def measure(predict, predict_batch, rows, batch_size, min_seconds):
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows) - batch_size + 1, batch_size)] or [rows]
+    return {
+        'single': latency(timings(predict, rows, min_seconds), 1),
+        'batch': latency(timings(predict_batch, batches, min_seconds), len(batches[0])),
+    }
+
+
+def scaler_step(model):
+    """Just the scaler.transform part of TrainedSklearnModel, single row and batched."""
+    features, scaler = model.feature_names, model.scaler
+
+    def single(row):
+        return scaler.transform([[row.get(f, 0.0) for f in features]])
+
+    def batch(rows):
+        return scaler.transform(np.array([[row.get(f, 0.0) for f in features] for row in rows], dtype=float))
+    return single, batch
+
+
+def split(df):
+    """train_model.py's feature selection and split: (features, X_train, y_train, held-out sensor rows)."""
+    features = [f for f in FEATURES if f in df.columns]
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[features].values, df[TARGET].values, test_size=0.2, random_state=42)
+    rows = [dict(zip(features, map(float, x)), roughness=float(y)) for x, y in zip(X_test, y_test)]
+    return features, X_train, y_train, rows
+
+
+def train(df, family, directory):
+    """Train like train_model.py; returns (paths by format, held-out rows)."""
+    features, X_train, y_train, rows = split(df)
+    scaler = StandardScaler()
+    model = build_model(family)
+    model.fit(scaler.fit_transform(X_train), y_train)
+
+    paths = {'pickle': os.path.join(directory, f'{family}.pkl')}
+    with open(paths['pickle'], 'wb') as f:
+        pickle.dump((model, scaler, features), f)
+    if family == 'knn':
+        paths['artifact'] = os.path.join(directory, f'{family}_artifact')
+        export_artifact(model, scaler, features, paths['artifact'])
+    return paths, rows
+
+
+def load_serving(path):
+    if is_artifact(path):
+        return CompiledKNNModel.load(path)
+    with open(path, 'rb') as f:
+        return TrainedSklearnModel(*pickle.load(f))
+
+
+def bench_formats(paths, rows, args, bare_kb, label):
+    results = []
+    for fmt, path in paths.items():
+        model = load_serving(path)
+        entry = {'model': label, 'format': fmt, **cold_load(path, rows[0], args.load_repeat, bare_kb)}
+        entry.update(measure(model.predict, model.predict_batch, rows, args.batch, args.min_seconds))
+        results.append(entry)
+        if fmt == 'pickle':
+            single, batch = scaler_step(model)
+            results.append({'model': label, 'format': 'scaler',
+                            **measure(single, batch, rows, args.batch, args.min_seconds)})
+    return results
+
+
+def report(result):
+    single, batch = result['single'], result['batch']
+    load = (f"load {result['load_ms']:7.1f}ms  rss {result['rss_mb']:6.1f}MB  disk {result['disk_mb']:6.2f}MB"
+            if 'load_ms' in result else ' ' * 46)
+    print(f"{result.get('rows', ''):>8} {result['model']:<18} {result['format']:<9} {load}  "
+          f"single p50 {single['p50_us']:8.1f}us p99 {single['p99_us']:8.1f}us {single['rows_per_s']:9,.0f}/s  "
+          f"batch p50 {batch['p50_us']:9.1f}us p99 {batch['p99_us']:9.1f}us {batch['rows_per_s']:10,.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated generate_synthetic_data sizes')
+    parser.add_argument('--models', default='knn',
+                        help=f"comma-separated families to train ({','.join(FAMILIES)})")
+    parser.add_argument('--model', help='benchmark this trained pickle or artifact instead of training')
+    parser.add_argument('--batch', type=int, default=256, help='rows per predict_batch call')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='minimum timing per measurement')
+    parser.add_argument('--load-repeat', type=int, default=3)
+    parser.add_argument('--budget-us', type=float, help='fail if any single-row p99 exceeds this')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args()
+
+    # DummyModel draws from `random`; generate_synthetic_data seeds NumPy itself
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    bare_kb = min(int(python(f'print({PEAK_RSS})')) for _ in range(3))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.model:
+            rows = split(generate_synthetic_data(10000))[3]
+            label = os.path.basename(os.path.normpath(args.model))
+            results += bench_formats({'artifact' if is_artifact(args.model) else 'pickle': args.model},
+                                     rows, args, bare_kb, label)
+        else:
+            for size in [int(s) for s in args.sizes.split(',')]:
+                df = generate_synthetic_data(size)
+                for family in [f.strip() for f in args.models.split(',')]:
+                    paths, rows = train(df, family, tmp)
+                    for result in bench_formats(paths, rows, args, bare_kb, family):
+                        results.append({'rows': size, **result})
+                dummy = DummyModel()
+                results.append({'rows': size, 'model': 'dummy', 'format': 'none',
+                                **measure(dummy.predict, dummy.predict_batch, rows, args.batch, args.min_seconds)})
+    for result in results:
+        report(result)
+
+    # Only whole serving paths count against the budget, not the scaler step or DummyModel
+    over = [r for r in results if args.budget_us and 'load_ms' in r and r['single']['p99_us'] > args.budget_us]
+    for r in over:
+        print(f"OVER BUDGET: {r['model']} ({r['format']}) single-row p99 "
+              f"{r['single']['p99_us']:.1f}us > {args.budget_us:g}us")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'args': vars(args),
+                'environment': {
+                    'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count(), 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"Wrote {args.json}")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
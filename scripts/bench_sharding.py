@@ -0,0 +1,112 @@
+"""
+Measure processor throughput as the number of shard worker processes grows.
+
+Each worker decodes the JSON payload, encodes the InfluxDB line, runs the
+model and builds the feedback message, exactly as the processor does, but
+without network I/O so the numbers reflect CPU scaling only.
+
+Usage: python3 scripts/bench_sharding.py [--workers 1,2,4] [--messages N]
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+
+ENGINE_DIR = os.path.join(os.path.dirname(__file__), '..', 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from sharding import ShardedDispatcher
+from influx_writer import line_protocol
+from model_artifact import CompiledKNNModel, is_artifact
+from processor import TrainedSklearnModel
+
+
+class BenchWorker:
+    """Processor stand-in: same per-message work, no MQTT or InfluxDB"""
+    def __init__(self, model_path, threshold=75.0):
+        if is_artifact(model_path):
+            self.model = CompiledKNNModel.load(model_path)
+        else:
+            with open(model_path, 'rb') as f:
+                self.model = TrainedSklearnModel(*pickle.load(f))
+        self.threshold = threshold
+        self.lines = 0
+        self.feedback = 0
+
+    def handle_payload(self, payload):
+        data = json.loads(payload.decode())
+        line_protocol('printing_metrics', {'printer_id': data['printer_id']},
+                      {'roughness': float(data['roughness']),
+                       'temperature': float(data['nozzle_temperature'])}, time.time_ns())
+        self.lines += 1
+        prediction = self.model.predict(data)
+        if data['roughness'] > self.threshold:
+            json.dumps({'printer_id': data['printer_id'], 'prediction': prediction})
+            self.feedback += 1
+
+    def shutdown(self):
+        return {'lines': self.lines, 'feedback': self.feedback}
+
+
+class BenchWorkerFactory:
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def __call__(self):
+        return BenchWorker(self.model_path)
+
+
+def make_payloads(n, printers):
+    rng = random.Random(1)
+    payloads = []
+    for i in range(n):
+        printer = i % printers + 1
+        payloads.append((f'printing/{printer}/sensor', json.dumps({
+            'printer_id': f'printer_{printer}',
+            'print_speed': round(rng.uniform(30, 100), 2),
+            'nozzle_temperature': round(rng.uniform(180, 250), 2),
+            'bed_temperature': round(rng.uniform(50, 100), 2),
+            'roughness': round(rng.uniform(10, 100), 2),
+            'cycle_count': i // printers,
+        }).encode()))
+    return payloads
+
+
+def run(workers, payloads, model_path):
+    dispatcher = ShardedDispatcher(workers, BenchWorkerFactory(model_path), max_queue=len(payloads))
+    dispatcher.start()
+    dispatcher.wait_ready(timeout=60)
+    start = time.perf_counter()
+    for topic, payload in payloads:
+        dispatcher.dispatch(topic, payload)
+    stats = dispatcher.stop()
+    return time.perf_counter() - start, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--printers', type=int, default=64)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.messages, args.printers)
+    print(f"{args.messages} messages, {args.printers} printers, {os.cpu_count()} CPUs")
+    baseline = None
+    cpus = os.cpu_count() or 1
+    for workers in [int(w) for w in args.workers.split(',')]:
+        if workers > cpus:
+            print(f"warning: {workers} workers on {cpus} CPUs; the workers share cores, so this measures "
+                  f"contention, not scaling", file=sys.stderr)
+        elapsed, stats = run(workers, payloads, args.model)
+        rate = args.messages / elapsed
+        baseline = baseline or rate
+        split = '/'.join(str(s['messages']) for s in stats)
+        print(f"workers={workers:<3} {rate:>10,.0f} msg/s   speedup={rate / baseline:4.2f}x   per-shard={split}")
+
+
+if __name__ == '__main__':
+    main()
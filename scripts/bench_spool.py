@@ -0,0 +1,149 @@
+"""
+InfluxDB outage benchmark: BatchingInfluxWriter with and without the disk
+spool against a local fake sink that goes down part way through.
+
+Points are offered at --rate per second for --seconds. The sink answers 503
+from --down-at for --down-for seconds, then recovers. Reports points lost,
+how many went through the spool, drain throughput (points per second of
+replay requests) and recovery time (from the sink coming back to the spool
+being empty). Every point has a unique timestamp, so the sink counts
+distinct points and replays of the same batch are not double counted.
+
+Usage:
+    python3 scripts/bench_spool.py --rate 20000 --seconds 20 --down-at 5 --down-for 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'real-time-engine'))
+from influx_writer import BatchingInfluxWriter, line_protocol
+from spool import DiskSpool
+
+
+class FakeInflux(ThreadingHTTPServer):
+    """/api/v2/write stand-in that can be switched down; records distinct timestamps"""
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeInfluxHandler)
+        self.latency = latency
+        self.down = False
+        self.seen = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class FakeInfluxHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.down:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        stamps = [line.rsplit(b' ', 1)[1] for line in body.split(b'\n') if line]
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.seen.update(stamps)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(args, spool_dir=None):
+    server = FakeInflux(latency=args.latency_ms / 1000.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    spool = DiskSpool(spool_dir, max_bytes=int(args.spool_max_mb * 1e6)) if spool_dir else None
+    writer = BatchingInfluxWriter(url, 'token', 'org', 'bucket', batch_size=args.batch_size,
+                                  flush_interval=0.2, max_queue=args.max_queue,
+                                  overflow='spool' if spool else 'drop_oldest',
+                                  max_retries=3, retry_backoff=0.2, spool=spool)
+
+    sent = 0
+    tick = 0.01
+    per_tick = int(args.rate * tick)
+    start = time.perf_counter()
+    recovered_at = drained_at = None
+
+    def spool_empty():
+        return spool is not None and spool.pending_bytes() == 0 and writer.drainer.healthy
+
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= args.seconds:
+            break
+        server.down = args.down_at <= elapsed < args.down_at + args.down_for
+        if recovered_at is None and elapsed >= args.down_at + args.down_for:
+            recovered_at = time.perf_counter()
+        if recovered_at is not None and drained_at is None and spool_empty():
+            drained_at = time.perf_counter()
+        for _ in range(per_tick):
+            writer.write(line_protocol('printing_metrics', {'printer_id': f'printer_{sent % 100}'},
+                                       {'roughness': 40.0, 'temperature': 215.5}, 1_700_000_000_000_000_000 + sent))
+            sent += 1
+        delay = start + (elapsed // tick + 1) * tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Wait for the queue and the spool to empty (or give up after --settle seconds)
+    deadline = time.perf_counter() + args.settle
+    while time.perf_counter() < deadline:
+        if writer.queue_depth() == 0 and (spool is None or spool_empty()):
+            break
+        time.sleep(0.05)
+    if drained_at is None:
+        drained_at = time.perf_counter()
+    writer.close()
+    server.shutdown()
+
+    stats = writer.metrics()
+    result = {'sent': sent, 'received': len(server.seen), 'dropped': stats['points_dropped'],
+              'failed': stats['points_failed'], 'spooled': stats['points_spooled']}
+    if spool is not None:
+        drain = writer.drainer.metrics()
+        result.update({
+            'drained': drain['points_drained'], 'evicted': drain['points_evicted'],
+            'drain_rate': drain['points_drained'] / drain['drain_seconds_total'] if drain['drain_seconds_total'] else 0,
+            'recovery': drained_at - recovered_at if recovered_at else 0.0,
+            'fsyncs': drain['fsyncs'],
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=20000, help='points per second offered')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--down-at', type=float, default=5)
+    parser.add_argument('--down-for', type=float, default=5)
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='sink latency per request')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--max-queue', type=int, default=100000)
+    parser.add_argument('--spool-max-mb', type=float, default=1024)
+    parser.add_argument('--settle', type=float, default=60, help='max seconds to wait for the drain')
+    args = parser.parse_args()
+
+    print(f"{args.rate:,.0f} points/s for {args.seconds:g}s, sink down {args.down_for:g}s from t={args.down_at:g}s")
+    for label, spool_dir in (('no spool', None), ('disk spool', tempfile.mkdtemp(prefix='spool-'))):
+        r = run(args, spool_dir)
+        lost = r['sent'] - r['received']
+        line = (f"{label:<10}: sent {r['sent']:,}, received {r['received']:,}, lost {lost:,} "
+                f"({lost / max(r['sent'], 1):.2%}; dropped {r['dropped']:,}, failed {r['failed']:,})")
+        if spool_dir:
+            line += (f"\n            spooled {r['spooled']:,}, drained {r['drained']:,} at {r['drain_rate']:,.0f} points/s, "
+                     f"evicted {r['evicted']:,}, recovery {r['recovery']:.2f}s after the sink came back, "
+                     f"{r['fsyncs']} fsyncs")
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
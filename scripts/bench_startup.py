@@ -0,0 +1,146 @@
+"""
+Startup benchmark: import times and time to the first processed message for
+the processor and the synthesizer, each measured in a fresh interpreter.
+
+Import times come from `python -X importtime` and list the heaviest
+top-level imports of each module. The startup phases are wall-clock times
+from spawning the interpreter:
+
+    processor    imported, connected (constructor returned, subscribed),
+                 first message processed, model ready
+    synthesizer  imported, dataset loaded, first message encoded
+
+The processor runs with bench_end_to_end's in-process MQTT stand-in and a
+fake InfluxDB sink. Its sensor message is published as soon as the client
+is connected, so "first message processed" includes waiting for the model.
+
+Usage:
+    python3 scripts/bench_startup.py --repeat 5
+    python3 scripts/bench_startup.py --dataset store    # synthesizer reads the feature store
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENGINE_DIR = os.path.join(ROOT, 'real-time-engine')
+SYNTH_DIR = os.path.join(ROOT, 'synthesizer')
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = (('processor', ENGINE_DIR), ('synthesizer', SYNTH_DIR), ('train_model', ENGINE_DIR))
+
+
+def import_times(module, cwd, top=5):
+    """(total ms, [(package, ms)] heaviest first) for importing `module` in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT),
+                            capture_output=True, text=True)
+    # A module's imports are listed before it, indented by two more spaces
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == module:
+                return int(cumulative) / 1000, sorted(children, key=lambda p: -p[1])[:top]
+            children = []
+    return float('nan'), []
+
+
+def child_processor(spawned, model):
+    os.environ.update({'MODEL_PATH': model, 'METRICS_PORT': '0', 'MQTT_SHARED_GROUP': '',
+                       'MODEL_RELOAD': 'false', 'LOG_LEVEL': 'WARNING'})
+    sys.path[:0] = [ENGINE_DIR, SCRIPTS_DIR]
+    phases = {'interpreter': time.time() - spawned}
+    import processor  # noqa: F401
+    phases['imported'] = time.time() - spawned
+    from bench_end_to_end import InProcessBroker, make_harness_processor
+    from sensor_message import dumps
+
+    broker = InProcessBroker()
+    harness = make_harness_processor(broker)
+    phases['connected'] = time.time() - spawned
+    harness.client.loop_start()
+    broker.publish('printing/1/sensor', dumps({
+        'printer_id': 'printer_1', 'layer_height': 0.2, 'wall_thickness': 1.2, 'infill_density': 20,
+        'nozzle_temperature': 210, 'bed_temperature': 60, 'print_speed': 60, 'fan_speed': 50,
+        'roughness': 100.0, 'timestamp': time.time()}))
+    while not harness.handled:
+        time.sleep(0.0005)
+    phases['first message'] = time.time() - spawned
+    ready = getattr(harness, 'model_ready', None)
+    if ready is not None:
+        ready.wait()
+    phases['model ready'] = time.time() - spawned
+    harness.shutdown()
+    return phases
+
+
+def child_synthesizer(spawned, dataset):
+    os.environ['FEATURE_STORE_PATH'] = os.path.join(ROOT, 'data', 'feature_store' if dataset == 'store' else 'missing')
+    os.environ['DATASET_PATH'] = os.path.join(ROOT, 'data', 'data.csv')
+    os.chdir(SYNTH_DIR)
+    sys.path.insert(0, SYNTH_DIR)
+    phases = {'interpreter': time.time() - spawned}
+    import synthesizer
+    phases['imported'] = time.time() - spawned
+    synth = synthesizer.DataSynthesizer(connect=False)
+    phases['dataset loaded'] = time.time() - spawned
+    synth.encode_message(synth.generate_message('printer_1'))
+    phases['first message'] = time.time() - spawned
+    return phases
+
+
+def measure(args, component):
+    """Median seconds per phase over --repeat fresh interpreters"""
+    runs = []
+    for _ in range(args.repeat):
+        command = [sys.executable, os.path.abspath(__file__), '--child', component, '--spawned', repr(time.time()),
+                   '--model', args.model, '--dataset', args.dataset]
+        output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per component')
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--dataset', choices=['csv', 'store'], default='csv',
+                        help="synthesizer's base dataset source")
+    parser.add_argument('--child', choices=['processor', 'synthesizer'], help=argparse.SUPPRESS)
+    parser.add_argument('--spawned', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            if args.child == 'processor':
+                phases = child_processor(args.spawned, args.model)
+            else:
+                phases = child_synthesizer(args.spawned, args.dataset)
+            sys.stdout = stdout
+        print(json.dumps(phases))
+        return
+
+    print("import time (python -X importtime, ms):")
+    for module, cwd in MODULES:
+        total, heaviest = import_times(module, cwd)
+        print(f"  {module:<12} {total:6.0f}  heaviest: " + ', '.join(f"{name} {ms:.0f}" for name, ms in heaviest))
+
+    print(f"startup, seconds from spawn (median of {args.repeat}):")
+    for component in ('processor', 'synthesizer'):
+        phases = measure(args, component)
+        print(f"  {component:<12} " + '  '.join(f"{phase} {seconds:.3f}" for phase, seconds in phases.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Wire format benchmark: per-message CPU and payload size for plain JSON
+versus the typed SensorMessage path (orjson when installed) and the
+struct-packed binary format.
+
+Encode side uses the synthesizer's BulkGenerator; decode side covers
+parsing plus the field reads the processor does per message (printer id,
+roughness, temperature, speed and the model features).
+
+Usage:
+    python3 scripts/bench_wire_format.py --messages 200000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'real-time-engine'))
+sys.path.append(os.path.join(ROOT, 'synthesizer'))
+from bulk_generator import BulkGenerator
+import sensor_message
+from sensor_message import MessageError, SensorMessage, decode, orjson
+
+FEATURES = ('print_speed', 'nozzle_temperature', 'bed_temperature')
+
+
+def cpu_per_message(fn, items):
+    start = time.process_time()
+    fn(items)
+    return (time.process_time() - start) / len(items) * 1e6
+
+
+def generate(count, printers=1000):
+    """Payloads the processor accepts; messages missing a field read here (dropouts) are counted and left out."""
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'data.csv')).to_dict('records')
+    generator = BulkGenerator(base, printers, seed=7)
+    required = sensor_message.REQUIRED_FIELDS + FEATURES
+    json_payloads, binary_payloads = [], []
+    rejected = 0
+    while len(json_payloads) < count:
+        values, labels = generator.tick()
+        for json_payload, binary_payload in zip(generator.encode(values, labels, '2024-01-01T00:00:00.000000'),
+                                                generator.encode_binary(values, labels, 1704067200.0)):
+            json_payload = json_payload.encode('utf-8')
+            try:
+                decode(json_payload, required)
+            except MessageError:
+                rejected += 1
+                continue
+            json_payloads.append(json_payload)
+            binary_payloads.append(binary_payload)
+    return generator, json_payloads[:count], binary_payloads[:count], rejected
+
+
+def read_dict(payloads):
+    for payload in payloads:
+        data = json.loads(payload.decode())
+        data['printer_id'], float(data['roughness']), float(data['nozzle_temperature'])
+        data['print_speed'] * 0.8
+        [data.get(f, 0.0) for f in FEATURES]
+
+
+def read_message(payloads):
+    required = sensor_message.REQUIRED_FIELDS + FEATURES
+    for payload in payloads:
+        msg = decode(payload, required)
+        msg.printer_id, msg.roughness, msg.nozzle_temperature
+        msg.print_speed * 0.8
+        [msg.get(f, 0.0) for f in FEATURES]
+
+
+def read_message_stdlib(payloads):
+    required = sensor_message.REQUIRED_FIELDS + FEATURES
+    for payload in payloads:
+        msg = SensorMessage.from_dict(json.loads(payload)).validate(required)
+        msg.printer_id, msg.roughness, msg.nozzle_temperature
+        msg.print_speed * 0.8
+        [msg.get(f, 0.0) for f in FEATURES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    generator, json_payloads, binary_payloads, rejected = generate(args.messages)
+    n = len(json_payloads)
+    # Sanity check: both formats decode to the same message
+    a, b = decode(json_payloads[0]), decode(binary_payloads[0])
+    assert a.printer_id == b.printer_id and abs(a.roughness - b.roughness) < 1e-3
+
+    values, labels = generator.tick()
+    encode_json = cpu_per_message(lambda _: generator.encode(values, labels, '2024-01-01T00:00:00'),
+                                  range(generator.printer_count))
+    encode_binary = cpu_per_message(lambda _: generator.encode_binary(values, labels, 1704067200.0),
+                                    range(generator.printer_count))
+    dicts = [json.loads(p) for p in json_payloads[:20000]]
+    dumps_json = cpu_per_message(lambda items: [json.dumps(d) for d in items], dicts)
+    dumps_fast = cpu_per_message(lambda items: [sensor_message.dumps(d) for d in items], dicts)
+
+    json_bytes = sum(map(len, json_payloads)) / n
+    binary_bytes = sum(map(len, binary_payloads)) / n
+    print(f"{n} messages, JSON backend: {'orjson' if orjson else 'json (stdlib)'}"
+          f"{f' ({rejected} rejected by decode left out)' if rejected else ''}")
+    print(f"bytes on the wire : json {json_bytes:.1f} B/msg, binary {binary_bytes:.1f} B/msg "
+          f"({binary_bytes / json_bytes:.0%})")
+    print(f"encode (bulk)     : json template {encode_json:.2f} us/msg, binary {encode_binary:.2f} us/msg")
+    print(f"encode (dict)     : json.dumps {dumps_json:.2f} us/msg, fast dumps {dumps_fast:.2f} us/msg")
+    print(f"decode + read     : json.loads dict {cpu_per_message(read_dict, json_payloads):.2f} us/msg")
+    print(f"                    SensorMessage/json {cpu_per_message(read_message_stdlib, json_payloads):.2f} us/msg")
+    if orjson is not None:
+        print(f"                    SensorMessage/orjson {cpu_per_message(read_message, json_payloads):.2f} us/msg")
+    print(f"                    SensorMessage/binary {cpu_per_message(read_message, binary_payloads):.2f} us/msg")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Correctness check for the processor's in-stream rollups: recompute every
+window from the raw points and compare with what RollupEngine emitted.
+
+count, mean, min and max must match to floating-point precision, and so
+must p95 of the base (10 s) window, which is computed from the raw values.
+Larger windows read p95 from a quantile sketch and must be within the
+sketch's relative accuracy of the nearest-rank p95 of the raw values.
+
+By default a synthetic stream is replayed through the engine: printers
+with jittered rates, some going silent part way (their windows are closed
+by the sweep) and a final flush. With --influx the comparison runs on what
+is actually stored: raw printing_metrics and printing_metrics_rollup
+points from InfluxDB (INFLUXDB_V2_* environment variables), for windows
+that lie entirely inside the queried range.
+
+Usage:
+    python3 scripts/check_rollups.py --printers 50 --seconds 1800 --rate 20
+    python3 scripts/check_rollups.py --influx --hours 2
+"""
+import os
+import sys
+import math
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'real-time-engine'))
+from rollups import RollupEngine, parse_window, recompute, window_label
+
+FIELDS = ['roughness', 'temperature']
+
+
+def synthetic_stream(printers, seconds, rate, seed):
+    """Raw points [(printer_id, timestamp_ns, [roughness, temperature])] in time order."""
+    rng = random.Random(seed)
+    start = 1_700_000_000 * 10**9
+    points = []
+    for p in range(printers):
+        printer_id = f'printer_{p + 1}'
+        # A third of the printers stop part way through the run
+        stop = seconds * (rng.uniform(0.2, 0.9) if p % 3 == 0 else 1.0)
+        t = rng.uniform(0, 1.0 / rate)
+        roughness = rng.uniform(20, 80)
+        while t < stop:
+            roughness = max(0.0, roughness + rng.gauss(0, 2) + (40 if rng.random() < 0.01 else 0))
+            points.append((printer_id, start + int(t * 1e9),
+                           [roughness, 200 + rng.gauss(0, 5)]))
+            t += rng.expovariate(rate)
+    points.sort(key=lambda p: p[1])
+    return points
+
+
+def run_engine(points, windows):
+    engine = RollupEngine(FIELDS, windows=windows)
+    emitted = []
+    for printer_id, timestamp, values in points:
+        emitted.extend(engine.observe(printer_id, values, timestamp))
+    emitted.extend(engine.flush())
+    return {(tags['printer_id'], tags['window'], ts): fields for _, tags, fields, ts in emitted}, engine
+
+
+def compare(actual, expected, base_label, accuracy):
+    """Mismatch descriptions; keys missing on either side count as mismatches."""
+    problems = []
+    for key in sorted(set(actual) | set(expected), key=str):
+        if key not in actual or key not in expected:
+            problems.append(f"{key}: {'missing rollup' if key not in actual else 'no raw points'}")
+            continue
+        got, want = actual[key], expected[key]
+        for name, value in want.items():
+            tolerance = 1e-9
+            if name.endswith('_p95') and key[1] != base_label:
+                tolerance = accuracy
+            if not math.isclose(got[name], value, rel_tol=tolerance, abs_tol=1e-9):
+                problems.append(f"{key} {name}: rollup {got[name]!r} != recomputed {value!r}")
+    return problems
+
+
+def query_influx(hours, measurement):
+    from influxdb_client import InfluxDBClient
+
+    bucket = os.getenv('INFLUX_BUCKET', 'printing_metrics')
+    stop = datetime.now(timezone.utc).replace(microsecond=0)
+    start = stop - timedelta(hours=hours)
+    flux = '''
+    from(bucket: "{bucket}")
+      |> range(start: {start}, stop: {stop})
+      |> filter(fn: (r) => r._measurement == "{measurement}")
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+    with InfluxDBClient.from_env_properties() as client:
+        query = client.query_api()
+        args = dict(bucket=bucket, start=start.isoformat(), stop=stop.isoformat())
+        raw = [r.values for r in query.query_stream(flux.format(measurement='printing_metrics', **args))]
+        rollup = [r.values for r in query.query_stream(flux.format(measurement=measurement, **args))]
+    return raw, rollup, start, stop
+
+
+def influx_check(args, windows):
+    raw, rollup, start, stop = query_influx(args.hours, args.measurement)
+    points = [(r['printer_id'], int(r['_time'].timestamp()) * 10**9 + r['_time'].microsecond * 1000,
+               [r['roughness'], r['temperature']]) for r in raw]
+    expected = recompute(points, FIELDS, windows)
+    labels = {window_label(w): w for w in windows}
+    lo, hi = int(start.timestamp()) * 10**9, int(stop.timestamp()) * 10**9
+
+    def inside(key):
+        return lo <= key[2] and key[2] + labels[key[1]] * 10**9 <= hi
+
+    actual = {}
+    for r in rollup:
+        ts = int(r['_time'].timestamp()) * 10**9
+        fields = {k: v for k, v in r.items() if k.split('_')[0] in FIELDS or k == 'count'}
+        actual[(r['printer_id'], r['window'], ts)] = fields
+    actual = {k: v for k, v in actual.items() if inside(k)}
+    expected = {k: v for k, v in expected.items() if inside(k)}
+    print(f"{len(raw):,} raw points, {len(actual):,} rollup points in range")
+    return actual, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--windows', default='10s,1m,10m')
+    parser.add_argument('--printers', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=1800)
+    parser.add_argument('--rate', type=float, default=20, help='mean Hz per printer')
+    parser.add_argument('--accuracy', type=float, default=0.01, help="sketch relative accuracy")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--influx', action='store_true', help='check stored points in InfluxDB')
+    parser.add_argument('--hours', type=float, default=1)
+    parser.add_argument('--measurement', default=os.getenv('ROLLUP_MEASUREMENT', 'printing_metrics_rollup'))
+    args = parser.parse_args()
+
+    windows = sorted(parse_window(w) for w in args.windows.split(','))
+    if args.influx:
+        actual, expected = influx_check(args, windows)
+    else:
+        points = synthetic_stream(args.printers, args.seconds, args.rate, args.seed)
+        actual, engine = run_engine(points, windows)
+        expected = recompute(points, FIELDS, windows)
+        print(f"{len(points):,} raw points -> {len(actual):,} rollup points "
+              f"({', '.join(f'{k}={v:,}' for k, v in engine.emitted.items())}), "
+              f"{len(points) / max(len(actual), 1):.0f}x fewer")
+
+    problems = compare(actual, expected, window_label(windows[0]), args.accuracy)
+    for problem in problems[:20]:
+        print(problem)
+    if problems:
+        print(f"FAILED: {len(problems)} mismatches in {len(expected):,} windows")
+        sys.exit(1)
+    print(f"OK: {len(expected):,} windows match")
+
+
+if __name__ == '__main__':
+    main()
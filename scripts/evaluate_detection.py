@@ -0,0 +1,210 @@
+"""
+Anomaly detection evaluation: how often and how quickly the processor's
+anomaly scores catch the anomalies the synthesizer injected, and how long
+its printer/control feedback takes, per anomaly type (definitions in
+real-time-engine/evaluation.py).
+
+Two inputs, both read one record at a time so memory stays bounded:
+
+  --log       a stream log recorded from a running system with EVAL_TOPIC
+              set for the processor (real-time-engine/.env.real-time):
+                  cd real-time-engine && python3 stream_log.py record --out ../eval.pslog \\
+                      --topic 'processor/eval/+' --topic 'printer/control/+' --duration 600
+  --replay    a sensor stream log, recorded or made with --synthesize SECONDS
+              from the synthesizer's bulk generator and anomaly rules, replayed
+              through RealTimeProcessor in-process with the MQTT stand-in and
+              fake InfluxDB sink from bench_end_to_end.py. At most --window
+              messages are in flight.
+
+In replay mode, latencies are on the log's clock. Feedback debouncing runs
+on wall-clock time, so feedback lag only matches production at --speed 1.
+
+Usage:
+    python3 scripts/evaluate_detection.py --synthesize 60 --printers 100 --rate 10
+    python3 scripts/evaluate_detection.py --replay sensors.pslog --speed 1
+    python3 scripts/evaluate_detection.py --log eval.pslog --threshold 0.8 --json report.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENGINE_DIR = os.path.join(ROOT, 'real-time-engine')
+sys.path.append(ENGINE_DIR)
+from evaluation import DetectionEvaluator
+from stream_log import read_stream_log
+from bench_end_to_end import FakeMessage, FakeInfluxSink, InProcessBroker, synthesize_log
+
+FEEDBACK_PREFIX = 'printer/control/'
+
+
+def evaluate_log(path, evaluator, eval_topic):
+    """Feed a recorded log of evaluation records and feedback commands to `evaluator`."""
+    prefix = eval_topic + '/'
+    skipped = 0
+    for t_ns, topic, payload in read_stream_log(path):
+        if topic.startswith(FEEDBACK_PREFIX):
+            evaluator.feedback_sent(topic[len(FEEDBACK_PREFIX):], t_ns)
+        elif topic.startswith(prefix):
+            record = json.loads(payload)
+            evaluator.observe(record['printer_id'], record.get('anomaly'), record.get('anomaly_score'), t_ns,
+                              record.get('rejected', False))
+        else:
+            skipped += 1
+    return skipped
+
+
+class LogClock(threading.local):
+    t = 0
+
+
+class Collector:
+    """Broker subscriber that handles the processor's publishes on the publishing thread"""
+    def __init__(self, eval_topic, on_message):
+        self.subscriptions = [eval_topic + '/+', FEEDBACK_PREFIX + '+']
+        self.inbox = self
+        self.on_message = on_message
+
+    def put(self, message):
+        self.on_message(message)
+
+
+def make_replay_processor(broker):
+    from processor import RealTimeProcessor
+    from sensor_message import MessageError, decode
+
+    class ReplayProcessor(RealTimeProcessor):
+        """Carries each message's log time through to its evaluation record"""
+        def __init__(self):
+            self.broker = broker
+            self.handled = 0
+            # Log time of the message being handled, per thread: batch inference publishes from its own
+            self.clock = LogClock()
+            super().__init__()
+
+        def setup_mqtt(self):
+            self.client = self.broker.client()
+            self.client.on_connect = self.on_connect
+            self.client.on_message = self.on_message
+            self.client.connect()
+
+        def setup_influxdb(self):
+            self.write_mode = 'batch'
+            self.influx_writer = FakeInfluxSink()
+            self.spool = self.spool_drainer = None
+
+        def on_message(self, client, userdata, message):
+            try:
+                data = decode(message.payload, self.required_fields)
+            except MessageError:
+                self.errors_total.inc(labels=('decode',))
+                self.clock.t = message.sent_at
+                self.publish_rejected_evaluation(message.payload)
+            else:
+                data['_log_t'] = message.sent_at
+                self.process_message(data)
+            self.handled += 1
+
+        def handle_prediction(self, data, prediction):
+            # Evaluation records and feedback are published from here, on this thread
+            self.clock.t = data['_log_t']
+            super().handle_prediction(data, prediction)
+
+    return ReplayProcessor()
+
+
+def evaluate_replay(path, evaluator, eval_topic, speed, window):
+    """Replay a sensor log through the processor and feed its outputs to `evaluator`."""
+    broker = InProcessBroker()
+    processor = None
+
+    def collect(message):
+        if message.topic.startswith(FEEDBACK_PREFIX):
+            evaluator.feedback_sent(message.topic[len(FEEDBACK_PREFIX):], processor.clock.t)
+        else:
+            record = json.loads(message.payload)
+            evaluator.observe(record['printer_id'], record.get('anomaly'), record.get('anomaly_score'),
+                              processor.clock.t, record.get('rejected', False))
+
+    broker.clients.append(Collector(eval_topic, collect))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        processor = make_replay_processor(broker)
+        processor.model_ready.wait()
+        processor.client.loop_start()
+        inbox = processor.client.inbox
+        start = time.perf_counter()
+        sent = 0
+        for t_ns, topic, payload in read_stream_log(path):
+            if speed:
+                delay = start + t_ns / 1e9 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            while sent - processor.handled >= window:
+                time.sleep(0.0005)
+            # Straight into the processor's inbox, stamped with the log time
+            inbox.put(FakeMessage(topic, payload, t_ns))
+            sent += 1
+        while processor.handled < sent:
+            time.sleep(0.001)
+        # Drains the inference queue in batch mode
+        processor.shutdown()
+    return sent, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--log', help='recorded log of evaluation records and feedback commands')
+    source.add_argument('--replay', help='sensor stream log to replay through the processor')
+    source.add_argument('--synthesize', type=float, metavar='SECONDS',
+                        help='synthesize a sensor log of this many seconds and replay it')
+    parser.add_argument('--printers', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10, help='Hz per printer when synthesizing')
+    parser.add_argument('--seed', type=int, default=42, help='synthesizer seed')
+    parser.add_argument('--speed', type=float, default=0, help='replay speed factor (0 = max)')
+    parser.add_argument('--window', type=int, default=1000, help='most messages in flight while replaying')
+    parser.add_argument('--model', default=os.path.join(ENGINE_DIR, 'models', 'model.pkl'))
+    parser.add_argument('--inference', choices=['single', 'batch'], default='single')
+    parser.add_argument('--eval-topic', default='processor/eval')
+    parser.add_argument('--threshold', type=float, default=1.0, help='anomaly score that counts as an alarm')
+    parser.add_argument('--grace', type=int, default=5,
+                        help='messages after an episode in which an alarm still detects it')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    args = parser.parse_args()
+
+    evaluator = DetectionEvaluator(threshold=args.threshold, grace=args.grace)
+    if args.log:
+        skipped = evaluate_log(args.log, evaluator, args.eval_topic)
+        if skipped:
+            print(f"ignored {skipped:,} messages on other topics")
+    else:
+        path = args.replay
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(), 'synthetic.pslog')
+            count = synthesize_log(path, args.synthesize, args.printers, args.rate, seed=args.seed)
+            print(f"Synthesized {count:,} messages to {path}")
+        os.environ['MODEL_PATH'] = args.model
+        os.environ['METRICS_PORT'] = '0'
+        os.environ['INFERENCE_MODE'] = args.inference
+        os.environ['EVAL_TOPIC'] = args.eval_topic
+        os.environ['MQTT_SHARED_GROUP'] = ''
+        sent, elapsed = evaluate_replay(path, evaluator, args.eval_topic, args.speed, args.window)
+        print(f"replayed {sent:,} messages at speed {args.speed or 'max'} in {elapsed:.2f}s "
+              f"(inference={args.inference})")
+        if sent > evaluator.messages:
+            # Payloads without even a printer id
+            print(f"{sent - evaluator.messages:,} messages produced no evaluation record")
+
+    print(evaluator.format_report())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(evaluator.report(), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Vectorized anomaly rules for bulk generation.
+
+AnomalyEngine compiles the rules from anomaly_rules.py once: field names
+become column indices into the (printers x numeric fields) tick array, and
+every stateful rule gets per-printer arrays for the samples it has left,
+the drift direction and the values a stuck sensor holds. A tick then costs
+a few array operations per rule, whatever the fleet size, and never loops
+over printers. Each rule draws from its own seeded NumPy generator, so a
+seed reproduces the scenario.
+"""
+import numpy as np
+
+
+class CompiledRule:
+    """A rule bound to column indices, with its random stream and per-printer state"""
+    __slots__ = ('kind', 'label', 'cols', 'probability', 'magnitude', 'step', 'duration',
+                 'factors', 'rng', 'remaining', 'sign', 'held')
+
+    def __init__(self, rule, label, fields, col, printer_count, seed):
+        self.kind = rule.kind
+        self.label = label
+        self.cols = np.array([col[f] for f in fields], dtype=np.intp)
+        self.probability = rule.probability
+        self.magnitude = rule.magnitude
+        self.step = rule.step
+        self.duration = rule.duration
+        self.factors = np.array([rule.effects[f] for f in fields]) if rule.kind == 'correlated' else None
+        self.rng = np.random.default_rng(rule.stream_seed(seed))
+        self.remaining = np.zeros(printer_count, dtype=np.int32) if rule.kind != 'spike' else None
+        self.sign = np.zeros(printer_count, dtype=np.int8) if rule.kind == 'drift' else None
+        self.held = np.full((printer_count, len(fields)), np.nan) if rule.kind == 'stuck' else None
+
+
+class AnomalyEngine:
+    """Anomaly rules applied to a whole tick of the fleet at once"""
+    def __init__(self, rules, numeric_fields, printer_count, seed=None):
+        self.printer_count = printer_count
+        col = {name: j for j, name in enumerate(numeric_fields)}
+        # Label 0 is "no anomaly"; rules touching none of the numeric fields are dropped
+        self.label_names = [None]
+        self.rules = []
+        for rule in rules:
+            fields = [f for f in rule.fields if f in col]
+            if fields:
+                self.rules.append(CompiledRule(rule, len(self.label_names), fields, col, printer_count, seed))
+                self.label_names.append(rule.name)
+        if len(self.label_names) > 256:
+            raise ValueError("At most 255 anomaly rules are supported")
+        self.has_dropout = any(rule.kind == 'dropout' for rule in self.rules)
+
+    def apply(self, values, labels):
+        """Apply every rule to one tick in place; `labels` (uint8) gets the last active rule."""
+        n = self.printer_count
+        for rule in self.rules:
+            hit = rule.rng.random(n) < rule.probability
+            if rule.kind == 'spike':
+                rows = np.flatnonzero(hit)
+                if rows.size:
+                    values[rows[:, None], rule.cols] *= rule.magnitude
+                    labels[rows] = rule.label
+                continue
+
+            remaining = rule.remaining
+            rows = np.flatnonzero(hit & (remaining == 0))
+            if rows.size:
+                remaining[rows] = rule.rng.integers(rule.duration[0], rule.duration[1] + 1, rows.size)
+                if rule.kind == 'drift':
+                    rule.sign[rows] = rule.rng.choice(np.array([-1, 1], dtype=np.int8), rows.size)
+                elif rule.kind == 'stuck':
+                    rule.held[rows] = values[rows[:, None], rule.cols]
+            active = np.flatnonzero(remaining)
+            if not active.size:
+                continue
+            cells = (active[:, None], rule.cols)
+            if rule.kind == 'drift':
+                values[cells] *= (1 + rule.step * rule.sign[active])[:, None]
+            elif rule.kind == 'stuck':
+                values[cells] = rule.held[active]
+            elif rule.kind == 'dropout':
+                values[cells] = np.nan
+            else:
+                values[cells] *= rule.factors
+            remaining[active] -= 1
+            labels[active] = rule.label
+        return labels
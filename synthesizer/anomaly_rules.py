@@ -0,0 +1,173 @@
+"""
+Anomaly rules for the synthesizer, loaded from anomaly_rules.json:
+
+    {"rules": [{"name": "spike_nozzle_temperature", "type": "spike", ...}, ...]}
+
+Rule types, applied per sample and printer to the listed `fields`:
+
+    spike       with `probability`, multiply by `magnitude` for one sample
+    drift       start with `probability`, then multiply by 1 + `step` * (+1 or
+                -1, drawn per drift) for `duration` = [min, max] samples
+    stuck       start with `probability`, then repeat the values the fields
+                had at the onset for `duration` samples
+    dropout     start with `probability`, then leave the fields out (JSON
+                null, NaN in the binary format) for `duration` samples
+    correlated  start with `probability`, then multiply every field in
+                `effects` by its factor for `duration` samples (a fault that
+                moves several readings together, such as a clogged nozzle)
+
+Rules run in file order on the jittered base values, and a message is
+labelled (`anomaly`) with the name of the last rule active on it.
+`"enabled": false` switches a rule off. Fields a dataset does not have are
+ignored.
+
+Every rule draws from its own random stream, seeded from the scenario seed
+and the rule's name. A seed replays a scenario exactly, and adding or
+removing one rule leaves the other rules' streams unchanged. The file is
+read and validated once. AnomalyInjector applies the rules to one message
+at a time (per-printer mode, standard library only).
+anomaly_engine.AnomalyEngine applies them with NumPy to a whole tick of
+the fleet (bulk mode).
+"""
+import json
+import math
+import os
+import random
+import zlib
+from array import array
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'anomaly_rules.json')
+RULE_TYPES = ('spike', 'drift', 'stuck', 'dropout', 'correlated')
+MAX_DURATION = 65535
+
+
+class AnomalyRule:
+    """One validated entry of the rules file"""
+    def __init__(self, spec):
+        self.kind = spec.get('type')
+        if self.kind not in RULE_TYPES:
+            raise ValueError(f"Unknown anomaly rule type {self.kind!r}, expected one of {', '.join(RULE_TYPES)}")
+        if self.kind == 'correlated':
+            self.effects = {field: float(factor) for field, factor in spec.get('effects', {}).items()}
+            self.fields = list(self.effects)
+        else:
+            fields = spec.get('fields', spec.get('field', ()))
+            self.fields = [fields] if isinstance(fields, str) else list(fields)
+            self.effects = {}
+        self.name = spec.get('name') or f"{self.kind}_{'_'.join(self.fields)}"
+        if not self.fields:
+            raise ValueError(f"Anomaly rule {self.name!r} affects no fields")
+        self.probability = float(spec.get('probability', 0.0))
+        self.magnitude = float(spec.get('magnitude', 3.0))
+        self.step = float(spec.get('step', 0.02))
+        low, high = spec.get('duration', (1, 1))
+        self.duration = (int(low), int(high))
+        self.enabled = bool(spec.get('enabled', True))
+        if not 0.0 <= self.probability <= 1.0:
+            raise ValueError(f"Anomaly rule {self.name!r}: probability must be within [0, 1]")
+        if not 1 <= self.duration[0] <= self.duration[1] <= MAX_DURATION:
+            raise ValueError(f"Anomaly rule {self.name!r}: duration must be [min, max] "
+                             f"with 1 <= min <= max <= {MAX_DURATION}")
+
+    def stream_seed(self, seed):
+        """Seed of this rule's random stream for scenario `seed` (None = unseeded)"""
+        if seed is None:
+            return None
+        return (int(seed) << 32) | zlib.crc32(self.name.encode('utf-8'))
+
+
+def load_rules(path=DEFAULT_RULES_PATH, spike_probability=None):
+    """Enabled rules from `path`; `spike_probability` overrides the probability of spike rules."""
+    with open(path) as f:
+        specs = json.load(f).get('rules', [])
+    rules = []
+    for spec in specs:
+        rule = AnomalyRule(spec)
+        if not rule.enabled:
+            continue
+        if spike_probability is not None and rule.kind == 'spike':
+            rule.probability = float(spike_probability)
+        rules.append(rule)
+    names = [rule.name for rule in rules]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate anomaly rule names: {', '.join(duplicates)}")
+    return rules
+
+
+class AnomalyInjector:
+    """Applies the rules to one printer's message at a time; state in flat arrays per rule"""
+    def __init__(self, rules, seed=None):
+        self.rules = rules
+        self.streams = [random.Random(rule.stream_seed(seed)) for rule in rules]
+        self.size = 0
+        # Per rule: samples left while active, drift direction, stuck values (len(fields) per printer)
+        self.remaining = [array('H') for _ in rules]
+        self.sign = [array('b') for _ in rules]
+        self.held = [array('d') for _ in rules]
+
+    def ensure(self, printers):
+        if printers <= self.size:
+            return
+        grow = printers - self.size
+        for r, rule in enumerate(self.rules):
+            if rule.kind == 'spike':
+                continue
+            self.remaining[r].extend(array('H', [0]) * grow)
+            if rule.kind == 'drift':
+                self.sign[r].extend(array('b', [0]) * grow)
+            elif rule.kind == 'stuck':
+                self.held[r].extend(array('d', [math.nan]) * (grow * len(rule.fields)))
+        self.size = printers
+
+    def apply(self, msg, i):
+        """Apply every rule to `msg`, the next sample of printer slot `i`."""
+        label = None
+        for r, rule in enumerate(self.rules):
+            rng = self.streams[r]
+            kind = rule.kind
+            if kind == 'spike':
+                if rng.random() < rule.probability:
+                    for field in rule.fields:
+                        if msg.get(field) is not None:
+                            msg[field] *= rule.magnitude
+                    label = rule.name
+                continue
+
+            remaining = self.remaining[r]
+            if not remaining[i]:
+                if rng.random() >= rule.probability:
+                    continue
+                remaining[i] = rng.randint(*rule.duration)
+                if kind == 'drift':
+                    self.sign[r][i] = rng.choice((-1, 1))
+                elif kind == 'stuck':
+                    held, base = self.held[r], i * len(rule.fields)
+                    for k, field in enumerate(rule.fields):
+                        value = msg.get(field)
+                        held[base + k] = math.nan if value is None else value
+            remaining[i] -= 1
+
+            if kind == 'drift':
+                factor = 1 + rule.step * self.sign[r][i]
+                for field in rule.fields:
+                    if msg.get(field) is not None:
+                        msg[field] *= factor
+            elif kind == 'stuck':
+                held, base = self.held[r], i * len(rule.fields)
+                for k, field in enumerate(rule.fields):
+                    if field in msg:
+                        value = held[base + k]
+                        msg[field] = None if value != value else value
+            elif kind == 'dropout':
+                for field in rule.fields:
+                    if field in msg:
+                        msg[field] = None
+            else:
+                for field, factor in rule.effects.items():
+                    if msg.get(field) is not None:
+                        msg[field] *= factor
+            label = rule.name
+        if label is not None:
+            msg['anomaly'] = label
+        return msg
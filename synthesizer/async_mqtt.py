@@ -0,0 +1,72 @@
+"""
+Run a paho MQTT client on the asyncio event loop instead of a network thread.
+
+The client's socket is registered with the loop's reader/writer callbacks,
+so `publish()` from a coroutine only appends to paho's outgoing buffer and
+the event loop flushes it when the socket is writable. Keepalives and
+reconnects are handled by a small housekeeping task.
+"""
+import socket
+import asyncio
+import paho.mqtt.client as mqtt
+
+
+class AsyncioMqtt:
+    def __init__(self, client, reconnect_delay=1.0):
+        self.client = client
+        self.reconnect_delay = reconnect_delay
+        self.loop = asyncio.get_running_loop()
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+        # The client may already be connected (connect() ran before the loop existed)
+        sock = client.socket()
+        if sock is not None:
+            self.on_socket_open(client, None, sock)
+            if client.want_write():
+                self.on_socket_register_write(client, None, sock)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048 * 1024)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        while True:
+            if self.client.loop_misc() != mqtt.MQTT_ERR_SUCCESS:
+                try:
+                    self.client.reconnect()
+                except OSError as e:
+                    print(f"MQTT reconnect failed: {e}")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def drain(self, timeout=5.0):
+        """Wait until paho's outgoing buffer is empty (or the timeout expires)."""
+        deadline = self.loop.time() + timeout
+        while self.client.want_write() and self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+
+    def stop(self):
+        if self.misc is not None:
+            self.misc.cancel()
+        sock = self.client.socket()
+        if sock is not None:
+            self.on_socket_close(self.client, None, sock)
+        # Detach so a later disconnect() does not touch a closed event loop
+        self.client.on_socket_open = None
+        self.client.on_socket_close = None
+        self.client.on_socket_register_write = None
+        self.client.on_socket_unregister_write = None
@@ -0,0 +1,131 @@
+"""
+Vectorized bulk message generation for load testing.
+
+All printer state lives in NumPy arrays indexed by printer number, so a
+whole tick for thousands of printers is produced with a handful of array
+operations: jitter, the anomaly rules from anomaly_rules.json (compiled by
+anomaly_engine.AnomalyEngine) and feedback overrides are all applied to
+whole columns. Payloads are encoded from a per-printer template that
+already contains the printer's constant fields (id, material, infill
+pattern), so only the numeric values, anomaly label, timestamp and cycle
+count are formatted per message; fields a dropout rule removed are written
+as null. Messages carry the same fields, in the same order, as
+DataSynthesizer.generate_message.
+encode_binary produces the struct-packed format from wire_format.py the
+same way: one packed NumPy record array per chunk plus a precomputed
+per-printer suffix for the text fields.
+"""
+import json
+import numpy as np
+from anomaly_engine import AnomalyEngine
+from anomaly_rules import load_rules
+from wire_format import NUMERIC_FIELDS, BINARY_MAGIC, BINARY_BODY, text_field
+
+
+class BulkGenerator:
+    def __init__(self, base_data, printer_count, seed=None, rules=None, anomaly_probability=None):
+        """`rules` from anomaly_rules.load_rules (default: anomaly_rules.json, with
+        `anomaly_probability` overriding the spike rules' probability)."""
+        self.rng = np.random.default_rng(seed)
+        self.printer_count = printer_count
+
+        columns = list(base_data[0].keys())
+        self.numeric_fields = [k for k in columns
+                               if isinstance(base_data[0][k], (int, float)) and not isinstance(base_data[0][k], bool)]
+        col = {k: i for i, k in enumerate(self.numeric_fields)}
+        self.speed_col = col.get('print_speed')
+        if rules is None:
+            rules = load_rules(spike_probability=anomaly_probability)
+        self.anomalies = AnomalyEngine(rules, self.numeric_fields, printer_count, seed)
+        names = self.anomalies.label_names
+        self.labels = [''] + [f', "anomaly": {json.dumps(name)}' for name in names[1:]]
+
+        # Struct-of-arrays printer state
+        rows = self.rng.integers(len(base_data), size=printer_count)
+        table = np.array([[float(r[k]) for k in self.numeric_fields] for r in base_data], dtype=np.float64)
+        self.base = table[rows]
+        self.cycle_count = np.zeros(printer_count, dtype=np.int64)
+        self.override = np.full((printer_count, len(self.numeric_fields)), np.nan)
+        self.has_override = False
+
+        self.printer_ids = [f'printer_{n}' for n in range(1, printer_count + 1)]
+        self.index = {pid: i for i, pid in enumerate(self.printer_ids)}
+        self.topics = [f'printing/{n}/sensor' for n in range(1, printer_count + 1)]
+        self.templates = [self._template(base_data[r], pid, columns)
+                          for r, pid in zip(rows.tolist(), self.printer_ids)]
+
+        # Binary encoding: schema column -> index into `values` (-1 = absent)
+        self.binary_columns = [col.get(f, -1) for f in NUMERIC_FIELDS]
+        self.binary_dtype = np.dtype([('magic', 'u1'), ('cycle', '<u4'), ('timestamp', '<f8'),
+                                      ('values', '<f4', (len(NUMERIC_FIELDS),))])
+        assert self.binary_dtype.itemsize == BINARY_BODY.size
+        self.binary_suffixes = [text_field(pid) + text_field(base_data[r].get('infill_pattern'))
+                                + text_field(base_data[r].get('material'))
+                                for r, pid in zip(rows.tolist(), self.printer_ids)]
+        self.binary_labels = [text_field(name) for name in names]
+
+    def _template(self, record, printer_id, columns):
+        parts = []
+        for key in columns:
+            if key in self.numeric_fields:
+                parts.append(f'{json.dumps(key)}: %.6g')
+            else:
+                parts.append(f'{json.dumps(key)}: {json.dumps(record[key])}'.replace('%', '%%'))
+        return ('{' + ', '.join(parts) + '%s, "timestamp": "%s", "printer_id": '
+                + json.dumps(printer_id).replace('%', '%%') + ', "cycle_count": %d}')
+
+    def tick(self):
+        """Advance every printer by one sample. Returns (values, labels) arrays."""
+        n = self.printer_count
+        values = self.base * self.rng.uniform(0.95, 1.05, self.base.shape)
+        np.round(values, 2, out=values)
+        labels = np.zeros(n, dtype=np.uint8)
+        self.anomalies.apply(values, labels)
+
+        if self.has_override:
+            overridden = ~np.isnan(self.override)
+            values[overridden] = self.override[overridden]
+
+        self.cycle_count += 1
+        return values, labels
+
+    def encode(self, values, labels, timestamp, start=0, stop=None):
+        """Encode printers [start, stop) of one tick as JSON payload strings, in printer order."""
+        stop = self.printer_count if stop is None else stop
+        label_text = self.labels
+        cycles = (self.cycle_count[start:stop] - 1).tolist()
+        payloads = [template % (*row, label_text[label], timestamp, cycle)
+                    for template, row, label, cycle
+                    in zip(self.templates[start:stop], values[start:stop].tolist(),
+                           labels[start:stop].tolist(), cycles)]
+        if self.anomalies.has_dropout:
+            # %.6g writes a dropped field as nan; every numeric field is followed by a comma
+            for i in np.flatnonzero(np.isnan(values[start:stop]).any(axis=1)).tolist():
+                payloads[i] = payloads[i].replace(': nan,', ': null,')
+        return payloads
+
+    def encode_binary(self, values, labels, timestamp, start=0, stop=None):
+        """Encode printers [start, stop) in the binary format; `timestamp` is epoch seconds."""
+        stop = self.printer_count if stop is None else stop
+        body = np.empty(stop - start, dtype=self.binary_dtype)
+        body['magic'] = BINARY_MAGIC
+        body['cycle'] = self.cycle_count[start:stop] - 1
+        body['timestamp'] = timestamp
+        packed = body['values']
+        for j, c in enumerate(self.binary_columns):
+            packed[:, j] = values[start:stop, c] if c >= 0 else np.nan
+        raw = body.tobytes()
+        size = self.binary_dtype.itemsize
+        label_bytes = self.binary_labels
+        return [raw[i * size:(i + 1) * size] + suffix + label_bytes[label]
+                for i, (suffix, label) in enumerate(zip(self.binary_suffixes[start:stop],
+                                                        labels[start:stop].tolist()))]
+
+    def apply_feedback(self, feedback):
+        """Apply a printer/control adjustment in O(1)."""
+        i = self.index.get(feedback.get('printer_id'))
+        if i is None or self.speed_col is None or 'new_speed' not in feedback:
+            return False
+        self.override[i, self.speed_col] = float(feedback['new_speed'])
+        self.has_override = True
+        return True
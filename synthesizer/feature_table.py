@@ -0,0 +1,60 @@
+"""
+Read the synthesizer's base dataset without pandas: a table from the
+project's feature store (utils/feature_store.py) with NumPy and json only,
+or the CSV it falls back to with the csv module.
+
+The store keeps one .npy file per column and segment under
+<root>/<table>/<segment>/ and a manifest with each column's dtype and, for
+categorical columns, the category list the stored integer codes index.
+"""
+import os
+import csv
+import json
+import math
+
+
+def read_feature_table(root, table='historical_prints'):
+    """Rows of `table` as dicts with decoded categories, or None if the store has no such table."""
+    manifest_path = os.path.join(root, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        spec = json.load(f).get('tables', {}).get(table)
+    if not spec:
+        return None
+
+    import numpy as np
+    columns = {}
+    for name in spec['order']:
+        parts = []
+        for segment in spec['segments']:
+            path = os.path.join(root, table, segment['name'], f'{name}.npy')
+            missing = -1 if 'categories' in spec['columns'][name] else np.nan
+            parts.append(np.load(path, mmap_mode='r') if os.path.exists(path)
+                         else np.full(segment['rows'], missing))
+        values = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        categories = spec['columns'][name].get('categories')
+        if categories is not None:
+            values = np.array(categories + [None], dtype=object)[values]
+        columns[name] = values.tolist()
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def _number(kind, text):
+    return math.nan if kind is float and text == '' else kind(text)
+
+
+def read_csv_records(path):
+    """Rows of a CSV as dicts; like pandas.read_csv, a column is int if every value is, else float, else str."""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    for name in rows[0] if rows else ():
+        for kind in (int, float):
+            try:
+                values = [_number(kind, row[name]) for row in rows]
+            except ValueError:
+                continue
+            for row, value in zip(rows, values):
+                row[name] = value
+            break
+    return rows
@@ -0,0 +1,73 @@
+"""
+Compact per-printer state for the per-printer generation mode.
+
+DataSynthesizer keeps one slot per printer number in flat typed arrays
+(struct-of-arrays, stdlib `array`, so the per-printer mode still starts
+without NumPy):
+
+    base_row         index of the printer's base record in the dataset
+    cycle_count      messages generated so far
+    speed_override   last print_speed set by feedback, NaN when none
+
+Anomaly state (running drifts, stuck values) is kept the same way, per
+rule, by anomaly_rules.AnomalyInjector.
+
+Printer `printer_<n>` lives in slot n - 1, so looking a printer up and
+applying feedback are O(1) and allocate nothing. Base records are shared
+with the dataset instead of copied per printer. The arrays grow by
+doubling when a higher printer number shows up.
+"""
+import math
+import random
+from array import array
+
+NO_OVERRIDE = math.nan
+
+
+def printer_slot(printer_id):
+    """Slot of 'printer_<n>' (n >= 1), or None for any other id."""
+    _, _, number = str(printer_id).rpartition('_')
+    if not number.isdigit() or int(number) < 1:
+        return None
+    return int(number) - 1
+
+
+class FleetState:
+    def __init__(self, base_count, printers=0):
+        self.base_count = base_count
+        self.size = 0
+        self.base_row = array('I')
+        self.cycle_count = array('Q')
+        self.speed_override = array('d')
+        self.ensure(printers)
+
+    def ensure(self, printers):
+        """Make room for printers 1..`printers`; new printers get a random base record."""
+        if printers <= self.size:
+            return
+        grow = max(printers, 2 * self.size) - self.size
+        self.base_row.extend(random.randrange(self.base_count) for _ in range(grow))
+        self.cycle_count.extend(array('Q', [0]) * grow)
+        self.speed_override.extend(array('d', [NO_OVERRIDE]) * grow)
+        self.size += grow
+
+    def slot(self, printer_id):
+        """Slot for `printer_id`, growing the arrays for a new printer number."""
+        i = printer_slot(printer_id)
+        if i is None:
+            raise ValueError(f"Printer id {printer_id!r} is not of the form printer_<n>")
+        if i >= self.size:
+            self.ensure(i + 1)
+        return i
+
+    def apply_feedback(self, feedback):
+        """Record a printer/control adjustment in O(1); False if it names no known printer."""
+        i = printer_slot(feedback.get('printer_id'))
+        if i is None or i >= self.size or 'new_speed' not in feedback:
+            return False
+        self.speed_override[i] = float(feedback['new_speed'])
+        return True
+
+    def nbytes(self):
+        """Bytes held by the state arrays (capacity, not just printers seen)"""
+        return sum(a.itemsize * len(a) for a in (self.base_row, self.cycle_count, self.speed_override))
@@ -0,0 +1,105 @@
+"""
+Absolute-deadline tick scheduler for the synthesizer.
+
+Each tick (one sample per printer) is split into evenly spaced slots so
+publishes are spread across the period instead of bursting at its start.
+Slot deadlines are computed from the start time (start + n * slot_interval),
+so time spent generating and publishing never accumulates as drift.
+
+When the loop falls behind, the policy decides what happens:
+    catch_up  run late slots back to back until on schedule again; if the
+              lag exceeds max_lag the schedule is re-based (counted)
+    skip      drop slots whose deadline has already passed by a whole slot
+
+A late slot still yields to the event loop once, so socket reads/writes
+and the MQTT keepalive keep running while the loop catches up.
+"""
+import asyncio
+import collections
+
+POLICIES = ('catch_up', 'skip')
+
+
+class TickScheduler:
+    def __init__(self, rate_hz, slots=1, policy='catch_up', max_lag=1.0, window=10000):
+        if policy not in POLICIES:
+            raise ValueError(f"Unsupported scheduler policy: {policy}")
+        self.rate_hz = rate_hz
+        self.slots = max(1, slots)
+        self.period = 1.0 / rate_hz
+        self.slot_interval = self.period / self.slots
+        self.policy = policy
+        self.max_lag = max_lag
+        self.start = None
+        self.slot = 0
+        self.completed = 0
+        self.skipped = 0
+        self.late = 0
+        self.rebased = 0
+        self.jitter = collections.deque(maxlen=window)
+        self.max_jitter = 0.0
+
+    async def next_slot(self):
+        """Sleep until the next slot deadline. Returns (tick, slot_in_tick)."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.start is None:
+            self.start = now
+        deadline = self.start + self.slot * self.slot_interval
+
+        if deadline > now:
+            await asyncio.sleep(deadline - now)
+            now = loop.time()
+        else:
+            lag = now - deadline
+            if self.policy == 'skip' and lag >= self.slot_interval:
+                missed = int(lag // self.slot_interval)
+                self.slot += missed
+                self.skipped += missed
+                deadline += missed * self.slot_interval
+            elif self.policy == 'catch_up' and lag > self.max_lag:
+                self.start = now - self.slot * self.slot_interval
+                self.rebased += 1
+                deadline = now
+            if now - deadline > self.slot_interval:
+                self.late += 1
+            # Still yield, so a loop that is behind does not starve the MQTT I/O callbacks
+            await asyncio.sleep(0)
+
+        jitter = now - deadline
+        self.jitter.append(jitter)
+        self.max_jitter = max(self.max_jitter, jitter)
+        slot = self.slot
+        self.slot += 1
+        self.completed += 1
+        return divmod(slot, self.slots)
+
+    def stats(self, now=None):
+        """Achieved-vs-target rate and jitter statistics since the first slot."""
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        elapsed = max(now - self.start, 1e-9) if self.start is not None else 0.0
+        ordered = sorted(self.jitter)
+
+        def pct(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+        return {
+            'policy': self.policy,
+            'target_tick_hz': self.rate_hz,
+            'achieved_tick_hz': self.completed / self.slots / elapsed if elapsed else 0.0,
+            'slots_completed': self.completed,
+            'slots_skipped': self.skipped,
+            'slots_late': self.late,
+            'rebased': self.rebased,
+            'jitter_p50_ms': pct(0.50) * 1000,
+            'jitter_p99_ms': pct(0.99) * 1000,
+            'jitter_max_ms': self.max_jitter * 1000,
+        }
+
+    def format_stats(self, now=None):
+        s = self.stats(now)
+        return (f"rate {s['achieved_tick_hz']:.2f}/{s['target_tick_hz']:g} Hz, "
+                f"jitter p50={s['jitter_p50_ms']:.2f}ms p99={s['jitter_p99_ms']:.2f}ms "
+                f"max={s['jitter_max_ms']:.2f}ms, late={s['slots_late']} "
+                f"skipped={s['slots_skipped']} rebased={s['rebased']} ({s['policy']})")
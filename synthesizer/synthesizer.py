@@ -1,63 +1,62 @@
 import os
-import json
-import random
 import time
+import random
 import asyncio
+import argparse
 import paho.mqtt.client as mqtt
 from datetime import datetime
-import numpy as np
-import pandas as pd
 from dotenv import load_dotenv
+from anomaly_rules import DEFAULT_RULES_PATH, AnomalyInjector, load_rules
+from feature_table import read_feature_table, read_csv_records
+from fleet_state import FleetState
+from scheduler import TickScheduler
+from async_mqtt import AsyncioMqtt
+from wire_format import CAPABILITIES_TOPIC, accepts_binary, dumps, loads, encode_binary
 
 # Load environment
 load_dotenv('.env')  # Load the main .env
 load_dotenv('.env.synthesizer')  # Load the synthesizer-specific .env
 
-class AnomalyGenerator:
-    @staticmethod
-    def inject_spike(data, field, magnitude=3):
-        if random.random() < float(os.getenv('ANOMALY_PROBABILITY', 0.05)):
-            data[field] *= magnitude
-            data['anomaly'] = f'spike_{field}'
-        return data
-
-    @staticmethod
-    def inject_drift(data, field, printer_id, state):
-        key = f"{printer_id}_{field}"
-        if key not in state['drifts']:
-            if random.random() < 0.03:  # 3% chance to start drift
-                state['drifts'][key] = {
-                    'direction': random.choice([-1, 1]),
-                    'duration': random.randint(10, 30)
-                }
-        
-        if key in state['drifts']:
-            drift = state['drifts'][key]
-            data[field] *= 1 + (0.02 * drift['direction'])
-            drift['duration'] -= 1
-            if drift['duration'] <= 0:
-                del state['drifts'][key]
-            data['anomaly'] = f'drift_{field}'
-        return data
-
 class DataSynthesizer:
-    def __init__(self):
+    def __init__(self, connect=True, seed=None):
+        # A seed makes the jitter, base record choice and every anomaly rule reproducible
+        if seed is not None:
+            random.seed(seed)
         self.base_data = self.load_dataset()
-        self.state = {
-            'printers': {},
-            'drifts': {},
-            'feedback_rules': {
-                'roughness': lambda x: x['print_speed'] * max(0.5, float(os.getenv('ADJUSTMENT_FACTOR', 0.8)))
-            }
+        self.bulk = None
+        # Per-printer state, one array slot per printer number
+        self.fleet = FleetState(len(self.base_data))
+        probability = os.getenv('ANOMALY_PROBABILITY')
+        self.anomaly_rules = load_rules(os.getenv('ANOMALY_RULES') or DEFAULT_RULES_PATH,
+                                        spike_probability=float(probability) if probability else None)
+        self.anomalies = AnomalyInjector(self.anomaly_rules, seed)
+        self.feedback_rules = {
+            'roughness': lambda x: x['print_speed'] * max(0.5, float(os.getenv('ADJUSTMENT_FACTOR', 0.8)))
         }
+        # json, binary, or auto: JSON until the processor advertises binary support.
+        # Binary is opt-in: Telegraf's MQTT input parses printing/# as JSON
+        self.payload_format = os.getenv('PAYLOAD_FORMAT', 'json').lower()
+        self.negotiate = self.payload_format == 'auto'
+        if self.negotiate:
+            self.payload_format = 'json'
         self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-        self.setup_mqtt()
+        if connect:
+            self.setup_mqtt()
 
     def load_dataset(self):
+        # Prefer the columnar feature store (built with utils/feature_store.py); fall back to the CSV
+        store_path = os.getenv('FEATURE_STORE_PATH', '/app/data/feature_store')
         try:
-            df = pd.read_csv('/app/data/data.csv')
-            print(f"Loaded dataset with {len(df)} rows")
-            return df.to_dict('records')
+            records = read_feature_table(store_path)
+            if records:
+                print(f"Loaded dataset with {len(records)} rows from feature store {store_path}")
+                return records
+        except Exception as e:
+            print(f"Error reading feature store: {e}")
+        try:
+            records = read_csv_records(os.getenv('DATASET_PATH', '/app/data/data.csv'))
+            print(f"Loaded dataset with {len(records)} rows")
+            return records
         except Exception as e:
             print(f"Error loading dataset: {e}")
             # Fallback to minimal data
@@ -75,97 +74,181 @@ class DataSynthesizer:
             self.client.on_message = self.on_feedback
             self.client.subscribe('printer/control/#')
 
+        if self.negotiate:
+            self.client.message_callback_add(CAPABILITIES_TOPIC, self.on_capabilities)
+            self.client.subscribe(CAPABILITIES_TOPIC)
+
+    def on_capabilities(self, client, userdata, message):
+        payload_format = 'binary' if accepts_binary(message.payload) else 'json'
+        if payload_format != self.payload_format:
+            print(f"Processor accepts {payload_format} payloads, switching format")
+            self.payload_format = payload_format
+
+    def encode_message(self, msg):
+        if self.payload_format == 'binary':
+            return encode_binary(msg, time.time())
+        return dumps(msg)
+
     def on_feedback(self, client, userdata, message):
         try:
-            feedback = json.loads(message.payload.decode())
-            printer_id = feedback['printer_id']
-            self.state['printers'][printer_id] = feedback
-            print(f"Applied feedback to {printer_id}: {feedback}")
+            feedback = loads(message.payload)
+            if self.bulk is not None:
+                self.bulk.apply_feedback(feedback)
+                return
+            if self.fleet.apply_feedback(feedback):
+                print(f"Applied feedback to {feedback['printer_id']}: {feedback}")
         except Exception as e:
             print(f"Feedback error: {e}")
 
     def generate_message(self, printer_id):
-        # Initialize printer state if new
-        if printer_id not in self.state['printers']:
-            self.state['printers'][printer_id] = {
-                'base_params': random.choice(self.base_data),
-                'last_adjustment': None
-            }
-
-        # Get base parameters
-        printer_state = self.state['printers'][printer_id]
-        msg = printer_state['base_params'].copy()
-        
-        # Convert to dict if pandas Series
-        if hasattr(msg, 'to_dict'):
-            msg = msg.to_dict()
-
-        # Add normal variation
-        for key in msg:
-            if isinstance(msg[key], (int, float)):
-                msg[key] *= random.uniform(0.95, 1.05)
-                msg[key] = round(msg[key], 2)
+        fleet = self.fleet
+        i = fleet.slot(printer_id)
+        if i >= self.anomalies.size:
+            self.anomalies.ensure(fleet.size)
+
+        # Base parameters with normal variation (the base record itself is shared)
+        msg = {}
+        for key, value in self.base_data[fleet.base_row[i]].items():
+            if isinstance(value, (int, float)):
+                value = round(value * random.uniform(0.95, 1.05), 2)
+            msg[key] = value
 
         # Inject anomalies
-        msg = AnomalyGenerator.inject_spike(msg, 'nozzle_temperature')
-        msg = AnomalyGenerator.inject_drift(msg, 'bed_temperature', printer_id, self.state)
+        self.anomalies.apply(msg, i)
 
-        # Apply feedback if any
-        if 'last_adjustment' in printer_state and printer_state['last_adjustment']:
-            for param, value in printer_state['last_adjustment'].items():
-                if param in msg:
-                    msg[param] = value
+        # Apply feedback if any (NaN until the first adjustment)
+        speed = fleet.speed_override[i]
+        if speed == speed and 'print_speed' in msg:
+            msg['print_speed'] = speed
 
         # Add metadata
+        cycle_count = fleet.cycle_count[i]
         msg.update({
             'timestamp': datetime.utcnow().isoformat(),
             'printer_id': printer_id,
-            'cycle_count': printer_state.get('cycle_count', 0)
+            'cycle_count': cycle_count
         })
-
-        # Update state
-        printer_state['cycle_count'] = printer_state.get('cycle_count', 0) + 1
+        fleet.cycle_count[i] = cycle_count + 1
         return msg
 
-    async def run(self):
-        printer_count = int(os.getenv('PRINTER_COUNT', 3))
-        rate_hz = int(os.getenv('BASE_RATE_HZ', 100))
-        delay = 1.0 / rate_hz
-        
-        self.client.loop_start()
-        
+    def make_scheduler(self, rate_hz, slots):
+        return TickScheduler(
+            rate_hz, slots=slots,
+            policy=os.getenv('SCHEDULER_POLICY', 'catch_up'),
+            max_lag=float(os.getenv('SCHEDULER_MAX_LAG', 1.0)))
+
+    async def run(self, printer_count=None, rate_hz=None, duration=None):
+        printer_count = printer_count or int(os.getenv('PRINTER_COUNT', 3))
+        rate_hz = rate_hz or float(os.getenv('BASE_RATE_HZ', 100))
+        # One slot per printer: publishes are spread evenly across the period
+        scheduler = self.make_scheduler(rate_hz, printer_count)
+        self.fleet.ensure(printer_count)
+        self.anomalies.ensure(self.fleet.size)
+        mqtt_loop = AsyncioMqtt(self.client)
+        loop = asyncio.get_running_loop()
+        report_at = loop.time() + 10
+
+        try:
+            while duration is None or scheduler.start is None or loop.time() - scheduler.start < duration:
+                _, slot = await scheduler.next_slot()
+                printer_id = slot + 1
+                msg = self.generate_message(f'printer_{printer_id}')
+                self.client.publish(
+                    f'printing/{printer_id}/sensor',
+                    self.encode_message(msg),
+                    qos=1)
+
+                if loop.time() >= report_at:
+                    print(f"Scheduler: {scheduler.format_stats()}")
+                    report_at += 10
+        finally:
+            print(f"Scheduler: {scheduler.format_stats()}")
+            await mqtt_loop.drain()
+            mqtt_loop.stop()
+
+    async def run_bulk(self, printer_count, rate_hz, seed=None, duration=None, dry_run=False):
+        """Generate whole ticks for the fleet with BulkGenerator (load-test mode)"""
+        # NumPy is only needed here, so the per-printer mode starts without it
+        from bulk_generator import BulkGenerator
+        self.bulk = BulkGenerator(self.base_data, printer_count, seed=seed, rules=self.anomaly_rules)
+        qos = int(os.getenv('BULK_QOS', 0))
+        # Each tick is generated once, then encoded and published in evenly spaced chunks
+        slots = max(1, min(printer_count, int(os.getenv('BULK_SLOTS', 10))))
+        bounds = [printer_count * i // slots for i in range(slots + 1)]
+        scheduler = self.make_scheduler(rate_hz, slots)
+        mqtt_loop = None if dry_run else AsyncioMqtt(self.client)
+        loop = asyncio.get_running_loop()
+        print(f"Bulk mode: {printer_count} printers at {rate_hz} Hz in {slots} slots, "
+              f"{self.payload_format} payloads")
+
+        report_at = loop.time() + 10
+        current_tick = None
+        sent = reported = 0
         try:
-            while True:
-                start_time = time.time()
-                
-                # Generate messages for all printers
-                for printer_id in range(1, printer_count + 1):
-                    msg = self.generate_message(f'printer_{printer_id}')
-                    self.client.publish(
-                        f'printing/{printer_id}/sensor',
-                        json.dumps(msg),
-                        qos=1)
-                
-                # Sleep for remaining time to maintain rate
-                elapsed = time.time() - start_time
-                await asyncio.sleep(max(0, delay - elapsed))
-                
-        except KeyboardInterrupt:
-            self.client.loop_stop()
+            while duration is None or scheduler.start is None or loop.time() - scheduler.start < duration:
+                tick, slot = await scheduler.next_slot()
+                if tick != current_tick:
+                    values, labels = self.bulk.tick()
+                    epoch = time.time()
+                    timestamp = datetime.utcfromtimestamp(epoch).isoformat()
+                    current_tick = tick
+                lo, hi = bounds[slot], bounds[slot + 1]
+                if self.payload_format == 'binary':
+                    payloads = self.bulk.encode_binary(values, labels, epoch, lo, hi)
+                else:
+                    payloads = self.bulk.encode(values, labels, timestamp, lo, hi)
+                if not dry_run:
+                    publish = self.client.publish
+                    for topic, payload in zip(self.bulk.topics[lo:hi], payloads):
+                        publish(topic, payload, qos=qos)
+                sent += hi - lo
+
+                now = loop.time()
+                if now >= report_at:
+                    print(f"Bulk mode: {(sent - reported) / 10:,.0f} msg/s, {scheduler.format_stats(now)}")
+                    report_at += 10
+                    reported = sent
+        finally:
+            total = loop.time() - scheduler.start if scheduler.start is not None else 0.0
+            print(f"Bulk mode: {sent} messages in {total:.1f}s ({sent / max(total, 1e-9):,.0f} msg/s)")
+            print(f"Scheduler: {scheduler.format_stats()}")
+            if mqtt_loop is not None:
+                await mqtt_loop.drain()
+                mqtt_loop.stop()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Synthetic 3D printer telemetry generator')
+    parser.add_argument('--bulk', action='store_true',
+                        help='vectorized load-generation mode for large fleets')
+    parser.add_argument('--printers', type=int, default=int(os.getenv('PRINTER_COUNT', 3)))
+    parser.add_argument('--rate', type=float, default=float(os.getenv('BASE_RATE_HZ', 100)),
+                        help='messages per second per printer')
+    parser.add_argument('--seed', type=int, default=int(os.getenv('SYNTH_SEED')) if os.getenv('SYNTH_SEED') else None,
+                        help='replay the same scenario (jitter and anomalies) for a given seed')
+    parser.add_argument('--duration', type=float, default=None, help='stop after N seconds')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='generate and encode without publishing (bulk mode only)')
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     # Initialize with automatic dataset loading
-    synthesizer = DataSynthesizer()
+    synthesizer = DataSynthesizer(connect=not args.dry_run, seed=args.seed)
 
     try:
         # Start the synthetic data generation
-        asyncio.run(synthesizer.run())
+        if args.bulk:
+            asyncio.run(synthesizer.run_bulk(
+                args.printers, args.rate, seed=args.seed,
+                duration=args.duration, dry_run=args.dry_run))
+        else:
+            asyncio.run(synthesizer.run(args.printers, args.rate, duration=args.duration))
     except KeyboardInterrupt:
         print("\nGracefully shutting down synthesizer...")
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
     finally:
         # Cleanup MQTT connection
-        if hasattr(synthesizer, 'client'):
+        if hasattr(synthesizer, 'client') and not args.dry_run:
             synthesizer.client.disconnect()
         print("Synthesizer stopped")
@@ -0,0 +1,60 @@
+"""
+Sensor payload encoders for the synthesizer.
+
+Mirrors the processor's sensor_message.py (change both together):
+
+    JSON    the message dict, encoded with orjson when installed
+    binary  <B I d 10f>   magic 0xB1, cycle_count, timestamp (epoch seconds),
+                          NUMERIC_FIELDS as float32 (NaN = missing)
+            then          printer_id, infill_pattern, material, anomaly as
+                          uint8 length + UTF-8 bytes (length 0 = absent)
+
+The processor publishes the formats it decodes as a retained JSON message
+on CAPABILITIES_TOPIC; with PAYLOAD_FORMAT=auto the synthesizer sends JSON
+until that message lists "binary".
+"""
+import json
+import math
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NUMERIC_FIELDS = ('layer_height', 'wall_thickness', 'infill_density', 'nozzle_temperature',
+                  'bed_temperature', 'print_speed', 'fan_speed', 'roughness',
+                  'tension_strenght', 'elongation')
+TEXT_FIELDS = ('printer_id', 'infill_pattern', 'material', 'anomaly')
+BINARY_MAGIC = 0xB1
+BINARY_BODY = struct.Struct('<BId%df' % len(NUMERIC_FIELDS))
+CAPABILITIES_TOPIC = 'processor/capabilities'
+
+if orjson is not None:
+    loads = orjson.loads
+    dumps = orjson.dumps
+else:
+    loads = json.loads
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def text_field(value):
+    data = b'' if value is None else str(value).encode('utf-8')[:255]
+    return bytes((len(data),)) + data
+
+
+def encode_binary(msg, timestamp):
+    """Pack a generated message dict; `timestamp` is epoch seconds."""
+    values = [math.nan if msg.get(name) is None else float(msg[name]) for name in NUMERIC_FIELDS]
+    return (BINARY_BODY.pack(BINARY_MAGIC, msg.get('cycle_count', 0), timestamp, *values)
+            + b''.join(text_field(msg.get(name)) for name in TEXT_FIELDS))
+
+
+def accepts_binary(capabilities_payload):
+    """True if a processor capabilities message lists the binary format."""
+    try:
+        return 'binary' in loads(capabilities_payload).get('payload_formats', ())
+    except (ValueError, AttributeError):
+        return False
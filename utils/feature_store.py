@@ -0,0 +1,250 @@
+# utils/feature_store.py
+"""
+Local columnar feature store for historical print data.
+
+Each table is stored as one .npy file per column and segment, next to a
+JSON manifest:
+
+    <root>/manifest.json
+    <root>/<table>/<segment>/<column>.npy
+
+    manifest = {"schema_version": 1, "tables": {<table>: {
+        "columns":  {<name>: {"dtype": "float64"}
+                     | {"dtype": "int16", "categories": ["abs", "pla"]}},
+        "order":    [column names as imported],
+        "segments": [{"name": "000000", "rows": 50,
+                      "time_range": [first, last] or null,
+                      "source": {"path": ..., "size": ..., "mtime_ns": ...} or null}]}}}
+
+Numeric columns keep their own dtype. String columns such as material and
+infill_pattern are stored as small integer codes with their categories in
+the manifest. Reads use np.load(mmap_mode='r'), so a single-segment
+column comes back as a zero-copy view of the page cache. A table with
+several segments (appended time ranges) is concatenated on read.
+
+The layout needs only NumPy and json to read, which is what the
+synthesizer does in its load_dataset.
+
+Usage:
+    python3 -m utils.feature_store import data/data.csv     # (re)build historical_prints
+    python3 -m utils.feature_store info
+"""
+import os
+import sys
+import json
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+SCHEMA_VERSION = 1
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), '..', 'data', 'feature_store')
+CATEGORICAL = ('material', 'infill_pattern')
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+class FeatureStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.manifest = {'schema_version': SCHEMA_VERSION, 'tables': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('schema_version') == SCHEMA_VERSION:
+                self.manifest = manifest
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def tables(self):
+        return list(self.manifest['tables'])
+
+    def table(self, name):
+        return self.manifest['tables'].get(name)
+
+    def rows(self, name):
+        table = self.table(name)
+        return sum(s['rows'] for s in table['segments']) if table else 0
+
+    def is_fresh(self, name, source_path):
+        """True if `name` was last written from `source_path` as it is now on disk."""
+        table = self.table(name)
+        if not table or not table['segments'] or not os.path.exists(source_path):
+            return False
+        return table['segments'][-1]['source'] == source_signature(source_path)
+
+    def write(self, name, columns, time_range=None, source=None, categorical=CATEGORICAL):
+        """Replace table `name` with `columns` ({name: array-like}) as a single segment."""
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self.manifest['tables'].pop(name, None)
+        return self.append(name, columns, time_range, source, categorical)
+
+    def append(self, name, columns, time_range=None, source=None, categorical=CATEGORICAL):
+        """Add `columns` to table `name` as a new segment (e.g. a newly fetched time range)."""
+        table = self.manifest['tables'].setdefault(name, {'columns': {}, 'order': [], 'segments': []})
+        segment = f"{len(table['segments']):06d}"
+        segment_dir = os.path.join(self.root, name, segment)
+        os.makedirs(segment_dir, exist_ok=True)
+
+        rows = None
+        for column, values in columns.items():
+            values = np.asarray(values)
+            spec = table['columns'].get(column)
+            if spec is None:
+                is_text = values.dtype.kind in 'OUS'
+                spec = {'dtype': 'int16', 'categories': []} if is_text or column in categorical \
+                    else {'dtype': values.dtype.str}
+                table['columns'][column] = spec
+                table['order'].append(column)
+            if 'categories' in spec:
+                values = self._encode(spec, values)
+            else:
+                values = values.astype(spec['dtype'], copy=False)
+            np.save(os.path.join(segment_dir, f'{column}.npy'), values)
+            rows = len(values)
+
+        table['segments'].append({
+            'name': segment,
+            'rows': rows or 0,
+            'time_range': list(time_range) if time_range else None,
+            'source': source,
+            'written_at': datetime.now(timezone.utc).isoformat(),
+        })
+        self._save()
+        return rows or 0
+
+    @staticmethod
+    def _encode(spec, values):
+        categories = spec['categories']
+        index = {c: i for i, c in enumerate(categories)}
+        # Missing values (None/NaN) get code -1 rather than a 'nan' category
+        if values.dtype.kind == 'O':
+            missing = np.fromiter((v is None or v != v for v in values), dtype=bool, count=len(values))
+        elif values.dtype.kind == 'f':
+            missing = np.isnan(values)
+        else:
+            missing = np.zeros(len(values), dtype=bool)
+        codes = np.full(len(values), -1, dtype=np.int16)
+        if missing.all():
+            return codes
+        uniques, inverse = np.unique(values[~missing].astype(str), return_inverse=True)
+        mapping = np.empty(len(uniques), dtype=np.int16)
+        for i, value in enumerate(uniques.tolist()):
+            if value not in index:
+                index[value] = len(categories)
+                categories.append(value)
+            mapping[i] = index[value]
+        codes[~missing] = mapping[inverse.reshape(-1)]
+        return codes
+
+    def read(self, name, columns=None):
+        """{column: array} for table `name`. Categorical columns are returned as codes."""
+        table = self.table(name)
+        if table is None:
+            raise KeyError(f"no table {name!r} in {self.root}")
+        result = {}
+        for column in columns or table['order']:
+            parts = [self._load(name, segment, column, table) for segment in table['segments']]
+            result[column] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return result
+
+    def _load(self, name, segment, column, table):
+        path = os.path.join(self.root, name, segment['name'], f'{column}.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+        # Column added after this segment was written
+        spec = table['columns'][column]
+        if 'categories' in spec:
+            return np.full(segment['rows'], -1, dtype=spec['dtype'])
+        kind = np.dtype(spec['dtype']).kind
+        if kind == 'M':
+            return np.full(segment['rows'], np.datetime64('NaT'), dtype=spec['dtype'])
+        return np.full(segment['rows'], np.nan, dtype=spec['dtype'] if kind == 'f' else np.float64)
+
+    def categories(self, name, column):
+        return self.table(name)['columns'][column].get('categories')
+
+    def decode(self, name, column, codes):
+        """Map categorical codes back to their string values (-1 -> NaN)."""
+        labels = np.array(self.categories(name, column) + [np.nan], dtype=object)
+        return labels[codes]
+
+    def to_frame(self, name, columns=None, rename=None):
+        """Table as a pandas DataFrame with categorical columns as pandas Categoricals."""
+        import pandas as pd
+
+        data = {}
+        for column, values in self.read(name, columns).items():
+            categories = self.categories(name, column)
+            if categories is not None:
+                values = pd.Categorical.from_codes(np.asarray(values), categories)
+            data[(rename or {}).get(column, column)] = values
+        return pd.DataFrame(data, copy=False)
+
+    def to_records(self, name):
+        """Table as a list of row dicts with decoded categories (plain Python values)."""
+        columns = {}
+        for column, values in self.read(name).items():
+            if self.categories(name, column) is not None:
+                values = self.decode(name, column, values)
+            columns[column] = values.tolist()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def frame_columns(df, drop=('result', 'table')):
+    """DataFrame -> {column: ndarray}, with timezone-aware times as UTC datetime64[ns]."""
+    import pandas as pd
+
+    columns = {}
+    for column in df.columns:
+        if column in drop:
+            continue
+        values = df[column]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+        columns[column] = values.to_numpy()
+    return columns
+
+
+def write_frame(store, name, df, source=None, time_column='_time'):
+    """Write a DataFrame as table `name`, recording its time range when it has one."""
+    columns = frame_columns(df)
+    time_range = None
+    if time_column in columns and len(columns[time_column]):
+        times = columns[time_column]
+        time_range = (str(times.min()), str(times.max()))
+    return store.write(name, columns, time_range=time_range, source=source)
+
+
+def import_csv(path, store=None, name='historical_prints'):
+    """Parse a CSV once and write it to the store as table `name`. Returns rows written."""
+    import pandas as pd
+
+    store = store or FeatureStore()
+    return write_frame(store, name, pd.read_csv(path), source=source_signature(path))
+
+
+if __name__ == '__main__':
+    store = FeatureStore()
+    if len(sys.argv) == 3 and sys.argv[1] == 'import':
+        rows = import_csv(sys.argv[2], store)
+        print(f"Imported {rows} rows from {sys.argv[2]} into {store.root}")
+    elif len(sys.argv) == 2 and sys.argv[1] == 'info':
+        for table in store.tables():
+            spec = store.table(table)
+            print(f"{table}: {store.rows(table)} rows in {len(spec['segments'])} segment(s)")
+            for column, info in spec['columns'].items():
+                extra = f" {len(info['categories'])} categories" if 'categories' in info else ''
+                print(f"  {column:<20} {info['dtype']}{extra}")
+    else:
+        print("Usage: python3 -m utils.feature_store import <csv> | info")
+        sys.exit(1)
@@ -0,0 +1,221 @@
+# utils/influx_chunks.py
+"""
+Chunked, incrementally refreshed training data from InfluxDB.
+
+The Flux query is paged by fixed time windows instead of one 30-day
+query_data_frame pivot. Each window is streamed record by record,
+converted to NumPy column batches and written to a local cache:
+
+    <cache_dir>/manifest.json           window size, column types, chunks
+    <cache_dir>/<chunk>/<column>.npy    one array per column and window
+
+Windows that ended more than `settle` seconds ago are marked complete in
+the manifest and never fetched again, so the next refresh only queries
+new time ranges (plus the still-open tail). Readers iterate the cache one
+memory-mapped chunk at a time, and `reservoir_sample` draws a bounded
+uniform sample for estimators that need everything in memory, so peak
+memory is set by the window and sample sizes, not by history length.
+"""
+import os
+import json
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+SKIP_COLUMNS = {'result', 'table', '_start', '_stop', '_measurement'}
+
+
+def _rfc3339(t):
+    return t.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class InfluxChunkCache:
+    def __init__(self, query_api, bucket, cache_dir, measurement='historical_prints',
+                 window=timedelta(hours=6), batch_rows=50000, settle=timedelta(minutes=5), org=None):
+        self.query_api = query_api
+        self.bucket = bucket
+        self.org = org
+        self.measurement = measurement
+        self.cache_dir = cache_dir
+        self.window = window
+        self.batch_rows = batch_rows
+        self.settle = settle
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if (manifest.get('measurement') == self.measurement
+                    and manifest.get('window_seconds') == self.window.total_seconds()):
+                return manifest
+            print(f"Cache layout changed, rebuilding {self.cache_dir}")
+        return {'measurement': self.measurement, 'window_seconds': self.window.total_seconds(),
+                'columns': {}, 'chunks': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def windows(self, start, stop):
+        """Window-aligned [lo, hi) ranges covering [start, stop)."""
+        size = self.window.total_seconds()
+        lo = EPOCH + timedelta(seconds=(start - EPOCH).total_seconds() // size * size)
+        while lo < stop:
+            yield lo, lo + self.window
+            lo += self.window
+
+    def query(self, lo, hi):
+        return f'''
+        from(bucket: "{self.bucket}")
+          |> range(start: {_rfc3339(lo)}, stop: {_rfc3339(hi)})
+          |> filter(fn: (r) => r._measurement == "{self.measurement}")
+          |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+
+    def refresh(self, start, stop=None):
+        """Fetch every window in [start, stop) that is not cached as complete. Returns rows fetched."""
+        now = datetime.now(timezone.utc)
+        stop = stop or now
+        fetched = 0
+        for lo, hi in self.windows(start, stop):
+            key = lo.strftime('%Y%m%dT%H%M%S')
+            chunk = self.manifest['chunks'].get(key)
+            if chunk is not None and chunk['complete']:
+                continue
+            rows = self._fetch(key, lo, hi)
+            self.manifest['chunks'][key] = {
+                'start': _rfc3339(lo), 'stop': _rfc3339(hi), 'rows': rows,
+                'complete': hi <= now - self.settle,
+            }
+            self._save_manifest()
+            fetched += rows
+        return fetched
+
+    def _fetch(self, key, lo, hi):
+        """Stream one window into per-column .npy files, batch_rows records at a time."""
+        batches = []
+        rows = []
+        for record in self.query_api.query_stream(self.query(lo, hi), org=self.org):
+            rows.append(record.values)
+            if len(rows) == self.batch_rows:
+                batches.append(self._to_columns(rows))
+                rows = []
+        if rows:
+            batches.append(self._to_columns(rows))
+
+        chunk_dir = os.path.join(self.cache_dir, key)
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        os.makedirs(chunk_dir)
+        names = {name for columns, _ in batches for name in columns}
+        for name in names:
+            # A column missing from some batches (field not written then) is padded
+            parts = [columns[name] if name in columns else self._missing(name, n) for columns, n in batches]
+            np.save(os.path.join(chunk_dir, f'{name}.npy'), np.concatenate(parts))
+        return sum(n for _, n in batches)
+
+    def _to_columns(self, rows):
+        """Convert one batch of pivoted records to {column: array}."""
+        names = {name for row in rows for name in row if name not in SKIP_COLUMNS}
+        columns = {}
+        for name in names:
+            values = [row.get(name) for row in rows]
+            kind = self.manifest['columns'].get(name)
+            if kind is None:
+                sample = next((v for v in values if v is not None), None)
+                if sample is None:
+                    continue
+                kind = ('datetime64[ns]' if isinstance(sample, datetime)
+                        else 'str' if isinstance(sample, str) else 'float64')
+                self.manifest['columns'][name] = kind
+            if kind == 'datetime64[ns]':
+                columns[name] = np.array([None if v is None else v.astimezone(timezone.utc).replace(tzinfo=None)
+                                          for v in values], dtype=kind)
+            elif kind == 'str':
+                columns[name] = np.array(['' if v is None else str(v) for v in values])
+            else:
+                columns[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return columns, len(rows)
+
+    def _missing(self, name, rows):
+        kind = self.manifest['columns'].get(name)
+        if kind == 'str':
+            return np.full(rows, '')
+        if kind == 'datetime64[ns]':
+            return np.full(rows, np.datetime64('NaT'), dtype=kind)
+        return np.full(rows, np.nan)
+
+    def rows(self):
+        return sum(chunk['rows'] for chunk in self.manifest['chunks'].values())
+
+    def iter_chunks(self, columns=None, start=None):
+        """Yield {column: array} per cached window in time order, memory-mapped."""
+        since = _rfc3339(start) if start is not None else ''
+        for key in sorted(self.manifest['chunks']):
+            rows = self.manifest['chunks'][key]['rows']
+            if not rows or self.manifest['chunks'][key]['stop'] <= since:
+                continue
+            chunk_dir = os.path.join(self.cache_dir, key)
+            chunk = {}
+            for name in columns or self.manifest['columns']:
+                path = os.path.join(chunk_dir, f'{name}.npy')
+                chunk[name] = np.load(path, mmap_mode='r') if os.path.exists(path) else self._missing(name, rows)
+            yield chunk
+
+
+def reservoir_sample(chunks, size, seed=42):
+    """Uniform sample of at most `size` rows across chunks, holding one chunk at a time."""
+    rng = np.random.default_rng(seed)
+    sample = None
+    seen = 0
+    for chunk in chunks:
+        n = len(next(iter(chunk.values())))
+        if sample is None:
+            # Strings go in object arrays: any fixed width could truncate a later chunk's longer values
+            sample = {name: np.empty(size, dtype=object if col.dtype.kind in 'UO' else col.dtype)
+                      for name, col in chunk.items()}
+            filled = 0
+        rows = np.arange(n)
+        # Fill the reservoir first, then replace slot j < size with probability size / (t + 1)
+        take = min(n, size - filled)
+        for name, col in chunk.items():
+            sample[name][filled:filled + take] = col[:take]
+        filled += take
+        rest = rows[take:]
+        if len(rest):
+            slots = rng.integers(0, seen + rest + 1)
+            keep = slots < size
+            for name, col in chunk.items():
+                sample[name][slots[keep]] = col[rest[keep]]
+        seen += n
+    if sample is None:
+        return {}
+    return {name: col[:filled] for name, col in sample.items()}
+
+
+def load_influx_history(columns=None):
+    """Refresh the local chunk cache from InfluxDB and return a bounded training sample.
+
+    Connection settings come from the INFLUXDB_V2_* environment variables;
+    TRAINING_HISTORY_DAYS, TRAINING_WINDOW_HOURS, TRAINING_MAX_ROWS and
+    TRAINING_CACHE_DIR control the range, paging, sample size and cache.
+    """
+    from influxdb_client import InfluxDBClient
+
+    start = datetime.now(timezone.utc) - timedelta(days=float(os.getenv('TRAINING_HISTORY_DAYS', 30)))
+    cache_dir = os.getenv('TRAINING_CACHE_DIR') or os.path.join(
+        os.path.dirname(__file__), '..', 'data', 'cache', 'historical_prints')
+    with InfluxDBClient.from_env_properties() as client:
+        cache = InfluxChunkCache(
+            client.query_api(), os.getenv('INFLUX_BUCKET', 'printing_metrics'), cache_dir,
+            window=timedelta(hours=float(os.getenv('TRAINING_WINDOW_HOURS', 6))))
+        fetched = cache.refresh(start)
+    print(f"Fetched {fetched} new rows from InfluxDB; {cache.rows()} rows cached in {cache_dir}")
+    return reservoir_sample(cache.iter_chunks(columns, start=start),
+                            int(os.getenv('TRAINING_MAX_ROWS', 1000000)))
@@ -6,19 +6,51 @@ from influxdb_client.domain.write_precision import WritePrecision
 from datetime import datetime
 import os
 
+try:
+    from utils.feature_store import FeatureStore, import_csv, write_frame
+except ImportError:  # run as a script from utils/
+    from feature_store import FeatureStore, import_csv, write_frame
+
+TABLE = 'historical_prints'
+
+
+def target_mapping(columns):
+    """Single rename that gives train_model.py its 'surface_roughness' target column."""
+    if 'surface_roughness' in columns:
+        return {}
+    if 'roughness' in columns:
+        return {'roughness': 'surface_roughness'}
+    roughness_cols = [col for col in columns if 'roughness' in col.lower()]
+    return {roughness_cols[0]: 'surface_roughness'} if roughness_cols else {}
+
+
 def load_historical_data():
     """
     Load historical data for training.
-    First tries to load from CSV, if not found, tries to query from InfluxDB.
-    If neither works, generates synthetic data for demonstration.
+    Reads the local feature store (utils/feature_store.py), which is rebuilt
+    from data/data.csv only when the CSV changes. Without a CSV it uses the
+    store's last InfluxDB import, then queries InfluxDB (saving the result to
+    the store), and finally generates synthetic data for demonstration.
     Returns a pandas DataFrame with features and target.
     """
-    # Try to load from CSV first
     csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
-    
+    store = FeatureStore()
+
     if os.path.exists(csv_path):
-        print(f"Loading data from CSV: {csv_path}")
-        df = pd.read_csv(csv_path)
+        try:
+            if not store.is_fresh(TABLE, csv_path):
+                print(f"Importing {csv_path} into the feature store")
+                import_csv(csv_path, store, TABLE)
+            print(f"Loading data from feature store: {store.root}")
+            df = store.to_frame(TABLE, rename=target_mapping(store.table(TABLE)['order']))
+        except OSError as e:
+            # e.g. a read-only data directory
+            print(f"Feature store unavailable ({e}). Loading data from CSV: {csv_path}")
+            df = pd.read_csv(csv_path)
+            df = df.rename(columns=target_mapping(df.columns))
+    elif store.table(TABLE):
+        print(f"CSV file not found. Loading the last InfluxDB import from {store.root}")
+        df = store.to_frame(TABLE, rename=target_mapping(store.table(TABLE)['order']))
     else:
         print("CSV file not found. Attempting to query data from InfluxDB...")
         # Try to fetch data from InfluxDB
@@ -26,39 +58,18 @@ def load_historical_data():
             df = query_influxdb_data()
             if df is not None and not df.empty:
                 print(f"Successfully queried {len(df)} records from InfluxDB")
-                # Save to CSV for future use
-                os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-                df.to_csv(csv_path, index=False)
-                print(f"Saved data to {csv_path}")
+                # Save to the feature store for future use
+                write_frame(store, TABLE, df)
+                print(f"Saved data to {store.root}")
+                df = df.rename(columns=target_mapping(df.columns))
             else:
                 print("No data in InfluxDB. Generating synthetic data...")
                 df = generate_synthetic_data()
         except Exception as e:
             print(f"Error querying InfluxDB: {e}. Generating synthetic data...")
             df = generate_synthetic_data()
-    
+
     print(f"Loaded {len(df)} historical records")
-    
-    # Rename columns to match expected names in train_model.py
-    # The training script expects 'surface_roughness' as target column
-    # Also ensure other columns have consistent names
-    column_mapping = {
-        'roughness': 'surface_roughness',
-        'surface_roughness': 'surface_roughness',  # In case it's already named correctly
-    }
-    
-    # Apply renaming
-    for old_name, new_name in column_mapping.items():
-        if old_name in df.columns and new_name not in df.columns:
-            df = df.rename(columns={old_name: new_name})
-    
-    # If 'surface_roughness' is still not present, check for similar columns
-    if 'surface_roughness' not in df.columns:
-        # Look for any column containing 'roughness'
-        roughness_cols = [col for col in df.columns if 'roughness' in col.lower()]
-        if roughness_cols:
-            df = df.rename(columns={roughness_cols[0]: 'surface_roughness'})
-    
     return df
 
 def query_influxdb_data():